@@ -0,0 +1,136 @@
+# This file is part of LOVE-commander.
+#
+# Copyright (c) 2023 Inria Chile.
+#
+# Developed by Inria Chile.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or at
+# your option any later version.
+#
+# This program is distributed in the hope that it will be useful,but
+# WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+# or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License
+# for more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program. If not, see <http://www.gnu.org/licenses/>.
+
+import re
+
+import pandas as pd
+
+AGGREGATIONS = ("mean", "median", "min", "max", "std", "count", "first", "last")
+PERCENTILE_PATTERN = re.compile(r"p(\d{1,2}(\.\d+)?|100)")
+
+
+def is_aggregation(aggregation):
+    """Return whether an aggregation is supported.
+
+    Parameters
+    ----------
+    aggregation : `str`
+        One of `AGGREGATIONS` or a percentile between 0 and 100, e.g. p95
+        or p99.9.
+
+    Returns
+    -------
+    `bool`
+        True if the aggregation is supported.
+    """
+    return aggregation in AGGREGATIONS or (
+        isinstance(aggregation, str)
+        and PERCENTILE_PATTERN.fullmatch(aggregation) is not None
+    )
+
+
+def aggregation_column(field, aggregation):
+    """Return the name of the column of an aggregated field.
+
+    Parameters
+    ----------
+    field : `str`
+        Name of the field.
+    aggregation : `str`
+        Name of the aggregation.
+
+    Returns
+    -------
+    `str`
+        ``<field>:<aggregation>``, which can't be the name of a field.
+    """
+    return f"{field}:{aggregation}"
+
+
+def aggregate_bins(resampler, aggregation):
+    """Compute an aggregation for every bin of a resampled time series.
+
+    Parameters
+    ----------
+    resampler : `pandas.core.resample.Resampler`
+        The resampled time series.
+    aggregation : `str`
+        Name of the aggregation, see `is_aggregation`.
+
+    Returns
+    -------
+    `pandas.DataFrame`
+        The aggregated time series.
+    """
+    if aggregation in AGGREGATIONS:
+        return getattr(resampler, aggregation)()
+    return resampler.quantile(float(aggregation[1:]) / 100)
+
+
+def aggregate_frame(frame, resample, aggregations, origin="start_day"):
+    """Resample a time series computing several aggregations per bin.
+
+    The time series is binned once, and each aggregation is computed for
+    all the bins and fields at once with the vectorized methods of the
+    resampler, instead of a Python function per bin.
+
+    Parameters
+    ----------
+    frame : `pandas.DataFrame`
+        The time series.
+    resample : `str`
+        Resampling frequency, e.g. 1min.
+    aggregations : `list` [`str`]
+        Names of the aggregations, see `is_aggregation`.
+    origin : `str`, optional
+        Origin of the bins, as in `pandas.DataFrame.resample`.
+
+    Returns
+    -------
+    `pandas.DataFrame`
+        The aggregated time series, with one column per field and
+        aggregation, named with `aggregation_column`, in the order of the
+        fields and then of the aggregations.
+    """
+    aggregations = list(dict.fromkeys(aggregations))
+    columns = [
+        aggregation_column(field, aggregation)
+        for field in frame.columns
+        for aggregation in aggregations
+    ]
+    if frame.empty:
+        return pd.DataFrame(index=frame.index, columns=columns)
+
+    resampler = frame.resample(resample, origin=origin)
+    result = pd.concat(
+        {
+            aggregation: aggregate_bins(resampler, aggregation)
+            for aggregation in aggregations
+        },
+        axis=1,
+    )
+    result = result.swaplevel(axis=1)[
+        [
+            (field, aggregation)
+            for field in frame.columns
+            for aggregation in aggregations
+        ]
+    ]
+    result.columns = columns
+    return result
@@ -21,6 +21,7 @@ from aiohttp import web
 
 from .commands import create_app as create_cmd_app
 from .efd import create_app as create_efd_app
+from .efd_clients import EfdClientManager
 from .heartbeats import create_app as create_heartbeat_app
 from .lfa import create_app as create_lfa_app
 from .lovecsc import create_app as create_lovecsc_app
@@ -39,17 +40,24 @@ def create_app(*args, **kwargs):
     """
     app = web.Application(middlewares=[web.normalize_path_middleware()])
 
-    app.add_subapp("/cmd/", create_cmd_app())
+    # SAL Info instances shared by the SAL Info and Commands applications
+    salinfos = dict()
+    # EFD clients shared by the EFD and Reports applications
+    efd_clients = EfdClientManager.from_env()
+
+    app.add_subapp("/cmd/", create_cmd_app(salinfos=salinfos))
     app.add_subapp("/heartbeat/", create_heartbeat_app())
     app.add_subapp("/lovecsc/", create_lovecsc_app())
-    app.add_subapp("/efd/", create_efd_app())
+    app.add_subapp("/efd/", create_efd_app(efd_clients=efd_clients))
     app.add_subapp("/tcs/", create_tcs_app())
     app.add_subapp("/lfa/", create_lfa_app())
-    app.add_subapp("/reports/", create_reports_app())
+    app.add_subapp("/reports/", create_reports_app(efd_clients=efd_clients))
 
     app.add_subapp(
         "/salinfo/",
-        create_salinfo_app(remotes_len_limit=kwargs.get("remotes_len_limit")),
+        create_salinfo_app(
+            remotes_len_limit=kwargs.get("remotes_len_limit"), salinfos=salinfos
+        ),
     )
 
     return app
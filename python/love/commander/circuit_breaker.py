@@ -0,0 +1,195 @@
+# This file is part of LOVE-commander.
+#
+# Copyright (c) 2023 Inria Chile.
+#
+# Developed by Inria Chile.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or at
+# your option any later version.
+#
+# This program is distributed in the hope that it will be useful,but
+# WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+# or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License
+# for more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program. If not, see <http://www.gnu.org/licenses/>.
+
+import time
+
+CIRCUIT_BREAKER_THRESHOLD = 3
+CIRCUIT_BREAKER_COOL_DOWN = 30
+
+
+class CircuitBreaker:
+    """Circuit breaker for the commands sent to one CSC.
+
+    The breaker starts closed and lets every command through. After
+    ``threshold`` consecutive commands get no acknowledgement at all it
+    opens, and commands are rejected right away for ``cool_down`` seconds.
+    Then it becomes half open and lets a single probe command through:
+    if the CSC acknowledges it the breaker closes again, otherwise it
+    opens for another cool down period.
+
+    Parameters
+    ----------
+    threshold : `int`, optional
+        Number of consecutive unacknowledged commands that open the
+        breaker. Zero or less disables the breaker.
+    cool_down : `float`, optional
+        Time (seconds) the breaker stays open.
+    """
+
+    def __init__(
+        self, threshold=CIRCUIT_BREAKER_THRESHOLD, cool_down=CIRCUIT_BREAKER_COOL_DOWN
+    ):
+        self.threshold = threshold
+        self.cool_down = cool_down
+
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+
+        self.trips = 0
+        self.rejections = 0
+        self.probes = 0
+
+    def allow(self):
+        """Check whether a command can be sent.
+
+        Returns
+        -------
+        `bool`
+            True if the command can be sent, False if it must be rejected.
+            When True, the caller must report the outcome with `record`.
+        """
+        if self.threshold <= 0 or self.state == "closed":
+            return True
+        if self.state == "open":
+            if time.monotonic() - self.opened_at < self.cool_down:
+                self.rejections += 1
+                return False
+            self.state = "half_open"
+        if self.probing:
+            self.rejections += 1
+            return False
+        self.probing = True
+        self.probes += 1
+        return True
+
+    def record(self, responsive):
+        """Record the outcome of an allowed command.
+
+        Parameters
+        ----------
+        responsive : `bool` or `None`
+            True if the CSC acknowledged the command, False if there was no
+            acknowledgement at all, None if the command was not sent.
+        """
+        self.probing = False
+        if responsive is None:
+            return
+        if responsive:
+            self.failures = 0
+            self.state = "closed"
+            self.opened_at = None
+            return
+        self.failures += 1
+        if self.state == "half_open" or (
+            self.threshold > 0 and self.failures >= self.threshold
+        ):
+            if self.state != "open":
+                self.trips += 1
+            self.state = "open"
+            self.opened_at = time.monotonic()
+
+    def retry_after(self):
+        """Return the time left before the breaker lets a probe through.
+
+        Returns
+        -------
+        `float`
+            Time (seconds) left, zero if the breaker is not open.
+        """
+        if self.state != "open":
+            return 0
+        return max(0, self.cool_down - (time.monotonic() - self.opened_at))
+
+    def to_dict(self):
+        """Return the breaker state and counters.
+
+        Returns
+        -------
+        `dict`
+            The state, consecutive failures, time left to retry and the
+            trips, rejections and probes counters.
+        """
+        return {
+            "state": self.state,
+            "failures": self.failures,
+            "retry_after": self.retry_after(),
+            "trips": self.trips,
+            "rejections": self.rejections,
+            "probes": self.probes,
+        }
+
+
+class CircuitBreakers:
+    """Circuit breakers of the CSCs, indexed by ``<csc>.<salindex>``.
+
+    Parameters
+    ----------
+    threshold : `int`, optional
+        Number of consecutive unacknowledged commands that open a breaker.
+    cool_down : `float`, optional
+        Time (seconds) a breaker stays open.
+    """
+
+    def __init__(
+        self, threshold=CIRCUIT_BREAKER_THRESHOLD, cool_down=CIRCUIT_BREAKER_COOL_DOWN
+    ):
+        self.threshold = threshold
+        self.cool_down = cool_down
+        self.breakers = dict()
+
+    def get(self, csc, salindex):
+        """Get the breaker of a CSC, creating it if needed.
+
+        Parameters
+        ----------
+        csc : `str`
+            Name of the CSC.
+        salindex : `int`
+            SAL index of the CSC.
+
+        Returns
+        -------
+        `CircuitBreaker`
+            The breaker of the CSC.
+        """
+        name = f"{csc}.{salindex}"
+        if name not in self.breakers:
+            self.breakers[name] = CircuitBreaker(self.threshold, self.cool_down)
+        return self.breakers[name]
+
+    def stats(self):
+        """Return the state of every breaker and the totals.
+
+        Returns
+        -------
+        `dict`
+            The breakers configuration, the number of open breakers, the
+            total trips and rejections and the state of each breaker.
+        """
+        breakers = {name: breaker.to_dict() for name, breaker in self.breakers.items()}
+        return {
+            "threshold": self.threshold,
+            "cool_down": self.cool_down,
+            "open": sum(1 for b in breakers.values() if b["state"] != "closed"),
+            "trips": sum(b["trips"] for b in breakers.values()),
+            "rejections": sum(b["rejections"] for b in breakers.values()),
+            "breakers": breakers,
+        }
@@ -0,0 +1,285 @@
+# This file is part of LOVE-commander.
+#
+# Copyright (c) 2023 Inria Chile.
+#
+# Developed by Inria Chile.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or at
+# your option any later version.
+#
+# This program is distributed in the hope that it will be useful,but
+# WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+# or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License
+# for more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program. If not, see <http://www.gnu.org/licenses/>.
+
+import asyncio
+import collections
+import time
+import uuid
+
+COMMAND_JOBS_MAX_SIZE = 1000
+COMMAND_JOBS_TTL = 600
+
+
+class CommandJob:
+    """A command running in the background.
+
+    The job keeps the history of the command acknowledgements and forwards
+    each new one, and the final result, to its subscribers.
+
+    Parameters
+    ----------
+    csc : `str`
+        Name of the CSC.
+    salindex : `int`
+        SAL index of the CSC.
+    cmd_name : `str`
+        Name of the command.
+    identity : `str`
+        Identity of the user that sent the command.
+    """
+
+    def __init__(self, csc, salindex, cmd_name, identity):
+        self.job_id = uuid.uuid4().hex
+        self.csc = csc
+        self.salindex = salindex
+        self.cmd_name = cmd_name
+        self.identity = identity
+
+        self.state = "running"
+        self.status = None
+        self.ack = None
+        self.created = time.time()
+        self.finished = None
+        self.acks = []
+        self.task = None
+        self._subscribers = set()
+
+    @property
+    def done(self):
+        """True if the command has finished."""
+        return self.state != "running"
+
+    def finish(self, ack, status):
+        """Record the final result of the command.
+
+        Parameters
+        ----------
+        ack : `str`
+            The final command acknowledgement or error message.
+        status : `int`
+            The HTTP status the command would have had as a
+            synchronous request.
+        """
+        self.ack = ack
+        self.status = status
+        if status == 200:
+            self.state = "done"
+        elif status == 504:
+            self.state = "timeout"
+        else:
+            self.state = "failed"
+        self.finished = time.time()
+        for queue in self._subscribers:
+            queue.put_nowait(self.result_message())
+            queue.put_nowait(None)
+        self._subscribers.clear()
+
+    def add_ack(self, ack):
+        """Record a command acknowledgement and forward it to the
+        subscribers.
+
+        Parameters
+        ----------
+        ack : `dict`
+            The command acknowledgement, with its ack code name, error code,
+            result and timeout.
+        """
+        self.acks.append(ack)
+        for queue in self._subscribers:
+            queue.put_nowait(self.ack_message(ack))
+
+    def subscribe(self):
+        """Subscribe to the job acknowledgements.
+
+        Returns
+        -------
+        `asyncio.Queue`
+            Queue that receives the acknowledgements received so far, then
+            every new one as it arrives, then the final result and finally
+            `None` once the job has finished.
+        """
+        queue = asyncio.Queue()
+        for ack in self.acks:
+            queue.put_nowait(self.ack_message(ack))
+        if self.done:
+            queue.put_nowait(self.result_message())
+            queue.put_nowait(None)
+        else:
+            self._subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue):
+        """Stop forwarding acknowledgements to a subscriber.
+
+        Parameters
+        ----------
+        queue : `asyncio.Queue`
+            The queue returned by `subscribe`.
+        """
+        self._subscribers.discard(queue)
+
+    def ack_message(self, ack):
+        """Return the message sent to subscribers for an acknowledgement.
+
+        Parameters
+        ----------
+        ack : `dict`
+            The command acknowledgement.
+
+        Returns
+        -------
+        `dict`
+            The acknowledgement with the job identifier.
+        """
+        return {"type": "ack", "job_id": self.job_id, **ack}
+
+    def result_message(self):
+        """Return the message sent to subscribers when the job finishes.
+
+        Returns
+        -------
+        `dict`
+            The job as a dictionary.
+        """
+        return {"type": "result", **self.to_dict()}
+
+    def to_dict(self):
+        """Return the job as a dictionary.
+
+        Returns
+        -------
+        `dict`
+            The job identifier, command, state, result and
+            acknowledgements.
+        """
+        return {
+            "job_id": self.job_id,
+            "csc": self.csc,
+            "salindex": self.salindex,
+            "cmd": self.cmd_name,
+            "identity": self.identity,
+            "state": self.state,
+            "status": self.status,
+            "ack": self.ack,
+            "created": self.created,
+            "finished": self.finished,
+            "acks": self.acks,
+        }
+
+
+class CommandJobTable:
+    """Bounded in-memory table of command jobs.
+
+    Finished jobs are kept for ``ttl`` seconds so their result can be
+    polled. When the table is full the oldest finished jobs are dropped
+    to make room for new ones.
+
+    Parameters
+    ----------
+    max_size : `int`, optional
+        Maximum number of jobs in the table.
+    ttl : `float`, optional
+        Time (seconds) finished jobs are kept.
+    """
+
+    def __init__(self, max_size=COMMAND_JOBS_MAX_SIZE, ttl=COMMAND_JOBS_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.jobs = collections.OrderedDict()
+
+    def add(self, job):
+        """Add a job to the table.
+
+        Parameters
+        ----------
+        job : `CommandJob`
+            The job to add.
+
+        Returns
+        -------
+        `bool`
+            True if the job was added, False if the table is full of
+            running jobs.
+        """
+        self.expire()
+        if len(self.jobs) >= self.max_size:
+            finished = [job_id for job_id, job in self.jobs.items() if job.done]
+            for job_id in finished[: len(self.jobs) - self.max_size + 1]:
+                del self.jobs[job_id]
+        if len(self.jobs) >= self.max_size:
+            return False
+        self.jobs[job.job_id] = job
+        return True
+
+    def get(self, job_id):
+        """Get a job by its identifier.
+
+        Parameters
+        ----------
+        job_id : `str`
+            The job identifier.
+
+        Returns
+        -------
+        `CommandJob` or `None`
+            The job, or None if it does not exist or has expired.
+        """
+        self.expire()
+        return self.jobs.get(job_id)
+
+    def expire(self):
+        """Drop the finished jobs older than ``ttl``."""
+        now = time.time()
+        expired = [
+            job_id
+            for job_id, job in self.jobs.items()
+            if job.done and now - job.finished > self.ttl
+        ]
+        for job_id in expired:
+            del self.jobs[job_id]
+
+    async def close(self):
+        """Cancel the running jobs and clear the table."""
+        tasks = [
+            job.task
+            for job in self.jobs.values()
+            if job.task is not None and not job.task.done()
+        ]
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+        self.jobs.clear()
+
+    def stats(self):
+        """Return the table statistics.
+
+        Returns
+        -------
+        `dict`
+            The table configuration and the number of running and
+            finished jobs.
+        """
+        running = sum(1 for job in self.jobs.values() if not job.done)
+        return {
+            "max_size": self.max_size,
+            "ttl": self.ttl,
+            "running": running,
+            "finished": len(self.jobs) - running,
+        }
@@ -0,0 +1,223 @@
+# This file is part of LOVE-commander.
+#
+# Copyright (c) 2023 Inria Chile.
+#
+# Developed by Inria Chile.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or at
+# your option any later version.
+#
+# This program is distributed in the hope that it will be useful,but
+# WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+# or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License
+# for more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program. If not, see <http://www.gnu.org/licenses/>.
+
+import logging
+import os
+
+from lsst.ts import xml
+
+try:
+    from lsst.ts.xml.component_info import ComponentInfo
+except ImportError:
+    from lsst.ts.salobj import ComponentInfo
+
+INTEGER_SAL_TYPES = frozenset(
+    (
+        "byte",
+        "octet",
+        "short",
+        "int",
+        "long",
+        "long long",
+        "unsigned short",
+        "unsigned int",
+        "unsigned long",
+        "unsigned long long",
+    )
+)
+FLOAT_SAL_TYPES = frozenset(("float", "double"))
+
+
+def is_boolean(value):
+    """Check that a value is a boolean."""
+    return isinstance(value, bool)
+
+
+def is_integer(value):
+    """Check that a value is an integer, excluding booleans."""
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def is_number(value):
+    """Check that a value is an integer or a float, excluding booleans."""
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def is_string(value):
+    """Check that a value is a string."""
+    return isinstance(value, str)
+
+
+def compile_field_check(field_info):
+    """Compile the type check of a command field.
+
+    Parameters
+    ----------
+    field_info : ``FieldInfo``
+        The field description, with its SAL type and number of elements.
+
+    Returns
+    -------
+    `callable`
+        Function that receives a value and returns True if it is valid for
+        the field, or None if the SAL type is not known and the value is
+        not checked.
+    """
+    if field_info.sal_type == "boolean":
+        check = is_boolean
+    elif field_info.sal_type in INTEGER_SAL_TYPES:
+        check = is_integer
+    elif field_info.sal_type in FLOAT_SAL_TYPES:
+        check = is_number
+    elif field_info.sal_type == "string":
+        check = is_string
+    else:
+        return None
+
+    count = field_info.count
+    if field_info.sal_type == "string" or count is None or count <= 1:
+        return check
+
+    def check_array(value):
+        return (
+            isinstance(value, list)
+            and len(value) == count
+            and all(check(item) for item in value)
+        )
+
+    return check_array
+
+
+def compile_command_validator(fields):
+    """Compile the validator of the parameters of a command.
+
+    Parameters
+    ----------
+    fields : `dict` [`str`, ``FieldInfo``]
+        The fields of the command topic, indexed by name.
+
+    Returns
+    -------
+    `callable`
+        Function that receives the command parameters and returns the list
+        of errors found, empty if the parameters are valid.
+    """
+    checks = {
+        name: compile_field_check(field_info)
+        for name, field_info in fields.items()
+        if not name.startswith("private_")
+    }
+    type_names = {
+        name: fields[name].sal_type
+        + (f"[{fields[name].count}]" if (fields[name].count or 1) > 1 else "")
+        for name in checks
+    }
+
+    def validate(params):
+        errors = []
+        for name, value in params.items():
+            if name not in checks:
+                errors.append(f"Unknown parameter {name}.")
+            elif checks[name] is not None and not checks[name](value):
+                errors.append(f"Parameter {name} must be of type {type_names[name]}.")
+        return errors
+
+    return validate
+
+
+class CommandValidators:
+    """Validators of the command parameters, compiled once per command from
+    the SAL topics metadata.
+
+    Parameters
+    ----------
+    salinfos : `dict` [`str`, `salobj.SalInfo`], optional
+        SAL Info instances, indexed by CSC name, whose component info is
+        used instead of loading it again. CSCs missing from it have their
+        component info loaded on demand.
+    """
+
+    def __init__(self, salinfos=None):
+        self.salinfos = salinfos if salinfos is not None else dict()
+        self.component_infos = dict()
+        self.validators = dict()
+
+    def get_component_info(self, csc):
+        """Get the component info of a CSC.
+
+        Parameters
+        ----------
+        csc : `str`
+            Name of the CSC.
+
+        Returns
+        -------
+        ``ComponentInfo``
+            The component info.
+        """
+        if csc in self.salinfos:
+            return self.salinfos[csc].component_info
+        if csc not in self.component_infos:
+            self.component_infos[csc] = ComponentInfo(
+                name=csc, topic_subname=os.environ.get("LSST_TOPIC_SUBNAME", "")
+            )
+        return self.component_infos[csc]
+
+    def validate(self, csc, cmd_name, params):
+        """Validate a command request.
+
+        Parameters
+        ----------
+        csc : `str`
+            Name of the CSC.
+        cmd_name : `str`
+            Name of the command, e.g. cmd_enable.
+        params : `dict`
+            Parameters of the command.
+
+        Returns
+        -------
+        `str` or `None`
+            The error message, or None if the command is valid.
+        """
+        key = (csc, cmd_name)
+        if key not in self.validators:
+            if csc not in xml.subsystems:
+                return f"Unknown component {csc}."
+            try:
+                component_info = self.get_component_info(csc)
+            except Exception as e:
+                # Leave the command to salobj rather than rejecting it
+                logging.error(f"Could not load the component info of {csc}: {e}")
+                return None
+            topic_info = (
+                component_info.topics.get(cmd_name)
+                if cmd_name.startswith("cmd_")
+                else None
+            )
+            if topic_info is None:
+                return f"Unknown command {cmd_name} for component {csc}."
+            self.validators[key] = compile_command_validator(topic_info.fields)
+
+        if not isinstance(params, dict):
+            return "Command parameters must be a dictionary."
+        errors = self.validators[key](params)
+        if errors:
+            return f"Invalid parameters for {csc}.{cmd_name}. " + " ".join(errors)
+        return None
@@ -17,12 +17,150 @@
 # You should have received a copy of the GNU General Public License along with
 # this program. If not, see <http://www.gnu.org/licenses/>.
 
+import asyncio
 import json
+import logging
+import math
 import os
+import time
 
-from aiohttp import web
+from aiohttp import WSMsgType, web
 from lsst.ts import salobj
 
+from .circuit_breaker import (
+    CIRCUIT_BREAKER_COOL_DOWN,
+    CIRCUIT_BREAKER_THRESHOLD,
+    CircuitBreakers,
+)
+from .command_jobs import (
+    COMMAND_JOBS_MAX_SIZE,
+    COMMAND_JOBS_TTL,
+    CommandJob,
+    CommandJobTable,
+)
+from .command_schema import CommandValidators
+from .rate_limiter import (
+    RATE_LIMIT_CSC_BURST,
+    RATE_LIMIT_CSC_MAX_IN_FLIGHT,
+    RATE_LIMIT_CSC_RATE,
+    RATE_LIMIT_IDENTITY_BURST,
+    RATE_LIMIT_IDENTITY_MAX_IN_FLIGHT,
+    RATE_LIMIT_IDENTITY_RATE,
+    RateLimits,
+)
+from .remote_pool import (
+    REMOTE_POOL_IDLE_TTL,
+    REMOTE_POOL_MAX_SIZE,
+    REMOTE_POOL_WARM_UP_CONCURRENCY,
+    RemotePool,
+)
+
+COMMAND_KEYS = ["csc", "salindex", "cmd", "params", "identity"]
+BATCH_CONCURRENCY = 10
+DONE_ACK_CODES = frozenset(
+    (
+        salobj.SalRetCode.CMD_ABORTED,
+        salobj.SalRetCode.CMD_COMPLETE,
+        salobj.SalRetCode.CMD_FAILED,
+        salobj.SalRetCode.CMD_NOACK,
+        salobj.SalRetCode.CMD_NOPERM,
+        salobj.SalRetCode.CMD_STALLED,
+        salobj.SalRetCode.CMD_TIMEOUT,
+    )
+)
+
+
+def missing_command_keys(data):
+    """Check that a command request has all the required keys.
+
+    Parameters
+    ----------
+    data : `dict`
+        The command request data.
+
+    Returns
+    -------
+    `bool`
+        True if the data is not a dictionary or misses any of the keys in
+        `COMMAND_KEYS`, False otherwise.
+    """
+    return not isinstance(data, dict) or any(key not in data for key in COMMAND_KEYS)
+
+
+def parse_remotes_list(text):
+    """Parse a list of CSCs to open remotes for.
+
+    Parameters
+    ----------
+    text : `str`
+        CSCs in ``<csc>:<salindex>`` format, separated by commas, spaces or
+        new lines. The index defaults to 0 if omitted, and everything after
+        a ``#`` on a line is ignored.
+
+    Returns
+    -------
+    `list` [`tuple` [`str`, `int`]]
+        The name and SAL index of the CSCs.
+
+    Raises
+    ------
+    ValueError
+        If a SAL index is not an integer.
+    """
+    components = []
+    for line in text.splitlines():
+        for item in line.split("#")[0].replace(",", " ").split():
+            csc, _, salindex = item.partition(":")
+            components.append((csc, int(salindex or 0)))
+    return components
+
+
+def command_response(response_data, status):
+    """Build the HTTP response of a command.
+
+    Parameters
+    ----------
+    response_data : `dict`
+        The response data. If it has a ``retry_after`` key (seconds), it is
+        also sent as a ``Retry-After`` header.
+    status : `int`
+        The HTTP status.
+
+    Returns
+    -------
+    Response
+        The JSON response.
+    """
+    headers = None
+    if "retry_after" in response_data:
+        headers = {"Retry-After": str(math.ceil(response_data["retry_after"]))}
+    return web.json_response(response_data, status=status, headers=headers)
+
+
+def ackcmd_to_dict(ackcmd):
+    """Dump a command acknowledgement to a dictionary.
+
+    Parameters
+    ----------
+    ackcmd : ``AckCmdType``
+        The command acknowledgement.
+
+    Returns
+    -------
+    `dict`
+        Dictionary with the ack code name, error code, result and timeout.
+    """
+    try:
+        ack = salobj.SalRetCode(ackcmd.ack).name
+    except ValueError:
+        ack = str(ackcmd.ack)
+    return {
+        "ack": ack,
+        "error": ackcmd.error,
+        "result": ackcmd.result,
+        "timeout": ackcmd.timeout,
+    }
+
 
 def create_app(*args, **kwargs):
     """Create the Commands application.
@@ -30,28 +168,285 @@ def create_app(*args, **kwargs):
     Define the Commands subapplication, which provides the endpoints to
     accept command requests.
 
+    Parameters
+    ----------
+    salinfos : `dict` [`str`, `salobj.SalInfo`], optional
+        SAL Info instances loaded by the SAL Info application, indexed by CSC
+        name, used to validate the commands without loading their metadata
+        again.
+
     Returns
     -------
     `aiohttp.web.Application`
         The application instance.
     """
-    domain = None
-    remotes = {}
-
     cmd = web.Application()
 
     command_timeouts = int(os.environ.get("COMMAND_TIMEOUTS", "10"))
 
+    remote_pool = RemotePool(
+        max_size=int(os.environ.get("COMMAND_REMOTES_MAX_SIZE", REMOTE_POOL_MAX_SIZE)),
+        idle_ttl=float(
+            os.environ.get("COMMAND_REMOTES_IDLE_TTL", REMOTE_POOL_IDLE_TTL)
+        ),
+    )
+
+    batch_concurrency = int(
+        os.environ.get("COMMAND_BATCH_CONCURRENCY", BATCH_CONCURRENCY)
+    )
+
+    circuit_breakers = CircuitBreakers(
+        threshold=int(
+            os.environ.get("COMMAND_BREAKER_THRESHOLD", CIRCUIT_BREAKER_THRESHOLD)
+        ),
+        cool_down=float(
+            os.environ.get("COMMAND_BREAKER_COOL_DOWN", CIRCUIT_BREAKER_COOL_DOWN)
+        ),
+    )
+
+    rate_limits = RateLimits(
+        csc_rate=float(os.environ.get("COMMAND_CSC_RATE", RATE_LIMIT_CSC_RATE)),
+        csc_burst=int(os.environ.get("COMMAND_CSC_BURST", RATE_LIMIT_CSC_BURST)),
+        csc_max_in_flight=int(
+            os.environ.get("COMMAND_CSC_MAX_IN_FLIGHT", RATE_LIMIT_CSC_MAX_IN_FLIGHT)
+        ),
+        identity_rate=float(
+            os.environ.get("COMMAND_IDENTITY_RATE", RATE_LIMIT_IDENTITY_RATE)
+        ),
+        identity_burst=int(
+            os.environ.get("COMMAND_IDENTITY_BURST", RATE_LIMIT_IDENTITY_BURST)
+        ),
+        identity_max_in_flight=int(
+            os.environ.get(
+                "COMMAND_IDENTITY_MAX_IN_FLIGHT", RATE_LIMIT_IDENTITY_MAX_IN_FLIGHT
+            )
+        ),
+    )
+
+    warm_up_status = {
+        "state": "idle",
+        "started": None,
+        "elapsed": None,
+        "remotes": {},
+    }
+    warm_up_task = None
+
+    command_jobs = CommandJobTable(
+        max_size=int(os.environ.get("COMMAND_JOBS_MAX_SIZE", COMMAND_JOBS_MAX_SIZE)),
+        ttl=float(os.environ.get("COMMAND_JOBS_TTL", COMMAND_JOBS_TTL)),
+    )
+
+    command_validators = CommandValidators(salinfos=kwargs.get("salinfos"))
+
+    async def run_command(csc, salindex, cmd_name, params, identity, on_ack=None):
+        """Run a command on a CSC and wait for its final acknowledgement.
+
+        Parameters
+        ----------
+        csc : `str`
+            Name of the CSC.
+        salindex : `int`
+            SAL index of the CSC.
+        cmd_name : `str`
+            Name of the command, e.g. cmd_enable.
+        params : `dict`
+            Parameters of the command.
+        identity : `str`
+            Identity of the user sending the command.
+        on_ack : `callable`, optional
+            Function called with every acknowledgement of the command, as
+            returned by `ackcmd_to_dict`, as soon as it is received.
+
+        Returns
+        -------
+        `tuple` [`dict`, `int`]
+            The response data and its HTTP status.
+        """
+        # Reject invalid commands before any remote is created
+        error = command_validators.validate(csc, cmd_name, params)
+        if error is not None:
+            return {"ack": error}, 400
+
+        # Check the breaker first, so rejected commands don't take tokens
+        breaker = circuit_breakers.get(csc, salindex)
+        if not breaker.allow():
+            return {
+                "ack": f"Component {csc}.{salindex} is not acknowledging commands. "
+                "Command rejected.",
+                "retry_after": breaker.retry_after(),
+            }, 503
+
+        retry_after = rate_limits.acquire(csc, salindex, identity)
+        if retry_after > 0:
+            breaker.record(None)
+            return {
+                "ack": f"Too many commands for {csc}.{salindex} or from {identity}. "
+                "Command rejected.",
+                "retry_after": retry_after,
+            }, 429
+        try:
+            return await run_limited_command(
+                breaker, csc, salindex, cmd_name, params, identity, on_ack
+            )
+        finally:
+            rate_limits.release(csc, salindex, identity)
+
+    async def run_limited_command(
+        breaker, csc, salindex, cmd_name, params, identity, on_ack
+    ):
+        """Run a command that was accepted by the circuit breaker and the
+        rate limits.
+
+        Parameters
+        ----------
+        breaker : `CircuitBreaker`
+            The circuit breaker of the CSC, which allowed the command.
+        csc : `str`
+            Name of the CSC.
+        salindex : `int`
+            SAL index of the CSC.
+        cmd_name : `str`
+            Name of the command, e.g. cmd_enable.
+        params : `dict`
+            Parameters of the command.
+        identity : `str`
+            Identity of the user sending the command.
+        on_ack : `callable` or `None`
+            Function called with every acknowledgement of the command.
+
+        Returns
+        -------
+        `tuple` [`dict`, `int`]
+            The response data and its HTTP status.
+        """
+        # Whether the CSC acknowledged the command, None if it was not sent
+        responsive = None
+        try:
+            async with remote_pool.acquire(csc, salindex) as remote:
+                cmd = getattr(remote, cmd_name)
+                # `set` updates the data of the topic in place, so start
+                # from a new instance, which is kept for this command only
+                # so concurrent commands don't overwrite it.
+                cmd.data = cmd.DataType()
+                cmd.set(**params)
+                data = cmd.data
+
+                try:
+                    cmd_result = await send_command(
+                        remote_pool.identity_gate(csc, salindex),
+                        cmd,
+                        data,
+                        identity,
+                        on_ack,
+                    )
+                    responsive = True
+                    return {"ack": cmd_result.result}, 200
+                except salobj.AckTimeoutError as e:
+                    responsive = e.ackcmd.ack != salobj.SalRetCode.CMD_NOACK
+                    msg = (
+                        "No ack received from component."
+                        if not responsive
+                        else f"Last ack received {e.ackcmd}."
+                    )
+                    return {"ack": f"Command time out. {msg}"}, 504
+                except salobj.AckError:
+                    responsive = True
+                    raise
+        finally:
+            breaker.record(responsive)
+
+    async def send_command(identity_gate, cmd, data, identity, on_ack=None):
+        """Send a command with a given identity and wait for it to finish.
+
+        The identity gate of the remote is only held until the command is
+        written, as done by `IdentityGate.start_command`, not while waiting
+        for its acknowledgements. So commands to the same CSC from different
+        users run concurrently once they have been sent, and an unresponsive
+        CSC does not keep other users waiting for the command timeout.
+
+        Parameters
+        ----------
+        identity_gate : `IdentityGate`
+            The identity gate of the remote.
+        cmd : `salobj.topics.RemoteCommand`
+            The command to send.
+        data : ``cmd.DataType``
+            The command data.
+        identity : `str`
+            Identity of the user sending the command.
+        on_ack : `callable`, optional
+            Function called with every acknowledgement of the command.
+
+        Returns
+        -------
+        ``AckCmdType``
+            The final command acknowledgement.
+
+        Raises
+        ------
+        salobj.AckError
+            If the command fails or times out.
+        """
+        try:
+            start = await identity_gate.start_command(
+                cmd, data, identity, command_timeouts
+            )
+            ackcmd = await start
+            if on_ack is None:
+                if ackcmd.ack not in DONE_ACK_CODES:
+                    ackcmd = await cmd.next_ackcmd(
+                        ackcmd, timeout=command_timeouts, wait_done=True
+                    )
+                return ackcmd
+
+            while ackcmd.ack not in DONE_ACK_CODES:
+                on_ack(ackcmd_to_dict(ackcmd))
+                # In progress acks may extend the time to wait for the next one
+                timeout = max(command_timeouts, ackcmd.timeout)
+                ackcmd = await cmd.next_ackcmd(ackcmd, timeout=timeout, wait_done=False)
+        except salobj.AckError as e:
+            if on_ack is not None:
+                on_ack(ackcmd_to_dict(e.ackcmd))
+            raise
+        on_ack(ackcmd_to_dict(ackcmd))
+        return ackcmd
+
+    async def try_run_command(csc, salindex, cmd_name, params, identity, on_ack=None):
+        """Run a command, turning any failure into an error response.
+
+        Used where a failed command must not fail the whole request,
+        e.g. in batches and background jobs.
+
+        Parameters
+        ----------
+        csc : `str`
+            Name of the CSC.
+        salindex : `int`
+            SAL index of the CSC.
+        cmd_name : `str`
+            Name of the command, e.g. cmd_enable.
+        params : `dict`
+            Parameters of the command.
+        identity : `str`
+            Identity of the user sending the command.
+        on_ack : `callable`, optional
+            Function called with every acknowledgement of the command.
+
+        Returns
+        -------
+        `tuple` [`dict`, `int`]
+            The response data and its HTTP status.
+        """
+        try:
+            return await run_command(
+                csc, salindex, cmd_name, params, identity, on_ack=on_ack
+            )
+        except Exception as e:
+            return {"ack": f"Command failed. {e}"}, 500
+
     async def start_cmd(request):
-        nonlocal domain
         data = await request.json()
-        try:
-            assert "csc" in data
-            assert "salindex" in data
-            assert "cmd" in data
-            assert "params" in data
-            assert "identity" in data
-        except AssertionError:
+        if missing_command_keys(data):
             return web.json_response(
                 {
                     "ack": f"Request must have JSON data with the following "
@@ -60,55 +455,640 @@ def create_app(*args, **kwargs):
                 status=400,
             )
 
-        csc = data["csc"]
-        salindex = data["salindex"]
-        cmd_name = data["cmd"]
-        params = data["params"]
-        identity = data["identity"]
-        remote_name = f"{csc}.{salindex}"
-
-        # Only create domain if it does not already exist.
-        if domain is None:
-            print("Creating salobj.Domain()")
-            domain = salobj.Domain()
-            domain.default_identity = "LOVE"
-
-        # Only create remote if it does not exist already.
-        if remote_name not in remotes:
-            print(f"Creating remote {remote_name}.")
-            # Create remote for commanding only, exclude all events and
-            # telemetry topics
-            remotes[remote_name] = salobj.Remote(domain, csc, salindex, include=[])
-            await remotes[remote_name].start_task
-
-        cmd = getattr(remotes[remote_name], cmd_name)
-        cmd.set(**params)
+        response_data, status = await run_command(
+            data["csc"],
+            data["salindex"],
+            data["cmd"],
+            data["params"],
+            data["identity"],
+        )
+        return command_response(response_data, status)
+
+    async def run_batch_item(index, item, semaphore):
+        """Run one of the commands of a batch request.
+
+        Parameters
+        ----------
+        index : `int`
+            Position of the command in the batch.
+        item : `dict`
+            The command data, with the same keys as a single command request.
+        semaphore : `asyncio.Semaphore`
+            Semaphore that bounds the number of commands running at once.
+
+        Returns
+        -------
+        `dict`
+            The command result, with its position, CSC, command, HTTP status,
+            ack and elapsed time in seconds.
+        """
+        start_time = time.monotonic()
+        result = {"index": index}
+        if missing_command_keys(item):
+            response_data = {
+                "ack": f"Batch item must have the following keys: "
+                f"csc, salindex, cmd, params, identity. Received {json.dumps(item)}"
+            }
+            status = 400
+        else:
+            result.update(csc=item["csc"], salindex=item["salindex"], cmd=item["cmd"])
+            async with semaphore:
+                response_data, status = await try_run_command(
+                    item["csc"],
+                    item["salindex"],
+                    item["cmd"],
+                    item["params"],
+                    item["identity"],
+                )
+        result.update(response_data)
+        result["status"] = status
+        result["elapsed"] = time.monotonic() - start_time
+        return result
+
+    async def start_batch_cmd(request):
+        """Handle batch command requests.
 
+        Run a list of commands concurrently, with at most
+        ``COMMAND_BATCH_CONCURRENCY`` (or the requested ``concurrency``,
+        if lower) commands running at once.
+
+        Parameters
+        ----------
+        request : `Request`
+            The original HTTP request, with the following structure:
+
+            .. code-block:: json
+
+                {
+                    "commands": [
+                        {
+                            "csc": "<Name of the CSC>",
+                            "salindex": "<SAL index of the CSC>",
+                            "cmd": "<Command name>",
+                            "params": {"<param_1>": "<value_1>"},
+                            "identity": "<User identity>"
+                        }
+                    ],
+                    "concurrency": "<Optional, commands to run at once>",
+                    "stream": "<Optional, if true stream the results>"
+                }
+
+        Returns
+        -------
+        Response
+            If ``stream`` is true, a newline delimited JSON stream with one
+            result per line in completion order. Otherwise a response with
+            the following structure, with results in request order:
+
+            .. code-block:: json
+
+                {
+                    "results": [
+                        {
+                            "index": "<Position of the command in the batch>",
+                            "csc": "<Name of the CSC>",
+                            "salindex": "<SAL index of the CSC>",
+                            "cmd": "<Command name>",
+                            "ack": "<Command result>",
+                            "status": "<HTTP status of the command>",
+                            "elapsed": "<Command duration in seconds>"
+                        }
+                    ],
+                    "elapsed": "<Batch duration in seconds>"
+                }
+        """
+        data = await request.json()
         try:
-            remotes[remote_name].salinfo.identity = identity
-            cmd_result = await cmd.start(timeout=command_timeouts)
-            return web.json_response({"ack": cmd_result.result})
-        except salobj.AckTimeoutError as e:
-            msg = (
-                "No ack received from component."
-                if e.ackcmd == salobj.SalRetCode.CMD_NOACK
-                else f"Last ack received {e.ackcmd}."
+            commands = data["commands"]
+            assert isinstance(commands, list)
+            concurrency = min(
+                int(data.get("concurrency", batch_concurrency)), batch_concurrency
+            )
+            assert concurrency > 0
+        except Exception:
+            return web.json_response(
+                {
+                    "ack": "Request must have JSON data with a list of commands "
+                    f"and an optional positive concurrency. Received {json.dumps(data)}"
+                },
+                status=400,
+            )
+
+        start_time = time.monotonic()
+        semaphore = asyncio.Semaphore(concurrency)
+        tasks = [
+            asyncio.create_task(run_batch_item(index, item, semaphore))
+            for index, item in enumerate(commands)
+        ]
+
+        if not data.get("stream", False):
+            results = await asyncio.gather(*tasks)
+            return web.json_response(
+                {"results": results, "elapsed": time.monotonic() - start_time}
             )
-            return web.json_response({"ack": f"Command time out. {msg}"}, status=504)
+
+        response = web.StreamResponse(headers={"Content-Type": "application/x-ndjson"})
+        await response.prepare(request)
+        try:
+            for next_result in asyncio.as_completed(tasks):
+                result = await next_result
+                await response.write((json.dumps(result) + "\n").encode())
+        finally:
+            for task in tasks:
+                task.cancel()
+        await response.write_eof()
+        return response
+
+    async def run_job(job, params):
+        """Run the command of a job and record its result.
+
+        Parameters
+        ----------
+        job : `CommandJob`
+            The job to run.
+        params : `dict`
+            Parameters of the command.
+        """
+        try:
+            response_data, status = await try_run_command(
+                job.csc,
+                job.salindex,
+                job.cmd_name,
+                params,
+                job.identity,
+                on_ack=job.add_ack,
+            )
+        except asyncio.CancelledError:
+            job.finish("Command cancelled.", 503)
+            raise
+        job.finish(response_data["ack"], status)
+
+    def start_job(data):
+        """Create a job for a command and start it in the background.
+
+        Parameters
+        ----------
+        data : `dict`
+            The command request data.
+
+        Returns
+        -------
+        `CommandJob` or `None`
+            The job, or None if the job table is full.
+        """
+        job = CommandJob(data["csc"], data["salindex"], data["cmd"], data["identity"])
+        if not command_jobs.add(job):
+            return None
+        job.task = asyncio.create_task(run_job(job, data["params"]))
+        return job
+
+    async def start_cmd_job(request):
+        """Handle asynchronous command requests.
+
+        Start the command in the background and return immediately, the
+        result can then be polled with `get_cmd_job`.
+
+        Parameters
+        ----------
+        request : `Request`
+            The original HTTP request, with the same structure as a
+            synchronous command request.
+
+        Returns
+        -------
+        Response
+            The response for the HTTP request, with status 202 and the
+            following structure:
+
+            .. code-block:: json
+
+                {
+                    "job_id": "<Job identifier>",
+                    "csc": "<Name of the CSC>",
+                    "salindex": "<SAL index of the CSC>",
+                    "cmd": "<Command name>",
+                    "identity": "<User identity>",
+                    "state": "running",
+                    "status": null,
+                    "ack": null,
+                    "created": "<Creation timestamp>",
+                    "finished": null,
+                    "acks": []
+                }
+        """
+        data = await request.json()
+        if missing_command_keys(data):
+            return web.json_response(
+                {
+                    "ack": f"Request must have JSON data with the following "
+                    "keys: csc, salindex, cmd_name, params, identity. "
+                    f"Received {json.dumps(data)}"
+                },
+                status=400,
+            )
+
+        error = command_validators.validate(data["csc"], data["cmd"], data["params"])
+        if error is not None:
+            return web.json_response({"ack": error}, status=400)
+
+        job = start_job(data)
+        if job is None:
+            return web.json_response(
+                {"ack": "Too many command jobs running, try again later."},
+                status=503,
+            )
+        return web.json_response(job.to_dict(), status=202)
+
+    async def get_cmd_job(request):
+        """Handle command job status requests.
+
+        Parameters
+        ----------
+        request : `Request`
+            The original HTTP request.
+
+        Returns
+        -------
+        Response
+            The response for the HTTP request, with the job as returned by
+            `start_cmd_job`. Once finished, ``state`` is one of done,
+            timeout or failed, and ``status`` and ``ack`` hold the result
+            the synchronous request would have returned.
+        """
+        job = command_jobs.get(request.match_info["job_id"])
+        if job is None:
+            return web.json_response({"ack": "Command job not found."}, status=404)
+        return web.json_response(job.to_dict())
+
+    async def get_cmd_jobs_stats(request):
+        """Handle command jobs statistics requests.
+
+        Parameters
+        ----------
+        request : `Request`
+            The original HTTP request.
+
+        Returns
+        -------
+        Response
+            The response for the HTTP request with the following structure:
+
+            .. code-block:: json
+
+                {
+                    "max_size": "<Maximum number of jobs kept>",
+                    "ttl": "<Seconds finished jobs are kept>",
+                    "running": "<Number of running jobs>",
+                    "finished": "<Number of finished jobs kept>"
+                }
+        """
+        return web.json_response(command_jobs.stats())
+
+    async def stream_cmd(request):
+        """Handle command acknowledgements streaming requests.
+
+        Open a WebSocket where the client can send commands, with the same
+        structure as a synchronous command request, or subscribe to
+        existing command jobs by sending ``{"job_id": "<Job identifier>"}``.
+        Commands run as jobs, so any number of clients can follow the same
+        command and they all share the remote of the CSC.
+
+        For every command the WebSocket receives each acknowledgement as it
+        arrives, with the following structure:
+
+        .. code-block:: json
+
+            {
+                "type": "ack",
+                "job_id": "<Job identifier>",
+                "ack": "<Ack code name, e.g. CMD_INPROGRESS>",
+                "error": "<Error code>",
+                "result": "<Ack result message>",
+                "timeout": "<Ack timeout>"
+            }
+
+        Followed by a message with ``"type": "result"`` and the finished
+        job, as returned by `get_cmd_job`.
+
+        Parameters
+        ----------
+        request : `Request`
+            The original HTTP request.
+
+        Returns
+        -------
+        `aiohttp.web.WebSocketResponse`
+            The WebSocket response.
+        """
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        forward_tasks = set()
+
+        async def forward(job):
+            queue = job.subscribe()
+            try:
+                message = await queue.get()
+                while message is not None:
+                    await ws.send_json(message)
+                    message = await queue.get()
+            finally:
+                job.unsubscribe(queue)
+
+        try:
+            async for msg in ws:
+                if msg.type != WSMsgType.TEXT:
+                    continue
+                try:
+                    data = json.loads(msg.data)
+                except ValueError:
+                    data = None
+
+                if isinstance(data, dict) and "job_id" in data:
+                    job = command_jobs.get(data["job_id"])
+                    error = None if job is not None else "Command job not found."
+                elif not missing_command_keys(data):
+                    error = command_validators.validate(
+                        data["csc"], data["cmd"], data["params"]
+                    )
+                    job = start_job(data) if error is None else None
+                    if error is None and job is None:
+                        error = "Too many command jobs running, try again later."
+                else:
+                    job = None
+                    error = (
+                        "Message must have a job_id or the following keys: "
+                        f"csc, salindex, cmd, params, identity. Received {msg.data}"
+                    )
+
+                if error is not None:
+                    await ws.send_json({"type": "error", "ack": error})
+                    continue
+                task = asyncio.create_task(forward(job))
+                forward_tasks.add(task)
+                task.add_done_callback(forward_tasks.discard)
+        finally:
+            for task in list(forward_tasks):
+                task.cancel()
+        return ws
+
+    def get_warm_up_remotes():
+        """Get the CSCs whose remotes are opened at start up.
+
+        They are read from the ``COMMAND_PREWARM_REMOTES`` environment
+        variable and from the file at ``COMMAND_PREWARM_FILE``, both in the
+        format accepted by `parse_remotes_list`.
+
+        Returns
+        -------
+        `list` [`tuple` [`str`, `int`]]
+            The name and SAL index of the CSCs, without duplicates.
+        """
+        text = os.environ.get("COMMAND_PREWARM_REMOTES", "")
+        path = os.environ.get("COMMAND_PREWARM_FILE")
+        if path:
+            try:
+                with open(path) as f:
+                    text += "\n" + f.read()
+            except OSError as e:
+                logging.error(f"Could not read remotes to warm up from {path}: {e}")
+        try:
+            components = parse_remotes_list(text)
+        except ValueError as e:
+            logging.error(f"Invalid list of remotes to warm up: {e}")
+            return []
+        return list(dict.fromkeys(components))
+
+    async def warm_up_remotes(components):
+        """Open the remotes of the given CSCs and record the timing.
+
+        Parameters
+        ----------
+        components : `list` [`tuple` [`str`, `int`]]
+            The name and SAL index of the CSCs.
+        """
+        concurrency = int(
+            os.environ.get(
+                "COMMAND_PREWARM_CONCURRENCY", REMOTE_POOL_WARM_UP_CONCURRENCY
+            )
+        )
+        logging.info(f"Warming up {len(components)} remotes.")
+        warm_up_status["state"] = "warming"
+        warm_up_status["started"] = time.time()
+        start_time = time.monotonic()
+        warm_up_status["remotes"] = await remote_pool.warm_up(
+            components, concurrency=concurrency
+        )
+        warm_up_status["elapsed"] = time.monotonic() - start_time
+        warm_up_status["state"] = "ready"
+        failed = [
+            name
+            for name, result in warm_up_status["remotes"].items()
+            if result["error"] is not None
+        ]
+        logging.info(
+            f"Warmed up {len(components) - len(failed)} of {len(components)} "
+            f"remotes in {warm_up_status['elapsed']:.2f} s."
+        )
+
+    async def get_readiness(request):
+        """Handle readiness requests.
+
+        Parameters
+        ----------
+        request : `Request`
+            The original HTTP request.
+
+        Returns
+        -------
+        Response
+            The response for the HTTP request, with status 503 while the
+            remotes are being warmed up and 200 otherwise, and the following
+            structure:
+
+            .. code-block:: json
+
+                {
+                    "state": "<idle, warming or ready>",
+                    "started": "<Warm up start timestamp>",
+                    "elapsed": "<Warm up duration in seconds>",
+                    "remotes": {
+                        "<csc>.<salindex>": {
+                            "elapsed": "<Remote start up duration in seconds>",
+                            "error": "<Error message, if the remote failed>"
+                        }
+                    }
+                }
+        """
+        status = 503 if warm_up_status["state"] == "warming" else 200
+        return web.json_response(warm_up_status, status=status)
+
+    async def get_circuit_breakers(request):
+        """Handle circuit breakers state requests.
+
+        Parameters
+        ----------
+        request : `Request`
+            The original HTTP request.
+
+        Returns
+        -------
+        Response
+            The response for the HTTP request with the following structure:
+
+            .. code-block:: json
+
+                {
+                    "threshold": "<Unacknowledged commands that open a breaker>",
+                    "cool_down": "<Seconds a breaker stays open>",
+                    "open": "<Number of open or half open breakers>",
+                    "trips": "<Total number of times breakers opened>",
+                    "rejections": "<Total number of rejected commands>",
+                    "breakers": {
+                        "<csc>.<salindex>": {
+                            "state": "<closed, open or half_open>",
+                            "failures": "<Consecutive unacknowledged commands>",
+                            "retry_after": "<Seconds before the next probe>",
+                            "trips": "<Number of times the breaker opened>",
+                            "rejections": "<Number of rejected commands>",
+                            "probes": "<Number of probe commands sent>"
+                        }
+                    }
+                }
+        """
+        return web.json_response(circuit_breakers.stats())
+
+    async def get_rate_limits(request):
+        """Handle command rate limits requests.
+
+        Parameters
+        ----------
+        request : `Request`
+            The original HTTP request.
+
+        Returns
+        -------
+        Response
+            The response for the HTTP request with the following structure:
+
+            .. code-block:: json
+
+                {
+                    "csc": {
+                        "rate": "<Commands per second for each CSC>",
+                        "burst": "<Commands at once for each CSC>",
+                        "max_in_flight": "<Commands in flight for each CSC>"
+                    },
+                    "identity": {
+                        "rate": "<Commands per second from each identity>",
+                        "burst": "<Commands at once from each identity>",
+                        "max_in_flight": "<Commands in flight from each identity>"
+                    },
+                    "in_flight": "<Total number of commands in flight>",
+                    "rejections": "<Total number of rejected commands>",
+                    "cscs": {
+                        "<csc>.<salindex>": {
+                            "in_flight": "<Number of commands in flight>",
+                            "tokens": "<Tokens left in the bucket>",
+                            "accepted": "<Number of accepted commands>",
+                            "rejections": "<Number of rejected commands>"
+                        }
+                    },
+                    "identities": {
+                        "<identity>": {
+                            "in_flight": "<Number of commands in flight>",
+                            "tokens": "<Tokens left in the bucket>",
+                            "accepted": "<Number of accepted commands>",
+                            "rejections": "<Number of rejected commands>"
+                        }
+                    }
+                }
+        """
+        return web.json_response(rate_limits.stats())
+
+    async def get_remote_pool_stats(request):
+        """Handle remote pool statistics requests.
+
+        Parameters
+        ----------
+        request : `Request`
+            The original HTTP request.
+
+        Returns
+        -------
+        Response
+            The response for the HTTP request with the following structure:
+
+            .. code-block:: json
+
+                {
+                    "max_size": "<Maximum number of remotes>",
+                    "idle_ttl": "<Seconds before an unused remote is closed>",
+                    "live": "<Number of open remotes>",
+                    "in_use": "<Number of commands running>",
+                    "hits": "<Number of requests served by an open remote>",
+                    "misses": "<Number of remotes created>",
+                    "evictions": "<Number of remotes closed to free space>",
+                    "expirations": "<Number of idle remotes closed>",
+                    "coalesced": "<Number of requests that waited on a remote
+                        being started>",
+                    "starting": "<Number of remotes being started>",
+                    "closing": "<Number of remotes being closed>",
+                    "remotes": ["<csc>.<salindex>", "..."]
+                }
+        """
+        return web.json_response(remote_pool.stats())
 
     cmd.router.add_post("/", start_cmd)
+    cmd.router.add_post("/batch", start_batch_cmd)
+    cmd.router.add_post("/batch/", start_batch_cmd)
+    cmd.router.add_post("/jobs", start_cmd_job)
+    cmd.router.add_post("/jobs/", start_cmd_job)
+    cmd.router.add_get("/jobs", get_cmd_jobs_stats)
+    cmd.router.add_get("/jobs/", get_cmd_jobs_stats)
+    cmd.router.add_get("/jobs/{job_id}", get_cmd_job)
+    cmd.router.add_get("/jobs/{job_id}/", get_cmd_job)
+    cmd.router.add_get("/stream", stream_cmd)
+    cmd.router.add_get("/stream/", stream_cmd)
+    cmd.router.add_get("/ready", get_readiness)
+    cmd.router.add_get("/ready/", get_readiness)
+    cmd.router.add_get("/breakers", get_circuit_breakers)
+    cmd.router.add_get("/breakers/", get_circuit_breakers)
+    cmd.router.add_get("/limits", get_rate_limits)
+    cmd.router.add_get("/limits/", get_rate_limits)
+    cmd.router.add_get("/pool", get_remote_pool_stats)
+    cmd.router.add_get("/pool/", get_remote_pool_stats)
+
+    async def on_startup(cmd_app):
+        """Start the remote pool reaper and the remotes warm up when
+        starting the application.
+
+        Parameters
+        ----------
+        cmd_app : `aiohttp.web.Application`
+            The Commands application.
+        """
+        nonlocal warm_up_task
+        remote_pool.start()
+        components = get_warm_up_remotes()
+        if components:
+            warm_up_task = asyncio.create_task(warm_up_remotes(components))
 
     async def on_cleanup(cmd_app):
-        """Close the remotes when cleaning the application.
+        """Cancel the command jobs and close the remotes when cleaning the
+        application.
 
         Parameters
         ----------
         cmd_app : `aiohttp.web.Application`
             The Commands application.
         """
-        for remote_name in remotes:
-            await remotes[remote_name].close()
+        if warm_up_task is not None:
+            warm_up_task.cancel()
+            await asyncio.gather(warm_up_task, return_exceptions=True)
+        await command_jobs.close()
+        await remote_pool.close()
 
+    cmd.on_startup.append(on_startup)
     cmd.on_cleanup.append(on_cleanup)
 
     return cmd
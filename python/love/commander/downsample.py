@@ -0,0 +1,173 @@
+# This file is part of LOVE-commander.
+#
+# Copyright (c) 2023 Inria Chile.
+#
+# Developed by Inria Chile.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or at
+# your option any later version.
+#
+# This program is distributed in the hope that it will be useful,but
+# WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+# or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License
+# for more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program. If not, see <http://www.gnu.org/licenses/>.
+
+import numpy as np
+import pandas as pd
+
+DOWNSAMPLE_METHODS = ("lttb", "minmax")
+
+
+def bucket_edges(size, buckets):
+    """Split the points between the first and the last one in buckets.
+
+    Parameters
+    ----------
+    size : `int`
+        Number of points.
+    buckets : `int`
+        Number of buckets.
+
+    Returns
+    -------
+    `numpy.ndarray`
+        Position of the first point of each bucket, followed by the
+        position of the last point.
+    """
+    return np.floor(np.linspace(1, size - 1, buckets + 1)).astype(np.int64)
+
+
+def lttb_indices(x, y, max_points):
+    """Select points with the Largest-Triangle-Three-Buckets algorithm.
+
+    The first and the last points are kept, and one point is selected in
+    each bucket between them: the one that forms the largest triangle with
+    the point selected in the previous bucket and the average of the next
+    bucket. Averages are computed for every bucket at once, the selection
+    in each bucket is vectorized.
+
+    Parameters
+    ----------
+    x : `numpy.ndarray`
+        X coordinates of the points, sorted.
+    y : `numpy.ndarray`
+        Y coordinates of the points, without NaN.
+    max_points : `int`
+        Number of points to select, at least 3.
+
+    Returns
+    -------
+    `numpy.ndarray`
+        Positions of the selected points.
+    """
+    size = len(x)
+    if size <= max_points:
+        return np.arange(size)
+
+    edges = bucket_edges(size, max_points - 2)
+    counts = np.diff(edges)
+    # Average of the next bucket of each bucket, the last point for the last
+    averages_x = np.append(np.add.reduceat(x[1:-1], edges[:-1] - 1) / counts, x[-1])
+    averages_y = np.append(np.add.reduceat(y[1:-1], edges[:-1] - 1) / counts, y[-1])
+
+    selected = np.empty(max_points, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = size - 1
+    a = 0
+    for bucket in range(max_points - 2):
+        start, end = edges[bucket], edges[bucket + 1]
+        next_x, next_y = averages_x[bucket + 1], averages_y[bucket + 1]
+        areas = np.abs(
+            (x[a] - next_x) * (y[start:end] - y[a])
+            - (x[a] - x[start:end]) * (next_y - y[a])
+        )
+        a = start + int(np.argmax(areas))
+        selected[bucket + 1] = a
+    return selected
+
+
+def minmax_indices(y, max_points):
+    """Select the minimum and the maximum of each bucket.
+
+    Parameters
+    ----------
+    y : `numpy.ndarray`
+        Y coordinates of the points, without NaN.
+    max_points : `int`
+        Maximum number of points to select, at least 2.
+
+    Returns
+    -------
+    `numpy.ndarray`
+        Positions of the selected points, sorted.
+    """
+    size = len(y)
+    if size <= max_points:
+        return np.arange(size)
+
+    buckets = np.repeat(
+        np.arange(max_points // 2),
+        np.diff(np.floor(np.linspace(0, size, max_points // 2 + 1)).astype(np.int64)),
+    )
+    grouped = pd.Series(y).groupby(buckets)
+    return np.unique(np.concatenate([grouped.idxmin(), grouped.idxmax()]))
+
+
+def downsample_frame(frame, max_points, method="lttb"):
+    """Downsample each field of a time series.
+
+    Fields are downsampled independently, ignoring their missing values.
+    The rows selected for any of them are kept, and the values of each
+    field that were not selected for it are masked as missing, so each
+    numeric field has at most ``max_points`` values. Fields that are not
+    numeric are not used to select rows, nor masked. Unlike averaging bins,
+    the selected points are actual values, so peaks are kept.
+
+    Parameters
+    ----------
+    frame : `pandas.DataFrame`
+        The time series, indexed by time.
+    max_points : `int`
+        Number of points to select for each field.
+    method : `str`, optional
+        One of `DOWNSAMPLE_METHODS`: ``lttb`` for `lttb_indices` or
+        ``minmax`` for `minmax_indices`.
+
+    Returns
+    -------
+    `pandas.DataFrame`
+        The downsampled time series.
+    """
+    fields = [
+        field
+        for field in frame.columns
+        if pd.api.types.is_numeric_dtype(frame[field])
+        and not pd.api.types.is_bool_dtype(frame[field])
+    ]
+    if len(frame) <= max_points or not fields:
+        return frame
+
+    times = frame.index.asi8
+    x = (times - times[0]).astype(np.float64)
+    selected_rows = dict()
+    for field in fields:
+        y = frame[field].to_numpy(dtype=np.float64)
+        positions = np.flatnonzero(~np.isnan(y))
+        if method == "minmax":
+            selected = minmax_indices(y[positions], max_points)
+        else:
+            selected = lttb_indices(x[positions], y[positions], max_points)
+        rows = np.zeros(len(frame), dtype=bool)
+        rows[positions[selected]] = True
+        selected_rows[field] = rows
+
+    keep = np.logical_or.reduce(list(selected_rows.values()))
+    result = frame[keep].copy()
+    for field, rows in selected_rows.items():
+        result[field] = result[field].where(rows[keep])
+    return result
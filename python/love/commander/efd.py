@@ -18,20 +18,64 @@
 # this program. If not, see <http://www.gnu.org/licenses/>.
 
 import asyncio
+import json
 import logging
-import math
-import signal
+import os
+import time
 
 import lsst_efd_client
-from aiohttp import web
+import pandas as pd
+from aiohttp import MultipartWriter, WSMsgType, web
 from astropy.time import Time, TimeDelta
 
-EFD_CLIENT_CONNECTION_TIMEOUT = 5
-efd_clients = dict()
+from .aggregate import AGGREGATIONS, is_aggregation
+from .downsample import DOWNSAMPLE_METHODS, downsample_frame
+from .efd_batch import EFD_BATCH_MAX_STATEMENTS, QueryBatcher
+from .efd_cache import (
+    EFD_CACHE_MAX_BYTES,
+    EFD_CACHE_MAX_TTL,
+    EFD_CACHE_MIN_TTL,
+    EFD_CACHE_TTL_FACTOR,
+    EFD_WINDOW_CACHE_MAX_BYTES,
+    EFD_WINDOW_LAG,
+    EFD_WINDOW_TTL,
+    QueryCache,
+    TimeSeriesWindow,
+    dataframe_size,
+    resample_frame,
+)
+from .efd_clients import EfdClientManager
+from .efd_format import (
+    ARROW_AVAILABLE,
+    ARROW_STREAM_TYPE,
+    EFD_FORMATS,
+    EFD_LOGS_LIMIT,
+    PARQUET_TYPE,
+    accepted_binary_type,
+    serialize_frame,
+    to_arrow_stream,
+    to_arrow_table,
+    to_log_records,
+    to_parquet,
+)
+from .efd_live import (
+    EFD_LIVE_BACKOFF,
+    EFD_LIVE_MAX_INTERVAL,
+    EFD_LIVE_MIN_INTERVAL,
+    EFD_LIVE_QUEUE_SIZE,
+    LivePollers,
+)
+from .efd_pagination import (
+    build_page_query,
+    cut_page,
+    decode_cursor,
+    merge_pages,
+    page_records,
+    skip_returned,
+)
 
-
-def raise_timeout(*args):
-    raise TimeoutError
+EFD_MAX_QUERIES = 20
+EFD_MAX_REQUEST_QUERIES = 8
 
 
 def create_app(*args, **kwargs):
@@ -40,6 +84,12 @@ def create_app(*args, **kwargs):
     Define the EFD subapplication, which provides the endpoints to
     make queries to specific EFD instances.
 
+    Parameters
+    ----------
+    efd_clients : `EfdClientManager`, optional
+        EFD clients shared with other applications. If not given, the
+        application has its own.
+
     Returns
     -------
     `aiohttp.web.Application`
@@ -47,28 +97,844 @@ def create_app(*args, **kwargs):
     """
     efd_app = web.Application()
 
-    def connect_to_efd_intance(instance):
-        signal.signal(signal.SIGALRM, raise_timeout)
+    efd_clients = kwargs.get("efd_clients")
+    if efd_clients is None:
+        efd_clients = EfdClientManager.from_env()
 
-        instance_exists = efd_clients.get(instance)
-        if instance_exists is not None:
-            return instance_exists
+    query_cache = QueryCache(
+        max_bytes=int(os.environ.get("EFD_CACHE_MAX_BYTES", EFD_CACHE_MAX_BYTES)),
+        min_ttl=float(os.environ.get("EFD_CACHE_MIN_TTL", EFD_CACHE_MIN_TTL)),
+        max_ttl=float(os.environ.get("EFD_CACHE_MAX_TTL", EFD_CACHE_MAX_TTL)),
+        ttl_factor=float(os.environ.get("EFD_CACHE_TTL_FACTOR", EFD_CACHE_TTL_FACTOR)),
+    )
 
-        try:
-            signal.alarm(EFD_CLIENT_CONNECTION_TIMEOUT)
-            efd_clients[instance] = lsst_efd_client.EfdClient(instance)
-        except Exception:
-            efd_clients[instance] = None
-        finally:
-            signal.signal(signal.SIGALRM, signal.SIG_IGN)
-        return efd_clients[instance]
+    # Raw data of the windows of the incremental time series queries
+    window_cache = QueryCache(
+        max_bytes=int(
+            os.environ.get("EFD_WINDOW_CACHE_MAX_BYTES", EFD_WINDOW_CACHE_MAX_BYTES)
+        )
+    )
+    window_ttl = float(os.environ.get("EFD_WINDOW_TTL", EFD_WINDOW_TTL))
+    window_lag = float(os.environ.get("EFD_WINDOW_LAG", EFD_WINDOW_LAG))
+    window_queries = {"full": 0, "partial": 0, "none": 0}
+
+    # Concurrent InfluxDB requests of the whole application and of each
+    # request, a batch of statements being a single request
+    max_queries = int(os.environ.get("EFD_MAX_QUERIES", EFD_MAX_QUERIES))
+    max_request_queries = int(
+        os.environ.get("EFD_MAX_REQUEST_QUERIES", EFD_MAX_REQUEST_QUERIES)
+    )
+    query_slots = asyncio.Semaphore(max_queries)
+    query_stats = {"running": 0, "waiting": 0, "failed": 0}
+
+    # Topic queries sent together in multi-statement InfluxQL requests
+    query_batcher = QueryBatcher(
+        max_statements=int(
+            os.environ.get("EFD_BATCH_MAX_STATEMENTS", EFD_BATCH_MAX_STATEMENTS)
+        )
+    )
+
+    # Running queries, shared by identical concurrent requests
+    shared_queries = dict()
+    sharing_stats = {"requests": 0, "queries": 0}
+
+    # Pollers of the live top timeseries, shared by their subscribers
+    live_pollers = LivePollers(
+        min_interval=float(
+            os.environ.get("EFD_LIVE_MIN_INTERVAL", EFD_LIVE_MIN_INTERVAL)
+        ),
+        max_interval=float(
+            os.environ.get("EFD_LIVE_MAX_INTERVAL", EFD_LIVE_MAX_INTERVAL)
+        ),
+        backoff=float(os.environ.get("EFD_LIVE_BACKOFF", EFD_LIVE_BACKOFF)),
+    )
+
+    def invalid_format(format):
+        return web.json_response(
+            {"ack": f"Unknown format {format}, use one of {', '.join(EFD_FORMATS)}"},
+            status=400,
+        )
 
     def unavailable_efd_client():
         return web.json_response(
             {"ack": "EFD Client could not stablish connection"}, status=400
         )
 
+    async def query_source(source, query):
+        """Run the query of a source, catching its errors.
+
+        Parameters
+        ----------
+        source : `str`
+            Name of the source.
+        query : `coroutine`
+            Query of the source, returning a `pandas.DataFrame`.
+
+        Returns
+        -------
+        `tuple` [`pandas.DataFrame` or `None`, `str` or `None`]
+            The result and None, or None and the error message if the query
+            failed.
+        """
+        try:
+            return await query, None
+        except Exception as e:
+            logging.error(f"Error querying {source}: {e}")
+            query_stats["failed"] += 1
+            return None, str(e) or type(e).__name__
+
+    async def limit_query(query, request_slots):
+        """Run an InfluxDB request once the request and the application have
+        a free query slot.
+
+        Only the requests sent to InfluxDB hold a slot: cached results are
+        returned without waiting, and a batch of statements holds a single
+        slot.
+
+        Parameters
+        ----------
+        query : `coroutine`
+            The InfluxDB request.
+        request_slots : `asyncio.Semaphore`
+            Query slots of the request.
+
+        Returns
+        -------
+        `object`
+            The query result.
+        """
+        query_stats["waiting"] += 1
+        started = False
+        try:
+            async with request_slots, query_slots:
+                query_stats["waiting"] -= 1
+                query_stats["running"] += 1
+                started = True
+                try:
+                    return await query
+                finally:
+                    query_stats["running"] -= 1
+        finally:
+            if not started:
+                # Cancelled while waiting
+                query_stats["waiting"] -= 1
+                query.close()
+
+    def query_limit(max_concurrency):
+        """Return the function that runs the InfluxDB requests of a request
+        within its query slots.
+
+        Parameters
+        ----------
+        max_concurrency : `int`
+            Maximum number of concurrent InfluxDB requests requested, capped
+            to the ``EFD_MAX_REQUEST_QUERIES`` environment variable.
+
+        Returns
+        -------
+        `callable`
+            Coroutine function that runs an InfluxDB request, given as a
+            coroutine, with `limit_query`.
+        """
+        concurrency = max(1, min(max_concurrency, max_request_queries))
+        request_slots = asyncio.Semaphore(concurrency)
+
+        async def limit(query):
+            return await limit_query(query, request_slots)
+
+        return limit
+
+    # The live top timeseries pollers share the slots of a request
+    live_limit = query_limit(max_request_queries)
+
+    async def share_query(key, query):
+        """Run a query, or wait for the result of an identical query that is
+        already running.
+
+        Parameters
+        ----------
+        key : `tuple`
+            The normalized query.
+        query : `coroutine`
+            The query.
+
+        Returns
+        -------
+        `object`
+            The query result.
+        """
+        task = shared_queries.get(key)
+        if task is None:
+            task = asyncio.create_task(query)
+            shared_queries[key] = task
+            task.add_done_callback(lambda _: shared_queries.pop(key, None))
+            sharing_stats["queries"] += 1
+        else:
+            query.close()
+        sharing_stats["requests"] += 1
+        return await asyncio.shield(task)
+
+    def share_queries(keys, queries):
+        """Share the queries of a request with identical queries of other
+        requests.
+
+        Parameters
+        ----------
+        keys : `list` [`tuple`]
+            The normalized queries.
+        queries : `list` [`coroutine`]
+            The queries of the request.
+
+        Returns
+        -------
+        `list` [`coroutine`]
+            The shared queries.
+        """
+        return [share_query(key, query) for key, query in zip(keys, queries)]
+
+    async def gather_sources(sources, queries, serialize):
+        """Run the queries of the sources, keeping the results of the ones
+        that succeed when others fail.
+
+        Parameters
+        ----------
+        sources : `list` [`str`]
+            Name of each source.
+        queries : `list` [`coroutine`]
+            Query of each source, returning a `pandas.DataFrame`.
+        serialize : `callable`
+            Function that converts a query result to a JSON serializable
+            object.
+
+        Returns
+        -------
+        `dict`
+            The serialized result of each source, or ``{"error": "<Error
+            message>"}`` if its query failed.
+        """
+        results = await asyncio.gather(
+            *[query_source(source, query) for source, query in zip(sources, queries)]
+        )
+        return {
+            source: serialize(result) if error is None else {"error": error}
+            for source, (result, error) in zip(sources, results)
+        }
+
+    def ndjson_encoder(serialize):
+        """Return a function that encodes the result of a source as a line
+        of newline delimited JSON with the following structure:
+
+        .. code-block:: json
+
+            {"source": "<CSC>-<salindex>-<topic>", "data": "<Result>"}
+
+        Or, if the query of the source failed:
+
+        .. code-block:: json
+
+            {"source": "<CSC>-<salindex>-<topic>", "error": "<Error message>"}
+
+        Parameters
+        ----------
+        serialize : `callable`
+            Function that converts a query result to a JSON serializable
+            object.
+
+        Returns
+        -------
+        `callable`
+            The encoder, to use with `stream_sources`.
+        """
+
+        def encode(source, result, error):
+            if error is None:
+                line = {"source": source, "data": serialize(result)}
+            else:
+                line = {"source": source, "error": error}
+            return (json.dumps(line) + "\n").encode()
+
+        return encode
+
+    def encode_arrow_stream(source, result, error):
+        """Encode the result of a source as an Arrow IPC stream, with the
+        source, and the error if the query failed, in the schema metadata.
+        """
+        return memoryview(to_arrow_stream(to_arrow_table(result, source, error)))
+
+    async def stream_sources(
+        request, sources, queries, encode, content_type="application/x-ndjson"
+    ):
+        """Stream the result of each source as soon as its query completes.
+
+        Results are written in completion order.
+
+        Parameters
+        ----------
+        request : `Request`
+            The original HTTP request.
+        sources : `list` [`str`]
+            Name of each source.
+        queries : `list` [`coroutine`]
+            Query of each source, returning a `pandas.DataFrame`.
+        encode : `callable`
+            Function that encodes the name, result and error message of a
+            source to bytes, such as the one returned by `ndjson_encoder`.
+        content_type : `str`, optional
+            Content type of the response.
+
+        Returns
+        -------
+        `aiohttp.web.StreamResponse`
+            The streamed response.
+        """
+        response = web.StreamResponse(headers={"Content-Type": content_type})
+        await response.prepare(request)
+        write_lock = asyncio.Lock()
+
+        async def write_source(source, query):
+            result, error = await query_source(source, query)
+            data = encode(source, result, error)
+            del result
+            async with write_lock:
+                await response.write(data)
+
+        tasks = [
+            asyncio.create_task(write_source(source, query))
+            for source, query in zip(sources, queries)
+        ]
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+        await response.write_eof()
+        return response
+
+    async def parquet_response(sources, queries):
+        """Respond with the result of each source as a Parquet file.
+
+        The response is a multipart/mixed message with one part per source,
+        named ``<source>.parquet``, or a JSON part with the source and the
+        error message if its query failed.
+
+        Parameters
+        ----------
+        sources : `list` [`str`]
+            Name of each source.
+        queries : `list` [`coroutine`]
+            Query of each source, returning a `pandas.DataFrame`.
+
+        Returns
+        -------
+        `aiohttp.web.Response`
+            The response.
+        """
+        results = await asyncio.gather(
+            *[query_source(source, query) for source, query in zip(sources, queries)]
+        )
+        writer = MultipartWriter("mixed")
+        for source, (result, error) in zip(sources, results):
+            if error is not None:
+                writer.append_json({"source": source, "error": error})
+                continue
+            part = writer.append(
+                memoryview(to_parquet(to_arrow_table(result, source))),
+                {"Content-Type": PARQUET_TYPE},
+            )
+            part.set_content_disposition("attachment", filename=f"{source}.parquet")
+        return web.Response(body=writer)
+
+    async def binary_response(request, media_type, sources, queries):
+        """Respond with the results of the sources as Arrow IPC streams,
+        one per source and in completion order, or Parquet files.
+
+        Parameters
+        ----------
+        request : `Request`
+            The original HTTP request.
+        media_type : `str`
+            Requested media type, one of `BINARY_TYPES`.
+        sources : `list` [`str`]
+            Name of each source.
+        queries : `list` [`coroutine`]
+            Query of each source, returning a `pandas.DataFrame`.
+
+        Returns
+        -------
+        `aiohttp.web.StreamResponse`
+            The response.
+        """
+        if media_type == PARQUET_TYPE:
+            return await parquet_response(sources, queries)
+        return await stream_sources(
+            request, sources, queries, encode_arrow_stream, ARROW_STREAM_TYPE
+        )
+
+    async def select_page(
+        efd_client,
+        topic,
+        fields,
+        start,
+        end,
+        index,
+        source,
+        page_size,
+        cursor,
+        descending,
+        limit,
+    ):
+        """Select a page of the rows of a topic in a time range.
+
+        The cursor, order and page size are part of the InfluxDB query, so
+        at most ``page_size`` rows are returned. Clients without an
+        InfluxDB client query the whole time range instead.
+
+        Parameters
+        ----------
+        efd_client : `lsst_efd_client.EfdClient`
+            The EFD client.
+        topic : `str`
+            Name of the topic.
+        fields : `list` [`str`]
+            Names of the fields.
+        start : `astropy.time.Time`
+            Start of the time range.
+        end : `astropy.time.Time`
+            End of the time range.
+        index : `int`
+            SAL index of the CSC.
+        source : `str`
+            Name of the source.
+        page_size : `int`
+            Maximum number of rows.
+        cursor : `tuple` [`int`, `str`, `int`] or `None`
+            The decoded cursor of the previous page.
+        descending : `bool`
+            Whether pages go from the newest rows to the oldest ones.
+        limit : `callable`
+            Coroutine function that runs the InfluxDB requests, as returned
+            by `query_limit`.
+
+        Returns
+        -------
+        `pandas.DataFrame`
+            The rows of the page, sorted.
+        """
+        influx_client = getattr(efd_client, "influx_client", None)
+        if influx_client is None:
+            frame = await limit(
+                efd_client.select_time_series(topic, fields, start, end, index=index)
+            )
+            return cut_page(frame, source, page_size, cursor, descending)
+
+        query = build_page_query(
+            efd_client.db_name,
+            topic,
+            fields,
+            start,
+            end,
+            index,
+            source,
+            page_size,
+            cursor,
+            descending,
+        )
+        result = await limit(influx_client.query(query))
+        if not isinstance(result, pd.DataFrame):
+            # aioinflux returns an empty dict for an empty query
+            result = pd.DataFrame()
+        return skip_returned(result, source, cursor).iloc[:page_size]
+
+    async def query_page(sources, queries, page_size, descending, cursor):
+        """Run the page queries of the sources and merge them in a single
+        page.
+
+        Parameters
+        ----------
+        sources : `list` [`str`]
+            Name of each source.
+        queries : `list` [`coroutine`]
+            Page query of each source, as returned by `select_page`.
+        page_size : `int`
+            Maximum number of rows.
+        descending : `bool`
+            Whether pages go from the newest rows to the oldest ones.
+        cursor : `tuple` [`int`, `str`, `int`] or `None`
+            The decoded cursor of the previous page.
+
+        Returns
+        -------
+        `tuple` [`dict`, `str` or `None`, `dict`]
+            The rows of each source in the page, the cursor of the next
+            page, or None if this is the last one, and the error message of
+            each source whose query failed.
+        """
+        results = await asyncio.gather(
+            *[query_source(source, query) for source, query in zip(sources, queries)]
+        )
+        frames = dict()
+        errors = dict()
+        for source, (result, error) in zip(sources, results):
+            if error is None:
+                frames[source] = result
+            else:
+                errors[source] = error
+        page, next_cursor = merge_pages(frames, page_size, descending, cursor)
+        return page, next_cursor, errors
+
+    async def sort_log_frame(query):
+        """Sort the log messages returned by a query, newest first."""
+        frame = await query
+        return frame.sort_values("private_rcvStamp", ascending=False)
+
+    def binary_type_unavailable(media_type):
+        return web.json_response(
+            {"ack": f"{media_type} responses require pyarrow, which is not installed"},
+            status=406,
+        )
+
+    async def select_time_series(
+        efd_instance,
+        efd_client,
+        topic,
+        fields,
+        start,
+        time_delta,
+        index,
+        resample,
+        aggregations,
+        limit,
+    ):
+        """Select and resample the time series of a topic, using the cached
+        result if there is one and the time window has ended.
+
+        Parameters
+        ----------
+        efd_instance : `str`
+            Name of the EFD instance.
+        efd_client : `lsst_efd_client.EfdClient`
+            The EFD client.
+        topic : `str`
+            Name of the topic.
+        fields : `list` [`str`]
+            Names of the fields.
+        start : `astropy.time.Time`
+            Midpoint of the time window.
+        time_delta : `astropy.time.TimeDelta`
+            Length of the time window.
+        index : `int`
+            SAL index of the CSC.
+        resample : `str` or `None`
+            Resampling frequency, e.g. 1min, None to keep the raw data.
+        aggregations : `tuple` [`str`] or `None`
+            Aggregations to compute for each bin instead of the mean.
+        limit : `callable`
+            Coroutine function that runs the InfluxDB requests, as returned
+            by `query_limit`.
+
+        Returns
+        -------
+        `pandas.DataFrame`
+            The resampled time series.
+        """
+        key = (
+            efd_instance,
+            "timeseries",
+            topic,
+            tuple(fields),
+            index,
+            start.utc.isot,
+            time_delta.sec,
+            resample,
+            aggregations,
+        )
+        end = (start + time_delta / 2).unix
+        # Windows that reach now may still receive data, so they are only
+        # shared between identical concurrent queries, not cached
+        cached = end < time.time()
+        result = query_cache.get(key) if cached else None
+        if result is not None:
+            return result
+
+        result = await query_batcher.select_time_series(
+            efd_client,
+            ("timeseries", start.utc.isot, time_delta.sec, index),
+            topic,
+            fields,
+            start,
+            time_delta,
+            is_window=True,
+            index=index,
+            limit=limit,
+        )
+        result = resample_frame(result, resample, aggregations)
+        if cached:
+            query_cache.put(key, result, dataframe_size(result), end=end)
+        return result
+
+    async def select_time_series_window(
+        efd_instance,
+        efd_client,
+        topic,
+        fields,
+        start,
+        time_delta,
+        index,
+        resample,
+        aggregations,
+        limit,
+    ):
+        """Select and resample the time series of a topic, reusing the data
+        of the previous window of the same topic.
+
+        Only the part of the window that is not in the previous one, plus
+        the last seconds of the previous one, is queried, and only the bins
+        that changed are resampled again.
+
+        Parameters
+        ----------
+        efd_instance : `str`
+            Name of the EFD instance.
+        efd_client : `lsst_efd_client.EfdClient`
+            The EFD client.
+        topic : `str`
+            Name of the topic.
+        fields : `list` [`str`]
+            Names of the fields.
+        start : `astropy.time.Time`
+            Midpoint of the time window.
+        time_delta : `astropy.time.TimeDelta`
+            Length of the time window.
+        index : `int`
+            SAL index of the CSC.
+        resample : `str` or `None`
+            Resampling frequency, e.g. 1min, None to keep the raw data.
+        aggregations : `tuple` [`str`] or `None`
+            Aggregations to compute for each bin instead of the mean.
+        limit : `callable`
+            Coroutine function that runs the InfluxDB requests, as returned
+            by `query_limit`.
+
+        Returns
+        -------
+        `pandas.DataFrame`
+            The resampled time series.
+        """
+        key = (
+            efd_instance,
+            topic,
+            tuple(fields),
+            index,
+            time_delta.sec,
+            resample,
+            aggregations,
+        )
+        window_start = pd.Timestamp((start - time_delta / 2).utc.isot, tz="UTC")
+        window_end = pd.Timestamp((start + time_delta / 2).utc.isot, tz="UTC")
+
+        window = window_cache.get(key)
+        if window is None:
+            window = TimeSeriesWindow(
+                pd.DataFrame(), window_start, window_start, None, pd.DataFrame()
+            )
+            interval = (window_start, window_end)
+        else:
+            interval = window.missing_interval(window_start, window_end, window_lag)
+
+        if interval is None:
+            window_queries["none"] += 1
+            window = window.update(
+                window_start, window_end, resample, aggregations=aggregations
+            )
+        else:
+            window_queries["full" if interval[0] == window_start else "partial"] += 1
+            fetched = pd.Timestamp.now(tz="UTC")
+            tail = await query_batcher.select_time_series(
+                efd_client,
+                ("window", interval, index),
+                topic,
+                fields,
+                Time(interval[0].tz_convert(None).to_pydatetime(), scale="utc"),
+                Time(interval[1].tz_convert(None).to_pydatetime(), scale="utc"),
+                index=index,
+                limit=limit,
+            )
+            window = window.update(
+                window_start,
+                window_end,
+                resample,
+                tail=tail,
+                fetch_start=interval[0],
+                fetched=fetched,
+                aggregations=aggregations,
+            )
+        window_cache.put(key, window, window.size, ttl=window_ttl)
+        return window.resampled
+
+    async def downsample_query(query, max_points, method):
+        """Downsample the time series returned by a query.
+
+        Parameters
+        ----------
+        query : `coroutine`
+            The query, returning a `pandas.DataFrame`.
+        max_points : `int`
+            Number of points to select for each field.
+        method : `str`
+            Downsampling method, one of `DOWNSAMPLE_METHODS`.
+
+        Returns
+        -------
+        `pandas.DataFrame`
+            The downsampled time series.
+        """
+        return downsample_frame(await query, max_points, method)
+
+    async def select_top_n(
+        efd_instance, efd_client, topic, fields, num, time_cut, index, limit
+    ):
+        """Select the most recent values of a topic, using the cached result
+        if there is one and ``time_cut`` is in the past.
+
+        Parameters
+        ----------
+        efd_instance : `str`
+            Name of the EFD instance.
+        efd_client : `lsst_efd_client.EfdClient`
+            The EFD client.
+        topic : `str`
+            Name of the topic.
+        fields : `list` [`str`]
+            Names of the fields.
+        num : `int`
+            Number of values.
+        time_cut : `str` or `None`
+            Time to select the values before, None for now.
+        index : `int`
+            SAL index of the CSC.
+        limit : `callable`
+            Coroutine function that runs the InfluxDB requests, as returned
+            by `query_limit`.
+
+        Returns
+        -------
+        `pandas.DataFrame`
+            The most recent values.
+        """
+        key = (efd_instance, "top", topic, tuple(fields), index, num, time_cut)
+        try:
+            end = Time(time_cut, scale="utc").unix if time_cut else None
+        except ValueError:
+            end = None
+        # The most recent values may change at any time, so they are only
+        # shared between identical concurrent queries, not cached
+        cached = end is not None and end < time.time()
+        result = query_cache.get(key) if cached else None
+        if result is not None:
+            return result
+
+        result = await query_batcher.select_top_n(
+            efd_client,
+            ("top_timeseries", num, time_cut, index),
+            topic,
+            fields,
+            num,
+            time_cut=time_cut,
+            index=index,
+            limit=limit,
+        )
+        if cached:
+            query_cache.put(key, result, dataframe_size(result), end=end)
+        return result
+
     async def query_efd_timeseries(request):
+        """Handle time series requests.
+
+        Parameters
+        ----------
+        request : `Request`
+            The original HTTP request, with the following structure:
+
+            .. code-block:: json
+
+                {
+                    "efd_instance": "<Name of the EFD instance>",
+                    "start_date": "<Midpoint of the time window>",
+                    "time_window": "<Length of the time window in minutes>",
+                    "cscs": {
+                        "<CSC>": {
+                            "<salindex>": {"<topic>": ["<field_1>", "<field_2>"]}
+                        }
+                    },
+                    "resample": "<Resampling frequency, e.g. 1min, not needed
+                        with max_points>",
+                    "aggregations": "<Optional, statistics of each bin to
+                        return instead of the mean: mean, median, min, max,
+                        std, count, first, last or a percentile, e.g. p95>",
+                    "incremental": "<Optional, if true reuse the data of the
+                        previous window of each topic and only query the new
+                        data. Bins are aligned to the unix epoch>",
+                    "max_points": "<Optional, downsample the raw data of each
+                        field to at most this number of points instead of
+                        resampling>",
+                    "downsample": "<Optional, lttb (default) or minmax>",
+                    "format": "<Optional, points (default) or columnar>",
+                    "stream": "<Optional, if true stream each source as
+                        newline delimited JSON as soon as it is queried>",
+                    "max_concurrency": "<Optional, maximum number of InfluxDB
+                        requests sent at the same time, a batch of topics
+                        being one request>",
+                    "page_size": "<Optional, return the raw data in pages of
+                        this number of rows, oldest first, instead of
+                        resampling>",
+                    "cursor": "<Optional, next_cursor of the previous page>"
+                }
+
+        Returns
+        -------
+        Response
+            The response for the HTTP request with the following structure:
+
+            .. code-block:: json
+
+                {
+                    "<CSC>-<salindex>-<topic>": {
+                        "<field>": [{"ts": "<Timestamp>", "value": "<Value>"}]
+                    }
+                }
+
+            Sources whose query failed have ``{"error": "<Error message>"}``
+            instead. Or, with the columnar format:
+
+            .. code-block:: json
+
+                {
+                    "<CSC>-<salindex>-<topic>": {
+                        "ts": ["<Timestamp>"],
+                        "<field>": ["<Value>"]
+                    }
+                }
+
+            With max_points, each field only has the points selected for
+            it, so the columnar format has the timestamps of each field:
+            ``{"<field>": {"ts": ["<Timestamp>"], "value": ["<Value>"]}}``.
+            Binary responses keep every selected row, with the values not
+            selected for a field missing.
+
+            With aggregations, each field is replaced by one field per
+            aggregation, named ``<field>:<aggregation>``, e.g.
+            ``temperature:p95``.
+
+            With page_size, the sources are in ``data`` and the cursor of
+            the next page, null on the last one, in ``next_cursor``.
+
+            Streamed responses have one line per source, as written by
+            `stream_sources`. Requests with an
+            ``Accept: application/vnd.apache.arrow.stream`` or
+            ``Accept: application/vnd.apache.parquet`` header get the
+            results as Arrow IPC streams or Parquet files instead, as
+            written by `binary_response`.
+        """
         req = await request.json()
 
         try:
@@ -76,57 +942,154 @@ def create_app(*args, **kwargs):
             start_date = req["start_date"]
             time_window = int(req["time_window"])
             cscs = req["cscs"]
-            resample = req["resample"]
+            max_points = req.get("max_points")
+            max_points = int(max_points) if max_points is not None else None
+            downsample = req.get("downsample", "lttb")
+            page_size = req.get("page_size")
+            page_size = int(page_size) if page_size is not None else None
+            cursor = req.get("cursor")
+            cursor = decode_cursor(cursor) if cursor is not None else None
+            raw = max_points is not None or page_size is not None
+            resample = req["resample"] if not raw else None
+            aggregations = req.get("aggregations")
+            aggregations = tuple(aggregations) if aggregations else None
+            incremental = bool(req.get("incremental", False))
+            format = req.get("format", "points")
+            stream = bool(req.get("stream", False))
+            max_concurrency = int(req.get("max_concurrency", max_request_queries))
         except Exception:
             return web.json_response(
                 {"ack": "Some of the required parameters is not present"}, status=400
             )
+        if format not in EFD_FORMATS:
+            return invalid_format(format)
+        if page_size is not None and page_size < 1:
+            return web.json_response({"ack": "page_size must be positive"}, status=400)
+        if max_points is not None and (
+            max_points < 3 or downsample not in DOWNSAMPLE_METHODS
+        ):
+            return web.json_response(
+                {
+                    "ack": "max_points must be at least 3 and downsample one of "
+                    f"{', '.join(DOWNSAMPLE_METHODS)}"
+                },
+                status=400,
+            )
 
-        efd_client = efd_clients.get(efd_instance)
-        if efd_client is None:
-            efd_client = connect_to_efd_intance(efd_instance)
+        if aggregations is not None and (
+            raw or not all(is_aggregation(a) for a in aggregations)
+        ):
+            return web.json_response(
+                {
+                    "ack": "aggregations require resample and must be "
+                    f"{', '.join(AGGREGATIONS)} or percentiles, e.g. p95"
+                },
+                status=400,
+            )
+
+        binary_type = accepted_binary_type(request.headers.get("Accept", ""))
+        if binary_type is not None and not ARROW_AVAILABLE:
+            return binary_type_unavailable(binary_type)
+
+        efd_client = await efd_clients.get(efd_instance)
         if efd_client is None:
             return unavailable_efd_client()
 
         parsed_date = Time(start_date, scale="utc")
         time_delta = TimeDelta(time_window * 60, format="sec")
+        select = select_time_series_window if incremental else select_time_series
+        request_limit = query_limit(max_concurrency)
         query_tasks = []
         sources = []
+        keys = []
         for csc in cscs:
             indexes = cscs[csc]
             for index in indexes:
                 topics = indexes[index]
                 for topic in topics:
                     fields = topics[topic]
-                    task = efd_client.select_time_series(
-                        f"lsst.sal.{csc}.{topic}",
-                        fields,
-                        parsed_date,
-                        time_delta,
-                        index=int(index),
-                        is_window=True,
+                    if page_size is not None:
+                        task = select_page(
+                            efd_client,
+                            f"lsst.sal.{csc}.{topic}",
+                            fields,
+                            parsed_date - time_delta / 2,
+                            parsed_date + time_delta / 2,
+                            int(index),
+                            f"{csc}-{index}-{topic}",
+                            page_size,
+                            cursor,
+                            descending=False,
+                            limit=request_limit,
+                        )
+                    else:
+                        task = select(
+                            efd_instance,
+                            efd_client,
+                            f"lsst.sal.{csc}.{topic}",
+                            fields,
+                            parsed_date,
+                            time_delta,
+                            int(index),
+                            resample,
+                            aggregations,
+                            request_limit,
+                        )
+                    if max_points is not None:
+                        task = downsample_query(task, max_points, downsample)
+                    keys.append(
+                        (
+                            efd_instance,
+                            "timeseries",
+                            csc,
+                            int(index),
+                            topic,
+                            tuple(fields),
+                            parsed_date.utc.isot,
+                            time_window,
+                            resample,
+                            aggregations,
+                            incremental,
+                            max_points,
+                            downsample if max_points is not None else None,
+                            page_size,
+                            cursor,
+                        )
                     )
                     sources.append(f"{csc}-{index}-{topic}")
                     query_tasks.append(task)
 
-        results = [
-            r.resample(resample).mean() if not r.empty else r
-            for r in await asyncio.gather(*query_tasks)
-        ]
-        results = [r.to_dict() for r in results]
-
-        for res in results:
-            for field in res:
-                items = res[field].items()
-                res[field] = [
-                    {
-                        "ts": str(item[0]),
-                        "value": None if math.isnan(item[1]) else item[1],
-                    }
-                    for item in items
-                ]
+        query_tasks = share_queries(keys, query_tasks)
+        # Downsampled fields only have the values selected for them
+        drop_missing = max_points is not None
+        if page_size is not None:
+            page, next_cursor, errors = await query_page(
+                sources, query_tasks, page_size, descending=False, cursor=cursor
+            )
+            data = {
+                source: (
+                    serialize_frame(page[source], format, drop_missing)
+                    if source in page
+                    else {"error": errors[source]}
+                )
+                for source in sources
+            }
+            return web.json_response({"data": data, "next_cursor": next_cursor})
+
+        if binary_type is not None:
+            return await binary_response(request, binary_type, sources, query_tasks)
+
+        if stream:
+            return await stream_sources(
+                request,
+                sources,
+                query_tasks,
+                ndjson_encoder(lambda r: serialize_frame(r, format, drop_missing)),
+            )
 
-        response_data = dict(zip(sources, results))
+        response_data = await gather_sources(
+            sources, query_tasks, lambda r: serialize_frame(r, format, drop_missing)
+        )
         return web.json_response(response_data)
 
     async def query_efd_most_recent_timeseries(request):
@@ -137,47 +1100,321 @@ def create_app(*args, **kwargs):
             cscs = req["cscs"]
             num = int(req.get("num", 1))
             time_cut = req.get("time_cut", None)
+            format = req.get("format", "points")
+            stream = bool(req.get("stream", False))
+            max_concurrency = int(req.get("max_concurrency", max_request_queries))
         except Exception:
             return web.json_response(
                 {"ack": "Some of the required parameters is not present"}, status=400
             )
+        if format not in EFD_FORMATS:
+            return invalid_format(format)
 
-        efd_client = efd_clients.get(efd_instance)
-        if efd_client is None:
-            efd_client = connect_to_efd_intance(efd_instance)
+        binary_type = accepted_binary_type(request.headers.get("Accept", ""))
+        if binary_type is not None and not ARROW_AVAILABLE:
+            return binary_type_unavailable(binary_type)
+
+        efd_client = await efd_clients.get(efd_instance)
         if efd_client is None:
             return unavailable_efd_client()
 
+        request_limit = query_limit(max_concurrency)
         query_tasks = []
         sources = []
+        keys = []
         for csc in cscs:
             indexes = cscs[csc]
             for index in indexes:
                 topics = indexes[index]
                 for topic in topics:
                     fields = topics[topic]
-                    task = efd_client.select_top_n(
+                    task = select_top_n(
+                        efd_instance,
+                        efd_client,
                         f"lsst.sal.{csc}.{topic}",
                         fields,
                         num,
-                        time_cut=time_cut,
-                        index=int(index),
+                        time_cut,
+                        int(index),
+                        request_limit,
+                    )
+                    keys.append(
+                        (
+                            efd_instance,
+                            "top_timeseries",
+                            csc,
+                            int(index),
+                            topic,
+                            tuple(fields),
+                            num,
+                            time_cut,
+                        )
                     )
                     sources.append(f"{csc}-{index}-{topic}")
                     query_tasks.append(task)
 
-        results = [r for r in await asyncio.gather(*query_tasks)]
-        results = [r.to_dict() for r in results]
+        query_tasks = share_queries(keys, query_tasks)
+        if binary_type is not None:
+            return await binary_response(request, binary_type, sources, query_tasks)
 
-        for res in results:
-            for field in res:
-                items = res[field].items()
-                res[field] = [{"ts": str(item[0]), "value": item[1]} for item in items]
+        if stream:
+            return await stream_sources(
+                request,
+                sources,
+                query_tasks,
+                ndjson_encoder(lambda r: serialize_frame(r, format)),
+            )
 
-        response_data = dict(zip(sources, results))
+        response_data = await gather_sources(
+            sources, query_tasks, lambda r: serialize_frame(r, format)
+        )
         return web.json_response(response_data)
 
+    def live_poll(efd_instance, topic, fields, num, index, format):
+        """Return the poll of a live top timeseries subscription.
+
+        Polls skip the query cache, whose results of recent values are
+        older than the polling interval, but are batched with the other
+        topic queries. Each poll gets the client of the EFD instance, so a
+        poller outlives the connection of its first subscriber.
+
+        Parameters
+        ----------
+        efd_instance : `str`
+            Name of the EFD instance.
+        topic : `str`
+            Name of the topic.
+        fields : `list` [`str`]
+            Names of the fields.
+        num : `int`
+            Number of values.
+        index : `int`
+            SAL index of the CSC.
+        format : `str`
+            Format of the values, one of `EFD_FORMATS`.
+
+        Returns
+        -------
+        `callable`
+            Coroutine function that returns the serialized values.
+        """
+
+        async def poll():
+            efd_client = await efd_clients.get(efd_instance)
+            if efd_client is None:
+                raise ConnectionError("EFD Client could not stablish connection")
+            result = await query_batcher.select_top_n(
+                efd_client,
+                ("live_top_timeseries", num, None, index),
+                topic,
+                fields,
+                num,
+                index=index,
+                limit=live_limit,
+            )
+            return serialize_frame(result, format)
+
+        return poll
+
+    async def subscribe_efd_most_recent_timeseries(request):
+        """Handle live top timeseries subscriptions.
+
+        Open a WebSocket where the client subscribes to the most recent
+        values of topics, instead of polling ``top_timeseries``, by sending:
+
+        .. code-block:: json
+
+            {
+                "action": "<subscribe (default) or unsubscribe>",
+                "efd_instance": "<EFD Instance>",
+                "cscs": {
+                    "<CSC>": {
+                        "<index>": {
+                            "<topic>": ["<field_1>", "<field_2>"]
+                        }
+                    }
+                },
+                "num": "<Number of values, 1 by default>",
+                "format": "<points (default) or columnar>"
+            }
+
+        Each topic is polled once for all its subscribers, more often while
+        its values change and less often while they don't, and the
+        WebSocket receives the values only when they change:
+
+        .. code-block:: json
+
+            {
+                "type": "data",
+                "source": "<CSC>-<index>-<topic>",
+                "data": "<Values as in top_timeseries>"
+            }
+
+        Invalid messages and failed polls are answered with
+        ``{"type": "error", "ack": "<Error message>"}``, the latter with the
+        source too.
+
+        Parameters
+        ----------
+        request : `Request`
+            The original HTTP request.
+
+        Returns
+        -------
+        `aiohttp.web.WebSocketResponse`
+            The WebSocket response.
+        """
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        queue = asyncio.Queue(maxsize=EFD_LIVE_QUEUE_SIZE)
+        subscriptions = set()
+
+        async def forward():
+            while True:
+                await ws.send_json(await queue.get())
+
+        forward_task = asyncio.create_task(forward())
+        try:
+            async for msg in ws:
+                if msg.type != WSMsgType.TEXT:
+                    continue
+                try:
+                    data = json.loads(msg.data)
+                    action = data.get("action", "subscribe")
+                    efd_instance = data["efd_instance"]
+                    cscs = data["cscs"]
+                    num = int(data.get("num", 1))
+                    format = data.get("format", "points")
+                    topics = [
+                        (csc, int(index), topic, tuple(fields))
+                        for csc, indexes in cscs.items()
+                        for index, csc_topics in indexes.items()
+                        for topic, fields in csc_topics.items()
+                    ]
+                except Exception:
+                    await ws.send_json(
+                        {
+                            "type": "error",
+                            "ack": "Message must have the following keys: "
+                            f"efd_instance, cscs. Received {msg.data}",
+                        }
+                    )
+                    continue
+                if action not in ("subscribe", "unsubscribe"):
+                    await ws.send_json(
+                        {"type": "error", "ack": f"Invalid action {action}."}
+                    )
+                    continue
+                if format not in EFD_FORMATS:
+                    await ws.send_json(
+                        {"type": "error", "ack": f"Invalid format {format}."}
+                    )
+                    continue
+
+                if (
+                    action == "subscribe"
+                    and await efd_clients.get(efd_instance) is None
+                ):
+                    await ws.send_json(
+                        {
+                            "type": "error",
+                            "ack": "EFD Client could not stablish connection",
+                        }
+                    )
+                    continue
+
+                for csc, index, topic, fields in topics:
+                    key = (efd_instance, csc, index, topic, fields, num, format)
+                    if action == "unsubscribe":
+                        subscriptions.discard(key)
+                        live_pollers.unsubscribe(key, queue)
+                    elif key not in subscriptions:
+                        subscriptions.add(key)
+                        live_pollers.subscribe(
+                            key,
+                            f"{csc}-{index}-{topic}",
+                            live_poll(
+                                efd_instance,
+                                f"lsst.sal.{csc}.{topic}",
+                                list(fields),
+                                num,
+                                index,
+                                format,
+                            ),
+                            queue,
+                        )
+        finally:
+            forward_task.cancel()
+            for key in subscriptions:
+                live_pollers.unsubscribe(key, queue)
+        return ws
+
     async def query_efd_logs(request):
+        """Handle log messages requests.
+
+        Parameters
+        ----------
+        request : `Request`
+            The original HTTP request, with the following structure:
+
+            .. code-block:: json
+
+                {
+                    "efd_instance": "<Name of the EFD instance>",
+                    "start_date": "<Start of the time range>",
+                    "end_date": "<End of the time range>",
+                    "cscs": {
+                        "<CSC>": {
+                            "<salindex>": {"<topic>": ["<field_1>", "<field_2>"]}
+                        }
+                    },
+                    "scale": "<Time scale of the dates, e.g. utc>",
+                    "merge": "<Optional, if true merge the messages of every
+                        source in pages, newest first>",
+                    "limit": "<Optional, maximum number of messages of a
+                        merged page>",
+                    "page_size": "<Optional, same as merge with this limit>",
+                    "cursor": "<Optional, next_cursor of the previous page>"
+                }
+
+        Returns
+        -------
+        Response
+            The response for the HTTP request with the following structure:
+
+            .. code-block:: json
+
+                {
+                    "<CSC>-<salindex>-<topic>": [
+                        {"<field>": "<Value>", "private_rcvStamp": "<Timestamp>"}
+                    ]
+                }
+
+            Or, with merge or page_size:
+
+            .. code-block:: json
+
+                {
+                    "messages": [
+                        {
+                            "<field>": "<Value>",
+                            "private_rcvStamp": "<Timestamp>",
+                            "source": "<CSC>-<salindex>-<topic>"
+                        }
+                    ],
+                    "next_cursor": "<Opaque cursor of the next page>",
+                    "errors": {"<CSC>-<salindex>-<topic>": "<Error message>"}
+                }
+
+            Merged messages are ordered by their EFD timestamp, and then by
+            source, newest first, not by ``private_rcvStamp`` like the
+            messages of each topic without ``merge``. InfluxDB can only
+            order and limit queries by time, and the EFD timestamp is when
+            the message was sent, so it is close to ``private_rcvStamp``.
+            The cursor and the page size are part of the InfluxDB queries,
+            so only the messages of the page are queried. ``next_cursor`` is
+            null on the last page.
+        """
         req = await request.json()
 
         try:
@@ -186,21 +1423,39 @@ def create_app(*args, **kwargs):
             end_date = req["end_date"]
             cscs = req["cscs"]
             scale = req["scale"]
+            stream = bool(req.get("stream", False))
+            max_concurrency = int(req.get("max_concurrency", max_request_queries))
+            merge = bool(req.get("merge", False))
+            limit = int(req.get("limit", EFD_LOGS_LIMIT))
+            page_size = req.get("page_size")
+            page_size = int(page_size) if page_size is not None else None
+            if merge and page_size is None:
+                page_size = limit
+            cursor = req.get("cursor")
+            cursor = decode_cursor(cursor) if cursor is not None else None
         except Exception:
             return web.json_response(
                 {"ack": "Some of the required parameters is not present"}, status=400
             )
+        if limit < 1:
+            return web.json_response({"ack": "limit must be positive"}, status=400)
+        if page_size is not None and page_size < 1:
+            return web.json_response({"ack": "page_size must be positive"}, status=400)
 
-        efd_client = efd_clients.get(efd_instance)
-        if efd_client is None:
-            efd_client = connect_to_efd_intance(efd_instance)
+        binary_type = accepted_binary_type(request.headers.get("Accept", ""))
+        if binary_type is not None and not ARROW_AVAILABLE:
+            return binary_type_unavailable(binary_type)
+
+        efd_client = await efd_clients.get(efd_instance)
         if efd_client is None:
             return unavailable_efd_client()
 
         start_date = Time(start_date, scale=scale).utc
         end_date = Time(end_date, scale=scale).utc
+        request_limit = query_limit(max_concurrency)
         query_tasks = []
         sources = []
+        keys = []
         for csc in cscs:
             indexes = cscs[csc]
             for index in indexes:
@@ -210,53 +1465,230 @@ def create_app(*args, **kwargs):
                     # Make sure the private_rcvStamp field is present
                     if "private_rcvStamp" not in fields:
                         fields.append("private_rcvStamp")
-                    task = efd_client.select_time_series(
-                        f"lsst.sal.{csc}.{topic}",
-                        fields,
-                        start_date,
-                        end_date,
-                        index=int(index),
+                    if page_size is not None:
+                        task = select_page(
+                            efd_client,
+                            f"lsst.sal.{csc}.{topic}",
+                            fields,
+                            start_date,
+                            end_date,
+                            int(index),
+                            f"{csc}-{index}-{topic}",
+                            page_size,
+                            cursor,
+                            descending=True,
+                            limit=request_limit,
+                        )
+                    else:
+                        task = query_batcher.select_time_series(
+                            efd_client,
+                            ("logmessages", start_date.isot, end_date.isot, int(index)),
+                            f"lsst.sal.{csc}.{topic}",
+                            fields,
+                            start_date,
+                            end_date,
+                            index=int(index),
+                            limit=request_limit,
+                        )
+                    keys.append(
+                        (
+                            efd_instance,
+                            "logmessages",
+                            csc,
+                            int(index),
+                            topic,
+                            tuple(fields),
+                            start_date.isot,
+                            end_date.isot,
+                            page_size,
+                            cursor,
+                        )
                     )
                     sources.append(f"{csc}-{index}-{topic}")
                     query_tasks.append(task)
 
-        results = [r for r in await asyncio.gather(*query_tasks)]
-        results = [
-            sorted(
-                r.to_dict("records"), key=lambda x: x["private_rcvStamp"], reverse=True
+        query_tasks = share_queries(keys, query_tasks)
+        if page_size is not None:
+            page, next_cursor, errors = await query_page(
+                sources, query_tasks, page_size, descending=True, cursor=cursor
+            )
+            return web.json_response(
+                {
+                    "messages": page_records(page, descending=True),
+                    "next_cursor": next_cursor,
+                    "errors": errors,
+                }
+            )
+
+        if binary_type is not None:
+            return await binary_response(
+                request,
+                binary_type,
+                sources,
+                [sort_log_frame(query) for query in query_tasks],
+            )
+
+        if stream:
+            return await stream_sources(
+                request, sources, query_tasks, ndjson_encoder(to_log_records)
             )
-            for r in results
-        ]
 
-        response_data = dict(zip(sources, results))
+        response_data = await gather_sources(sources, query_tasks, to_log_records)
         return web.json_response(response_data)
 
     async def query_efd_clients(request):
         try:
-            efd_instances = lsst_efd_client.EfdClient.list_efd_names()
+            # Listing the instances makes a blocking request
+            efd_instances = await asyncio.get_running_loop().run_in_executor(
+                None, lsst_efd_client.EfdClient.list_efd_names
+            )
             return web.json_response({"instances": efd_instances}, status=200)
         except Exception as e:
             return web.json_response({"ack": e}, status=400)
 
+    async def query_efd_health(request):
+        """Handle EFD connections health requests.
+
+        Parameters
+        ----------
+        request : `Request`
+            The original HTTP request.
+
+        Returns
+        -------
+        Response
+            The response for the HTTP request with the following structure:
+
+            .. code-block:: json
+
+                {
+                    "<efd_instance>": {
+                        "state": "<connecting, connected or failed>",
+                        "attempts": "<Number of connection attempts>",
+                        "error": "<Last connection error>",
+                        "since": "<Timestamp of the last state change>",
+                        "retry_in": "<Seconds before a failed connection is retried>",
+                        "ping": {
+                            "ok": "<Whether the instance answered>",
+                            "latency": "<Seconds the instance took to answer>",
+                            "error": "<Error message if it did not answer>"
+                        }
+                    }
+                }
+        """
+        return web.json_response(await efd_clients.health())
+
+    async def query_efd_stats(request):
+        """Handle EFD queries statistics requests.
+
+        Parameters
+        ----------
+        request : `Request`
+            The original HTTP request.
+
+        Returns
+        -------
+        Response
+            The response for the HTTP request with the following structure:
+
+            .. code-block:: json
+
+                {
+                    "cache": {
+                        "max_bytes": "<Maximum size of the cached results>",
+                        "min_ttl": "<Seconds recent results are kept>",
+                        "max_ttl": "<Maximum seconds results are kept>",
+                        "bytes": "<Size of the cached results>",
+                        "entries": "<Number of cached results>",
+                        "hits": "<Number of queries served from the cache>",
+                        "misses": "<Number of queries sent to the EFD>",
+                        "evictions": "<Number of results dropped to free space>",
+                        "expirations": "<Number of expired results>"
+                    },
+                    "windows": {
+                        "...": "<Same statistics for the incremental windows>",
+                        "queries": {
+                            "full": "<Windows queried entirely>",
+                            "partial": "<Windows where only the new data was queried>",
+                            "none": "<Windows served without querying>"
+                        }
+                    },
+                    "queries": {
+                        "max": "<Maximum concurrent InfluxDB requests>",
+                        "max_per_request": "<Maximum concurrent InfluxDB
+                            requests of a request>",
+                        "running": "<InfluxDB requests running>",
+                        "waiting": "<InfluxDB requests waiting for a slot>",
+                        "failed": "<Number of failed queries>"
+                    },
+                    "batches": {
+                        "max_statements": "<Maximum statements of a request>",
+                        "statements": "<Number of batched statements>",
+                        "requests": "<Number of InfluxDB requests>",
+                        "fallbacks": "<Batches sent one by one after failing>"
+                    },
+                    "sharing": {
+                        "requests": "<Number of topic queries requested>",
+                        "queries": "<Number of topic queries run>",
+                        "in_flight": "<Queries running>",
+                        "fan_in": "<Requests per query run>"
+                    },
+                    "live": {
+                        "pollers": "<Topics polled for live subscriptions>",
+                        "subscriptions": "<Subscriptions to the polled topics>",
+                        "polls": "<Number of polls of the running pollers>",
+                        "pushes": "<Number of changes pushed by them>"
+                    }
+                }
+        """
+        return web.json_response(
+            {
+                "cache": query_cache.stats(),
+                "windows": {**window_cache.stats(), "queries": window_queries},
+                "queries": {
+                    "max": max_queries,
+                    "max_per_request": max_request_queries,
+                    **query_stats,
+                },
+                "batches": query_batcher.stats(),
+                "sharing": {
+                    **sharing_stats,
+                    "in_flight": len(shared_queries),
+                    "fan_in": sharing_stats["requests"]
+                    / max(sharing_stats["queries"], 1),
+                },
+                "live": live_pollers.stats(),
+            }
+        )
+
     efd_app.router.add_post("/timeseries", query_efd_timeseries)
     efd_app.router.add_post("/timeseries/", query_efd_timeseries)
     efd_app.router.add_post("/top_timeseries", query_efd_most_recent_timeseries)
     efd_app.router.add_post("/top_timeseries/", query_efd_most_recent_timeseries)
+    efd_app.router.add_get("/top_timeseries/live", subscribe_efd_most_recent_timeseries)
+    efd_app.router.add_get(
+        "/top_timeseries/live/", subscribe_efd_most_recent_timeseries
+    )
     efd_app.router.add_post("/logmessages", query_efd_logs)
     efd_app.router.add_post("/logmessages/", query_efd_logs)
     efd_app.router.add_get("/efd_clients", query_efd_clients)
     efd_app.router.add_get("/efd_clients/", query_efd_clients)
+    efd_app.router.add_get("/health", query_efd_health)
+    efd_app.router.add_get("/health/", query_efd_health)
+    efd_app.router.add_get("/stats", query_efd_stats)
+    efd_app.router.add_get("/stats/", query_efd_stats)
+
+    async def on_startup(app):
+        efd_clients.retain()
 
     async def on_cleanup(app):
-        global efd_clients
-        for instance, client in efd_clients.items():
-            if client is not None:
-                try:
-                    client.close()
-                except Exception as e:
-                    logging.error(f"Error closing EFD client {instance}: {e}")
-        efd_clients = dict()
+        await live_pollers.close()
+        await query_batcher.close()
+        query_cache.clear()
+        window_cache.clear()
+        await efd_clients.release()
 
+    efd_app.on_startup.append(on_startup)
     efd_app.on_cleanup.append(on_cleanup)
 
     return efd_app
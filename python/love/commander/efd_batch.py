@@ -0,0 +1,362 @@
+# This file is part of LOVE-commander.
+#
+# Copyright (c) 2023 Inria Chile.
+#
+# Developed by Inria Chile.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or at
+# your option any later version.
+#
+# This program is distributed in the hope that it will be useful,but
+# WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+# or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License
+# for more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program. If not, see <http://www.gnu.org/licenses/>.
+
+import asyncio
+import logging
+
+import pandas as pd
+
+EFD_BATCH_MAX_STATEMENTS = 50
+
+
+def build_top_n_query(db_name, topic, fields, num, time_cut=None, index=None):
+    """Build the query of the most recent values of a topic, as
+    `lsst_efd_client.EfdClient.select_top_n` does.
+
+    Parameters
+    ----------
+    db_name : `str`
+        Name of the EFD database.
+    topic : `str`
+        Name of the topic.
+    fields : `list` [`str`]
+        Names of the fields.
+    num : `int`
+        Number of values.
+    time_cut : `str`, optional
+        Time to select the values before, None for now.
+    index : `int`, optional
+        SAL index of the CSC.
+
+    Returns
+    -------
+    `str`
+        The query.
+    """
+    conditions = []
+    if time_cut:
+        conditions.append(f"time < '{time_cut}Z'")
+    if index:
+        conditions.append(f"salIndex = {index}")
+    where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+    return (
+        f'SELECT {", ".join(fields)} FROM "{db_name}"."autogen"."{topic}"{where} '
+        f"GROUP BY * ORDER BY DESC LIMIT {num}"
+    )
+
+
+def statement_frame(series):
+    """Convert the result of a statement to a DataFrame.
+
+    Parameters
+    ----------
+    series : `pandas.DataFrame` or `dict` [`str`, `pandas.DataFrame`]
+        The result of the statement as parsed by aioinflux: a DataFrame, or
+        a DataFrame per series, empty if there are no results.
+
+    Returns
+    -------
+    `pandas.DataFrame`
+        The result of the statement.
+    """
+    if isinstance(series, pd.DataFrame):
+        return series
+    if not series:
+        return pd.DataFrame()
+    if len(series) == 1:
+        return next(iter(series.values()))
+    return pd.concat(series.values()).sort_index()
+
+
+def split_results(result, size):
+    """Split the result of a multi-statement query per statement.
+
+    Parameters
+    ----------
+    result : `object`
+        The result as parsed by aioinflux, a list with the series of each
+        statement if there is more than one statement.
+    size : `int`
+        Number of statements.
+
+    Returns
+    -------
+    `list` [`pandas.DataFrame`]
+        The result of each statement.
+    """
+    if size == 1:
+        return [statement_frame(result)]
+    if not isinstance(result, list) or len(result) != size:
+        raise ValueError(f"Expected {size} statement results")
+    return [statement_frame(series) for series in result]
+
+
+async def unlimited(query):
+    """Run an InfluxDB request without waiting for a query slot."""
+    return await query
+
+
+class QueryBatcher:
+    """Send the InfluxQL statements of concurrent queries in batches.
+
+    Queries of the same EFD client, group and limit that are made in the
+    same iteration of the event loop are sent as a single multi-statement
+    request, and its result is split back per query. If the request fails
+    the statements are sent one by one, so only the failing queries fail.
+
+    Every request to InfluxDB, a whole batch or a statement sent on its
+    own, runs through the ``limit`` of its queries, e.g. to wait for a
+    query slot, so queries only hold a slot while they are sent.
+
+    Clients without an InfluxDB client are queried directly, through the
+    limit too.
+
+    Parameters
+    ----------
+    max_statements : `int`, optional
+        Maximum number of statements of a request. Zero or less disables
+        the batches.
+    """
+
+    def __init__(self, max_statements=EFD_BATCH_MAX_STATEMENTS):
+        self.max_statements = max_statements
+        self.pending = dict()
+        self.tasks = set()
+        self.statements = 0
+        self.requests = 0
+        self.fallbacks = 0
+
+    def can_batch(self, efd_client):
+        """Whether the queries of an EFD client can be batched."""
+        return self.max_statements > 0 and hasattr(efd_client, "influx_client")
+
+    async def select_time_series(
+        self,
+        efd_client,
+        group,
+        topic,
+        fields,
+        start,
+        end,
+        is_window=False,
+        index=None,
+        limit=unlimited,
+    ):
+        """Select the time series of a topic, as
+        `lsst_efd_client.EfdClient.select_time_series` does.
+
+        Parameters
+        ----------
+        efd_client : `lsst_efd_client.EfdClient`
+            The EFD client.
+        group : `tuple`
+            Queries that can be sent together, e.g. the time window and the
+            SAL index.
+        topic : `str`
+            Name of the topic.
+        fields : `list` [`str`]
+            Names of the fields.
+        start : `astropy.time.Time`
+            Start of the time range, or its midpoint if ``is_window``.
+        end : `astropy.time.Time` or `astropy.time.TimeDelta`
+            End or length of the time range.
+        is_window : `bool`, optional
+            Whether the time range is centered on ``start``.
+        index : `int`, optional
+            SAL index of the CSC.
+        limit : `callable`, optional
+            Coroutine function that runs an InfluxDB request, given as a
+            coroutine, e.g. once it has a query slot.
+
+        Returns
+        -------
+        `pandas.DataFrame`
+            The time series.
+        """
+        if not self.can_batch(efd_client):
+            return await limit(
+                efd_client.select_time_series(
+                    topic, fields, start, end, is_window=is_window, index=index
+                )
+            )
+        statement = efd_client.build_time_range_query(
+            topic, fields, start, end, is_window, index
+        )
+        return await self.query(efd_client, group, statement, limit)
+
+    async def select_top_n(
+        self,
+        efd_client,
+        group,
+        topic,
+        fields,
+        num,
+        time_cut=None,
+        index=None,
+        limit=unlimited,
+    ):
+        """Select the most recent values of a topic, as
+        `lsst_efd_client.EfdClient.select_top_n` does.
+
+        Parameters
+        ----------
+        efd_client : `lsst_efd_client.EfdClient`
+            The EFD client.
+        group : `tuple`
+            Queries that can be sent together.
+        topic : `str`
+            Name of the topic.
+        fields : `list` [`str`]
+            Names of the fields.
+        num : `int`
+            Number of values.
+        time_cut : `str`, optional
+            Time to select the values before, None for now.
+        index : `int`, optional
+            SAL index of the CSC.
+        limit : `callable`, optional
+            Coroutine function that runs an InfluxDB request, given as a
+            coroutine, e.g. once it has a query slot.
+
+        Returns
+        -------
+        `pandas.DataFrame`
+            The most recent values.
+        """
+        if not self.can_batch(efd_client):
+            return await limit(
+                efd_client.select_top_n(
+                    topic, fields, num, time_cut=time_cut, index=index
+                )
+            )
+        statement = build_top_n_query(
+            efd_client.db_name, topic, fields, num, time_cut, index
+        )
+        return await self.query(efd_client, group, statement, limit)
+
+    async def query(self, efd_client, group, statement, limit=unlimited):
+        """Add a statement to the batch of its group and wait for its
+        result.
+
+        Parameters
+        ----------
+        efd_client : `lsst_efd_client.EfdClient`
+            The EFD client.
+        group : `tuple`
+            Queries that can be sent together.
+        statement : `str`
+            The InfluxQL statement.
+        limit : `callable`, optional
+            Coroutine function that runs the InfluxDB request of the batch.
+            Only statements with the same limit are batched together.
+
+        Returns
+        -------
+        `pandas.DataFrame`
+            The result of the statement.
+        """
+        loop = asyncio.get_running_loop()
+        key = (id(efd_client), group, limit)
+        batch = self.pending.get(key)
+        if batch is None:
+            batch = []
+            self.pending[key] = batch
+            loop.call_soon(self._send, key, efd_client, limit)
+        future = loop.create_future()
+        batch.append((statement, future))
+        self.statements += 1
+        if len(batch) >= self.max_statements:
+            self._send(key, efd_client, limit)
+        return await future
+
+    def _send(self, key, efd_client, limit):
+        batch = self.pending.pop(key, None)
+        if batch is None:
+            return
+        task = asyncio.create_task(self._run(efd_client, batch, limit))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    async def _run(self, efd_client, batch, limit):
+        statements = [statement for statement, _ in batch]
+        try:
+            results = await self._run_batch(efd_client, statements, limit)
+        except asyncio.CancelledError:
+            for _, future in batch:
+                future.cancel()
+            raise
+        for (_, future), result in zip(batch, results):
+            if future.done():
+                continue
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    async def _run_batch(self, efd_client, statements, limit):
+        self.requests += 1
+        try:
+            result = await limit(efd_client.influx_client.query(";".join(statements)))
+            return split_results(result, len(statements))
+        except Exception as e:
+            if len(statements) == 1:
+                return [e]
+            logging.error(f"Batched EFD query failed, retrying one by one: {e}")
+            self.fallbacks += 1
+            return await asyncio.gather(
+                *[
+                    self._run_one(efd_client, statement, limit)
+                    for statement in statements
+                ],
+                return_exceptions=True,
+            )
+
+    async def _run_one(self, efd_client, statement, limit):
+        self.requests += 1
+        result = await limit(efd_client.influx_client.query(statement))
+        return split_results(result, 1)[0]
+
+    async def close(self):
+        """Cancel the pending batches and the running requests."""
+        for batch in self.pending.values():
+            for _, future in batch:
+                future.cancel()
+        self.pending = dict()
+        tasks = list(self.tasks)
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    def stats(self):
+        """Return the batching statistics.
+
+        Returns
+        -------
+        `dict`
+            The maximum number of statements of a request, the number of
+            statements and of requests sent, and the number of batches
+            that failed and were sent one by one.
+        """
+        return {
+            "max_statements": self.max_statements,
+            "statements": self.statements,
+            "requests": self.requests,
+            "fallbacks": self.fallbacks,
+        }
@@ -0,0 +1,432 @@
+# This file is part of LOVE-commander.
+#
+# Copyright (c) 2023 Inria Chile.
+#
+# Developed by Inria Chile.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or at
+# your option any later version.
+#
+# This program is distributed in the hope that it will be useful,but
+# WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+# or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License
+# for more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program. If not, see <http://www.gnu.org/licenses/>.
+
+import collections
+import time
+
+import pandas as pd
+
+from .aggregate import aggregate_frame
+
+EFD_CACHE_MAX_BYTES = 64 * 1024 * 1024
+EFD_CACHE_MIN_TTL = 5
+EFD_CACHE_MAX_TTL = 3600
+EFD_CACHE_TTL_FACTOR = 0.1
+EFD_WINDOW_CACHE_MAX_BYTES = 64 * 1024 * 1024
+EFD_WINDOW_TTL = 60
+EFD_WINDOW_LAG = 5
+
+
+def dataframe_size(df):
+    """Return the memory used by a DataFrame.
+
+    Parameters
+    ----------
+    df : `pandas.DataFrame`
+        The DataFrame.
+
+    Returns
+    -------
+    `int`
+        Size in bytes of the data and the index.
+    """
+    return int(df.memory_usage(index=True, deep=True).sum())
+
+
+class QueryCache:
+    """LRU cache of EFD query results, bounded by their size in bytes.
+
+    The time to live of each result depends on how far in the past its
+    time window ends: a window that ended recently may still receive late
+    data, so its result is kept for ``min_ttl`` seconds only, while older
+    windows are kept longer, up to ``max_ttl`` seconds.
+
+    Parameters
+    ----------
+    max_bytes : `int`, optional
+        Maximum total size of the cached results. Zero or less disables
+        the cache.
+    min_ttl : `float`, optional
+        Time (seconds) results of windows that ended recently are kept.
+    max_ttl : `float`, optional
+        Maximum time (seconds) results are kept.
+    ttl_factor : `float`, optional
+        Time results are kept per second elapsed since their window ended.
+    """
+
+    def __init__(
+        self,
+        max_bytes=EFD_CACHE_MAX_BYTES,
+        min_ttl=EFD_CACHE_MIN_TTL,
+        max_ttl=EFD_CACHE_MAX_TTL,
+        ttl_factor=EFD_CACHE_TTL_FACTOR,
+    ):
+        self.max_bytes = max_bytes
+        self.min_ttl = min_ttl
+        self.max_ttl = max_ttl
+        self.ttl_factor = ttl_factor
+
+        self.entries = collections.OrderedDict()
+        self.bytes = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def ttl(self, end=None):
+        """Return the time to live of a result.
+
+        Parameters
+        ----------
+        end : `float`, optional
+            End of the time window of the result, as a unix timestamp.
+            None means the window ends now.
+
+        Returns
+        -------
+        `float`
+            Time (seconds) to keep the result.
+        """
+        if end is None:
+            return self.min_ttl
+        age = time.time() - end
+        return min(self.max_ttl, max(self.min_ttl, age * self.ttl_factor))
+
+    def get(self, key):
+        """Get a cached result.
+
+        Parameters
+        ----------
+        key : `tuple`
+            The query key.
+
+        Returns
+        -------
+        `object` or `None`
+            The result, or None if it is not cached or has expired.
+        """
+        entry = self.entries.get(key)
+        if entry is not None and entry["expires"] <= time.monotonic():
+            self._remove(key)
+            self.expirations += 1
+            entry = None
+        if entry is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return entry["value"]
+
+    def put(self, key, value, size, end=None, ttl=None):
+        """Cache a result, evicting the least recently used ones if the
+        cache is full.
+
+        Parameters
+        ----------
+        key : `tuple`
+            The query key.
+        value : `object`
+            The result.
+        size : `int`
+            Size of the result in bytes.
+        end : `float`, optional
+            End of the time window of the result, as a unix timestamp.
+            None means the window ends now.
+        ttl : `float`, optional
+            Time (seconds) to keep the result. If given, ``end`` is
+            ignored.
+        """
+        if key in self.entries:
+            self._remove(key)
+        if size > self.max_bytes:
+            return
+        self.entries[key] = {
+            "value": value,
+            "size": size,
+            "expires": time.monotonic() + (ttl if ttl is not None else self.ttl(end)),
+        }
+        self.bytes += size
+        while self.bytes > self.max_bytes:
+            self._remove(next(iter(self.entries)))
+            self.evictions += 1
+
+    def _remove(self, key):
+        entry = self.entries.pop(key)
+        self.bytes -= entry["size"]
+
+    def clear(self):
+        """Remove every cached result."""
+        self.entries.clear()
+        self.bytes = 0
+
+    def stats(self):
+        """Return the cache statistics.
+
+        Returns
+        -------
+        `dict`
+            The cache configuration, size and hits, misses, evictions and
+            expirations counters.
+        """
+        return {
+            "max_bytes": self.max_bytes,
+            "min_ttl": self.min_ttl,
+            "max_ttl": self.max_ttl,
+            "bytes": self.bytes,
+            "entries": len(self.entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+
+def resample_frame(frame, resample, aggregations=None):
+    """Resample a time series to the mean, or the given aggregations, of
+    each bin.
+
+    Bins are aligned to the unix epoch, so the bins of overlapping windows
+    match.
+
+    Parameters
+    ----------
+    frame : `pandas.DataFrame`
+        The time series.
+    resample : `str` or `None`
+        Resampling frequency, e.g. 1min, None to keep the raw time series.
+    aggregations : `tuple` [`str`], optional
+        Aggregations to compute instead of the mean, see `aggregate_frame`.
+
+    Returns
+    -------
+    `pandas.DataFrame`
+        The resampled time series.
+    """
+    if aggregations and resample is not None:
+        return aggregate_frame(frame, resample, aggregations, origin="epoch")
+    if frame.empty or resample is None:
+        return frame
+    return frame.resample(resample, origin="epoch").mean()
+
+
+def _index_time(timestamp, frame):
+    """Convert a UTC timestamp to the time zone of the index of a frame."""
+    if frame.index.tz is None:
+        return timestamp.tz_localize(None)
+    return timestamp
+
+
+def _between(frame, start=None, end=None, include_end=True):
+    """Return the rows of a frame between two UTC timestamps."""
+    if frame.empty:
+        return frame
+    mask = pd.Series(True, index=frame.index)
+    if start is not None:
+        mask &= frame.index >= _index_time(start, frame)
+    if end is not None:
+        end = _index_time(end, frame)
+        mask &= frame.index <= end if include_end else frame.index < end
+    return frame[mask.values]
+
+
+class TimeSeriesWindow:
+    """Raw data of a topic for a time window, with the data resampled.
+
+    Windows are never modified: `update` returns a new window, so a window
+    can be shared by concurrent requests.
+
+    Parameters
+    ----------
+    frame : `pandas.DataFrame`
+        The raw time series.
+    start : `pandas.Timestamp`
+        Start of the window, in UTC.
+    end : `pandas.Timestamp`
+        End of the window, in UTC. Data is complete up to this time.
+    resample : `str` or `None`
+        Resampling frequency, e.g. 1min, None to keep the raw time series.
+    resampled : `pandas.DataFrame`
+        The time series resampled with `resample_frame`.
+    aggregations : `tuple` [`str`], optional
+        Aggregations computed instead of the mean.
+    """
+
+    def __init__(self, frame, start, end, resample, resampled, aggregations=None):
+        self.frame = frame
+        self.start = start
+        self.end = end
+        self.resample = resample
+        self.resampled = resampled
+        self.aggregations = aggregations
+
+    @property
+    def size(self):
+        """Memory used by the window data, in bytes."""
+        if self.resampled is self.frame:
+            return dataframe_size(self.frame)
+        return dataframe_size(self.frame) + dataframe_size(self.resampled)
+
+    def missing_interval(self, start, end, lag=EFD_WINDOW_LAG):
+        """Return the interval to query to move the window.
+
+        Parameters
+        ----------
+        start : `pandas.Timestamp`
+            Start of the new window, in UTC.
+        end : `pandas.Timestamp`
+            End of the new window, in UTC.
+        lag : `float`, optional
+            Time (seconds) it can take for data to be available in the EFD.
+            The last ``lag`` seconds of the window are queried again.
+
+        Returns
+        -------
+        `tuple` [`pandas.Timestamp`, `pandas.Timestamp`] or `None`
+            Start and end of the interval to query, which is the whole new
+            window if it does not overlap this one, or None if this window
+            already has all the data.
+        """
+        if start < self.start or start > self.end:
+            return start, end
+        fetch_start = max(start, self.end - pd.Timedelta(seconds=lag))
+        if end <= fetch_start:
+            return None
+        return fetch_start, end
+
+    def update(
+        self,
+        start,
+        end,
+        resample,
+        tail=None,
+        fetch_start=None,
+        fetched=None,
+        aggregations=None,
+    ):
+        """Return the window moved to a new interval.
+
+        Rows before the new start or after the new end are dropped, rows
+        from ``fetch_start`` on are replaced by ``tail`` and only the bins
+        affected by these changes are resampled again.
+
+        Parameters
+        ----------
+        start : `pandas.Timestamp`
+            Start of the new window, in UTC.
+        end : `pandas.Timestamp`
+            End of the new window, in UTC.
+        resample : `str` or `None`
+            Resampling frequency, e.g. 1min, None to keep the raw data.
+        tail : `pandas.DataFrame`, optional
+            Data queried for the interval returned by `missing_interval`,
+            None if nothing was queried.
+        fetch_start : `pandas.Timestamp`, optional
+            Start of the queried interval.
+        fetched : `pandas.Timestamp`, optional
+            Time the interval was queried, in UTC.
+        aggregations : `tuple` [`str`], optional
+            Aggregations to compute instead of the mean.
+
+        Returns
+        -------
+        `TimeSeriesWindow`
+            The new window.
+        """
+        frame = self.frame
+        changed = end
+        covered = end
+        if tail is not None:
+            tail = _between(tail, fetch_start, end)
+            frame = _between(frame, end=fetch_start, include_end=False)
+            if frame.empty:
+                frame = tail
+            elif not tail.empty:
+                frame = pd.concat([frame, tail])
+            changed = fetch_start
+            covered = min(end, fetched)
+        frame = _between(frame, start, end)
+
+        if (
+            resample is None
+            or resample != self.resample
+            or aggregations != self.aggregations
+            or changed <= start
+        ):
+            resampled = resample_frame(frame, resample, aggregations)
+        else:
+            resampled = self._resample_changes(
+                frame, start, changed, resample, aggregations
+            )
+        return TimeSeriesWindow(
+            frame, start, covered, resample, resampled, aggregations
+        )
+
+    def _resample_changes(self, frame, start, changed, resample, aggregations=None):
+        """Resample the bins of a frame that changed since this window.
+
+        Parameters
+        ----------
+        frame : `pandas.DataFrame`
+            The new raw time series.
+        start : `pandas.Timestamp`
+            Start of the new window, in UTC.
+        changed : `pandas.Timestamp`
+            Time of the first row that changed, in UTC.
+        resample : `str`
+            Resampling frequency, e.g. 1min.
+        aggregations : `tuple` [`str`], optional
+            Aggregations to compute instead of the mean.
+
+        Returns
+        -------
+        `pandas.DataFrame`
+            The new time series resampled.
+        """
+        offset = pd.tseries.frequencies.to_offset(resample)
+        if (
+            frame.empty
+            or self.resampled.empty
+            or not isinstance(offset, pd.offsets.Tick)
+        ):
+            return resample_frame(frame, resample, aggregations)
+
+        head_bin = _index_time(start, frame).floor(offset)
+        changed_bin = _index_time(changed, frame).floor(offset)
+        if changed_bin <= head_bin:
+            return resample_frame(frame, resample, aggregations)
+
+        # The first bin lost the rows before the new start, the bins from
+        # the first changed row on have new rows, the ones between are kept.
+        parts = [
+            resample_frame(
+                _between(frame, end=head_bin + offset, include_end=False),
+                resample,
+                aggregations,
+            ),
+            self.resampled[
+                (self.resampled.index > head_bin) & (self.resampled.index < changed_bin)
+            ],
+            resample_frame(frame[frame.index >= changed_bin], resample, aggregations),
+        ]
+        resampled = pd.concat([part for part in parts if not part.empty])
+        bins = pd.date_range(
+            frame.index[0].floor(offset), frame.index[-1].floor(offset), freq=offset
+        )
+        return resampled.reindex(bins)
@@ -0,0 +1,359 @@
+# This file is part of LOVE-commander.
+#
+# Copyright (c) 2023 Inria Chile.
+#
+# Developed by Inria Chile.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or at
+# your option any later version.
+#
+# This program is distributed in the hope that it will be useful,but
+# WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+# or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License
+# for more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program. If not, see <http://www.gnu.org/licenses/>.
+
+import asyncio
+import inspect
+import logging
+import os
+import time
+
+import aiohttp
+import lsst_efd_client
+
+EFD_CLIENT_CONNECTION_TIMEOUT = 5
+EFD_CLIENT_CONNECTION_RETRIES = 2
+EFD_CLIENT_RETRY_BACKOFF = 0.25
+EFD_CLIENT_FAILURE_TTL = 30
+EFD_CLIENT_POOL_SIZE = 0
+EFD_CLIENT_POOL_SIZE_PER_HOST = 0
+EFD_CLIENT_KEEPALIVE_TIMEOUT = 15
+
+
+def build_efd_client(loop, instance):
+    """Build an EFD client.
+
+    The client checks the InfluxDB health with a blocking request, so this
+    is meant to run in an executor. The event loop is set as the loop of
+    the executor thread, since the InfluxDB client looks it up when it is
+    created.
+
+    Parameters
+    ----------
+    loop : `asyncio.AbstractEventLoop`
+        The event loop where the client will be used.
+    instance : `str`
+        Name of the EFD instance.
+
+    Returns
+    -------
+    `lsst_efd_client.EfdClient`
+        The EFD client.
+    """
+    asyncio.set_event_loop(loop)
+    try:
+        return lsst_efd_client.EfdClient(instance)
+    finally:
+        asyncio.set_event_loop(None)
+
+
+async def close_efd_client(instance, client):
+    """Close an EFD client, logging any error.
+
+    Parameters
+    ----------
+    instance : `str`
+        Name of the EFD instance.
+    client : `lsst_efd_client.EfdClient`
+        The EFD client.
+    """
+    try:
+        result = getattr(client, "influx_client", client).close()
+        if inspect.isawaitable(result):
+            await result
+    except Exception as e:
+        logging.error(f"Error closing EFD client {instance}: {e}")
+
+
+class EfdClientManager:
+    """Connect to EFD instances without blocking the event loop.
+
+    Clients are built in an executor with a timeout, and retried with an
+    exponential backoff. Successful connections are kept until the manager
+    is closed. Failures are remembered for ``failure_ttl`` seconds, during
+    which requests to the instance fail right away, and are then retried.
+
+    A single manager can be shared by several applications, so each EFD
+    instance has one InfluxDB connection pool. Every application calls
+    `retain` when it starts and `release` when it is cleaned up, and the
+    clients are closed when the last one releases the manager.
+
+    Parameters
+    ----------
+    timeout : `float`, optional
+        Time (seconds) to wait for each connection attempt.
+    retries : `int`, optional
+        Number of attempts after the first one fails.
+    backoff : `float`, optional
+        Time (seconds) to wait before the first retry, doubled before each
+        of the next ones.
+    failure_ttl : `float`, optional
+        Time (seconds) a failed connection is remembered.
+    pool_size : `int`, optional
+        Maximum number of simultaneous connections to each EFD instance.
+        Zero or less keeps the aiohttp default.
+    pool_size_per_host : `int`, optional
+        Maximum number of simultaneous connections to each InfluxDB host.
+        Zero or less means no limit.
+    keepalive_timeout : `float`, optional
+        Time (seconds) idle connections are kept open.
+    """
+
+    def __init__(
+        self,
+        timeout=EFD_CLIENT_CONNECTION_TIMEOUT,
+        retries=EFD_CLIENT_CONNECTION_RETRIES,
+        backoff=EFD_CLIENT_RETRY_BACKOFF,
+        failure_ttl=EFD_CLIENT_FAILURE_TTL,
+        pool_size=EFD_CLIENT_POOL_SIZE,
+        pool_size_per_host=EFD_CLIENT_POOL_SIZE_PER_HOST,
+        keepalive_timeout=EFD_CLIENT_KEEPALIVE_TIMEOUT,
+    ):
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.failure_ttl = failure_ttl
+        self.pool_size = pool_size
+        self.pool_size_per_host = pool_size_per_host
+        self.keepalive_timeout = keepalive_timeout
+
+        self.clients = dict()
+        self.failures = dict()
+        self.status = dict()
+        self.references = 0
+        self._connect_tasks = dict()
+
+    @classmethod
+    def from_env(cls):
+        """Create a manager configured from the ``EFD_CONNECTION_TIMEOUT``,
+        ``EFD_CONNECTION_RETRIES``, ``EFD_CONNECTION_BACKOFF``,
+        ``EFD_CONNECTION_FAILURE_TTL``, ``EFD_POOL_SIZE``,
+        ``EFD_POOL_SIZE_PER_HOST`` and ``EFD_POOL_KEEPALIVE_TIMEOUT``
+        environment variables.
+
+        Returns
+        -------
+        `EfdClientManager`
+            The manager.
+        """
+        return cls(
+            timeout=float(
+                os.environ.get("EFD_CONNECTION_TIMEOUT", EFD_CLIENT_CONNECTION_TIMEOUT)
+            ),
+            retries=int(
+                os.environ.get("EFD_CONNECTION_RETRIES", EFD_CLIENT_CONNECTION_RETRIES)
+            ),
+            backoff=float(
+                os.environ.get("EFD_CONNECTION_BACKOFF", EFD_CLIENT_RETRY_BACKOFF)
+            ),
+            failure_ttl=float(
+                os.environ.get("EFD_CONNECTION_FAILURE_TTL", EFD_CLIENT_FAILURE_TTL)
+            ),
+            pool_size=int(os.environ.get("EFD_POOL_SIZE", EFD_CLIENT_POOL_SIZE)),
+            pool_size_per_host=int(
+                os.environ.get("EFD_POOL_SIZE_PER_HOST", EFD_CLIENT_POOL_SIZE_PER_HOST)
+            ),
+            keepalive_timeout=float(
+                os.environ.get(
+                    "EFD_POOL_KEEPALIVE_TIMEOUT", EFD_CLIENT_KEEPALIVE_TIMEOUT
+                )
+            ),
+        )
+
+    def retain(self):
+        """Register an application that uses the manager."""
+        self.references += 1
+
+    async def release(self):
+        """Unregister an application, closing the clients if it was the
+        last one using the manager.
+        """
+        self.references -= 1
+        if self.references <= 0:
+            self.references = 0
+            await self.close()
+
+    async def get(self, instance):
+        """Get the client of an EFD instance, connecting to it if needed.
+
+        Concurrent requests for an instance that is being connected wait for
+        the same connection.
+
+        Parameters
+        ----------
+        instance : `str`
+            Name of the EFD instance.
+
+        Returns
+        -------
+        `lsst_efd_client.EfdClient` or `None`
+            The EFD client, or None if the connection failed.
+        """
+        if instance in self.clients:
+            return self.clients[instance]
+
+        failure = self.failures.get(instance)
+        if failure is not None:
+            if time.monotonic() - failure["time"] < self.failure_ttl:
+                return None
+            del self.failures[instance]
+
+        task = self._connect_tasks.get(instance)
+        if task is None:
+            task = asyncio.create_task(self._connect(instance))
+            self._connect_tasks[instance] = task
+            task.add_done_callback(lambda _: self._connect_tasks.pop(instance, None))
+        return await asyncio.shield(task)
+
+    async def _connect(self, instance):
+        """Connect to an EFD instance, retrying with backoff.
+
+        Parameters
+        ----------
+        instance : `str`
+            Name of the EFD instance.
+
+        Returns
+        -------
+        `lsst_efd_client.EfdClient` or `None`
+            The EFD client, or None if every attempt failed.
+        """
+        loop = asyncio.get_running_loop()
+        delay = self.backoff
+        status = self.status.setdefault(
+            instance, {"state": None, "attempts": 0, "error": None, "since": None}
+        )
+        status.update(state="connecting", since=time.time())
+        for attempt in range(self.retries + 1):
+            status["attempts"] += 1
+            if attempt > 0:
+                await asyncio.sleep(delay)
+                delay *= 2
+            future = loop.run_in_executor(None, build_efd_client, loop, instance)
+            try:
+                client = await asyncio.wait_for(asyncio.shield(future), self.timeout)
+            except asyncio.TimeoutError:
+                # The thread can't be stopped, close the client if it
+                # eventually connects.
+                future.add_done_callback(lambda f: self._close_late_client(instance, f))
+                error = f"Timed out after {self.timeout} s"
+            except Exception as e:
+                error = str(e) or type(e).__name__
+            else:
+                await self._create_session(client)
+                self.clients[instance] = client
+                status.update(state="connected", error=None, since=time.time())
+                return client
+            logging.error(
+                f"Could not connect to EFD instance {instance} "
+                f"(attempt {attempt + 1} of {self.retries + 1}): {error}"
+            )
+
+        self.failures[instance] = {"time": time.monotonic(), "error": error}
+        status.update(state="failed", error=error, since=time.time())
+        return None
+
+    async def _create_session(self, client):
+        """Create the HTTP session of a client with the connection pool
+        options.
+
+        Parameters
+        ----------
+        client : `lsst_efd_client.EfdClient`
+            The EFD client.
+        """
+        influx_client = getattr(client, "influx_client", None)
+        if influx_client is None or not hasattr(influx_client, "create_session"):
+            return
+        options = {"keepalive_timeout": self.keepalive_timeout}
+        if self.pool_size > 0:
+            options["limit"] = self.pool_size
+        if self.pool_size_per_host > 0:
+            options["limit_per_host"] = self.pool_size_per_host
+        await influx_client.create_session(connector=aiohttp.TCPConnector(**options))
+
+    async def ping(self, instance):
+        """Check that a connected EFD instance answers.
+
+        Parameters
+        ----------
+        instance : `str`
+            Name of the EFD instance.
+
+        Returns
+        -------
+        `dict`
+            The result of the check: ``ok`` is True if the instance
+            answered, ``latency`` is the time (seconds) it took, and
+            ``error`` the error message if it did not answer.
+        """
+        client = self.clients[instance]
+        start_time = time.monotonic()
+        try:
+            await asyncio.wait_for(client.influx_client.ping(), self.timeout)
+        except Exception as e:
+            return {"ok": False, "latency": None, "error": str(e) or type(e).__name__}
+        return {"ok": True, "latency": time.monotonic() - start_time, "error": None}
+
+    async def health(self):
+        """Return the connection status of every EFD instance, pinging the
+        connected ones.
+
+        Returns
+        -------
+        `dict`
+            The status of each instance, indexed by name, with its state
+            (connecting, connected or failed), number of connection attempts,
+            last error, timestamp of the last state change, time (seconds)
+            before a failed connection is retried and, for connected
+            instances, the result of `ping`.
+        """
+        connected = [instance for instance in self.status if instance in self.clients]
+        pings = await asyncio.gather(*[self.ping(instance) for instance in connected])
+        pings = dict(zip(connected, pings))
+
+        now = time.monotonic()
+        result = dict()
+        for instance in self.status:
+            status = dict(self.status[instance])
+            failure = self.failures.get(instance)
+            status["retry_in"] = (
+                max(0, self.failure_ttl - (now - failure["time"]))
+                if failure is not None
+                else None
+            )
+            status["ping"] = pings.get(instance)
+            result[instance] = status
+        return result
+
+    def _close_late_client(self, instance, future):
+        if not future.cancelled() and future.exception() is None:
+            asyncio.create_task(close_efd_client(instance, future.result()))
+
+    async def close(self):
+        """Cancel the pending connections and close every client."""
+        tasks = list(self._connect_tasks.values())
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+        for instance, client in self.clients.items():
+            await close_efd_client(instance, client)
+        self.clients = dict()
+        self.failures = dict()
+        self.status = dict()
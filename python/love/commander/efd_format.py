@@ -0,0 +1,302 @@
+# This file is part of LOVE-commander.
+#
+# Copyright (c) 2023 Inria Chile.
+#
+# Developed by Inria Chile.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or at
+# your option any later version.
+#
+# This program is distributed in the hope that it will be useful,but
+# WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+# or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License
+# for more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program. If not, see <http://www.gnu.org/licenses/>.
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+EFD_FORMATS = ("points", "columnar")
+ARROW_STREAM_TYPE = "application/vnd.apache.arrow.stream"
+PARQUET_TYPE = "application/vnd.apache.parquet"
+BINARY_TYPES = (ARROW_STREAM_TYPE, PARQUET_TYPE)
+ARROW_AVAILABLE = pa is not None
+EFD_LOGS_LIMIT = 1000
+
+
+def column_values(column):
+    """Convert a column to a list of JSON serializable values.
+
+    Parameters
+    ----------
+    column : `pandas.Series`
+        The column.
+
+    Returns
+    -------
+    `list`
+        The values, with NaN and missing values replaced by None.
+    """
+    values = column.to_numpy()
+    mask = pd.isna(values)
+    values = values.astype(object)
+    values[mask] = None
+    return values.tolist()
+
+
+def to_columnar(frame, drop_missing=False):
+    """Serialize a time series to a dictionary of columns.
+
+    Parameters
+    ----------
+    frame : `pandas.DataFrame`
+        The time series, indexed by time.
+    drop_missing : `bool`, optional
+        Whether to drop the missing values of each field. The fields then
+        have their own timestamps.
+
+    Returns
+    -------
+    `dict`
+        The timestamps as strings, in ``ts``, and the values of each field,
+        with NaN replaced by None. Or, with ``drop_missing``, the
+        timestamps, in ``ts``, and the values, in ``value``, of each
+        field.
+    """
+    if drop_missing:
+        result = dict()
+        for field in frame.columns:
+            column = frame[field].dropna()
+            result[field] = {
+                "ts": column.index.astype(str).tolist(),
+                "value": column_values(column),
+            }
+        return result
+
+    result = {"ts": frame.index.astype(str).tolist()}
+    for field in frame.columns:
+        result[field] = column_values(frame[field])
+    return result
+
+
+def to_points(frame, drop_missing=False):
+    """Serialize a time series to a list of points per field.
+
+    Parameters
+    ----------
+    frame : `pandas.DataFrame`
+        The time series, indexed by time.
+    drop_missing : `bool`, optional
+        Whether to drop the points with a missing value.
+
+    Returns
+    -------
+    `dict`
+        The points of each field, each one with its timestamp as a string,
+        in ``ts``, and its value, with NaN replaced by None.
+    """
+    # Timestamps are formatted one by one, as they always were: a whole
+    # index may be formatted with a common resolution instead.
+    timestamps = [str(ts) for ts in frame.index]
+    return {
+        field: [
+            {"ts": ts, "value": value}
+            for ts, value in zip(timestamps, column_values(frame[field]))
+            if value is not None or not drop_missing
+        ]
+        for field in frame.columns
+    }
+
+
+def serialize_frame(frame, format="points", drop_missing=False):
+    """Serialize a time series in the given format.
+
+    Parameters
+    ----------
+    frame : `pandas.DataFrame`
+        The time series, indexed by time.
+    format : `str`, optional
+        One of `EFD_FORMATS`: ``points`` for `to_points` or ``columnar``
+        for `to_columnar`.
+    drop_missing : `bool`, optional
+        Whether to drop the missing values of each field, e.g. the values
+        that `downsample_frame` did not select.
+
+    Returns
+    -------
+    `dict`
+        The serialized time series.
+    """
+    if format == "columnar":
+        return to_columnar(frame, drop_missing)
+    return to_points(frame, drop_missing)
+
+
+def to_log_records(frame):
+    """Serialize log messages to records, newest first.
+
+    Parameters
+    ----------
+    frame : `pandas.DataFrame`
+        The log messages, with a ``private_rcvStamp`` field.
+
+    Returns
+    -------
+    `list` [`dict`]
+        The log messages sorted by ``private_rcvStamp`` in descending order.
+    """
+    return sorted(
+        frame.to_dict("records"), key=lambda x: x["private_rcvStamp"], reverse=True
+    )
+
+
+def parse_accept(accept):
+    """Parse the media ranges of an Accept header.
+
+    Parameters
+    ----------
+    accept : `str`
+        Value of the Accept header.
+
+    Returns
+    -------
+    `list` [`tuple` [`str`, `float`]]
+        Each media range, in lower case, with its quality. Ranges with an
+        invalid quality are skipped.
+    """
+    media_ranges = []
+    for media_range in accept.split(","):
+        media_type, *params = media_range.split(";")
+        media_type = media_type.strip().lower()
+        if not media_type:
+            continue
+        quality = 1.0
+        try:
+            for param in params:
+                name, _, value = param.partition("=")
+                if name.strip().lower() == "q":
+                    quality = float(value)
+        except ValueError:
+            continue
+        media_ranges.append((media_type, quality))
+    return media_ranges
+
+
+def accepted_binary_type(accept):
+    """Return the binary media type preferred by an Accept header.
+
+    Binary types have to be listed explicitly, so wildcards keep the JSON
+    responses. A binary type is chosen if its quality is higher than the
+    one of JSON, given by its most specific media range, or equal and it
+    is listed first.
+
+    Parameters
+    ----------
+    accept : `str`
+        Value of the Accept header.
+
+    Returns
+    -------
+    `str` or `None`
+        One of `BINARY_TYPES`, or None if the header prefers JSON or does
+        not accept any of them.
+    """
+    media_ranges = parse_accept(accept)
+    json_ranges = ("application/json", "application/*", "*/*")
+    json_quality = 0.0
+    json_position = len(media_ranges)
+    for specificity in json_ranges:
+        matches = [
+            (position, quality)
+            for position, (media_type, quality) in enumerate(media_ranges)
+            if media_type == specificity
+        ]
+        if matches:
+            json_position, json_quality = matches[0]
+            break
+
+    best = None
+    for position, (media_type, quality) in enumerate(media_ranges):
+        if media_type not in BINARY_TYPES or quality <= 0:
+            continue
+        if quality > json_quality or (
+            quality == json_quality and position < json_position
+        ):
+            if best is None or quality > best[1]:
+                best = (media_type, quality)
+    return best[0] if best is not None else None
+
+
+def to_arrow_table(frame, source, error=None):
+    """Convert a DataFrame to an Arrow table.
+
+    Columns are converted without copies whenever their type allows it.
+    The name of the source, and the error of its query if it failed, are
+    added to the schema metadata.
+
+    Parameters
+    ----------
+    frame : `pandas.DataFrame` or `None`
+        The query result, None if the query failed.
+    source : `str`
+        Name of the source.
+    error : `str`, optional
+        Error message of the query.
+
+    Returns
+    -------
+    `pyarrow.Table`
+        The table.
+    """
+    table = pa.Table.from_pandas(frame if frame is not None else pd.DataFrame())
+    metadata = dict(table.schema.metadata or {})
+    metadata[b"source"] = source.encode()
+    if error is not None:
+        metadata[b"error"] = error.encode()
+    return table.replace_schema_metadata(metadata)
+
+
+def to_arrow_stream(table):
+    """Serialize an Arrow table to the IPC streaming format.
+
+    Parameters
+    ----------
+    table : `pyarrow.Table`
+        The table.
+
+    Returns
+    -------
+    `pyarrow.Buffer`
+        The serialized stream.
+    """
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue()
+
+
+def to_parquet(table):
+    """Serialize an Arrow table to Parquet.
+
+    Parameters
+    ----------
+    table : `pyarrow.Table`
+        The table.
+
+    Returns
+    -------
+    `pyarrow.Buffer`
+        The Parquet file.
+    """
+    sink = pa.BufferOutputStream()
+    pq.write_table(table, sink)
+    return sink.getvalue()
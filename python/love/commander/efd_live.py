@@ -0,0 +1,237 @@
+# This file is part of LOVE-commander.
+#
+# Copyright (c) 2023 Inria Chile.
+#
+# Developed by Inria Chile.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or at
+# your option any later version.
+#
+# This program is distributed in the hope that it will be useful,but
+# WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+# or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License
+# for more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program. If not, see <http://www.gnu.org/licenses/>.
+
+import asyncio
+
+EFD_LIVE_MIN_INTERVAL = 1
+EFD_LIVE_MAX_INTERVAL = 30
+EFD_LIVE_BACKOFF = 1.5
+EFD_LIVE_QUEUE_SIZE = 100
+
+
+def push(queue, message):
+    """Put a message in a subscriber queue, dropping the oldest message if
+    the subscriber is too slow to keep up.
+
+    Parameters
+    ----------
+    queue : `asyncio.Queue`
+        The subscriber queue.
+    message : `dict`
+        The message.
+    """
+    if queue.full():
+        queue.get_nowait()
+    queue.put_nowait(message)
+
+
+class TopicPoller:
+    """Poll the most recent values of a topic for its subscribers.
+
+    The values are pushed to the subscribers only when they change. The
+    polling interval goes back to ``min_interval`` when the values change
+    and grows by ``backoff`` times, up to ``max_interval``, when they
+    don't.
+
+    Parameters
+    ----------
+    source : `str`
+        Name of the source, ``<CSC>-<salindex>-<topic>``.
+    poll : `callable`
+        Coroutine function that returns the values, JSON serializable.
+    min_interval : `float`, optional
+        Minimum time (seconds) between polls.
+    max_interval : `float`, optional
+        Maximum time (seconds) between polls.
+    backoff : `float`, optional
+        Factor the interval grows by when the values don't change.
+    """
+
+    def __init__(
+        self,
+        source,
+        poll,
+        min_interval=EFD_LIVE_MIN_INTERVAL,
+        max_interval=EFD_LIVE_MAX_INTERVAL,
+        backoff=EFD_LIVE_BACKOFF,
+    ):
+        self.source = source
+        self.poll = poll
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+
+        self.interval = min_interval
+        self.subscribers = set()
+        self.last_message = None
+        self.task = None
+        self.polls = 0
+        self.pushes = 0
+
+    def subscribe(self, queue):
+        """Add a subscriber, sending it the last values, and start polling
+        if needed.
+
+        Parameters
+        ----------
+        queue : `asyncio.Queue`
+            Queue of the subscriber.
+        """
+        self.subscribers.add(queue)
+        if self.last_message is not None:
+            push(queue, self.last_message)
+        if self.task is None:
+            self.task = asyncio.create_task(self.run())
+
+    def unsubscribe(self, queue):
+        """Remove a subscriber, and stop polling if it was the last one.
+
+        Parameters
+        ----------
+        queue : `asyncio.Queue`
+            Queue of the subscriber.
+
+        Returns
+        -------
+        `bool`
+            Whether the poller has no subscribers left.
+        """
+        self.subscribers.discard(queue)
+        if not self.subscribers and self.task is not None:
+            self.task.cancel()
+            self.task = None
+        return not self.subscribers
+
+    async def run(self):
+        """Poll the values until the poller is stopped."""
+        while True:
+            try:
+                message = {"type": "data", "source": self.source}
+                message["data"] = await self.poll()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                message = {
+                    "type": "error",
+                    "source": self.source,
+                    "ack": str(e) or type(e).__name__,
+                }
+            self.polls += 1
+
+            if message != self.last_message:
+                self.last_message = message
+                self.pushes += 1
+                for queue in self.subscribers:
+                    push(queue, message)
+                self.interval = self.min_interval
+            else:
+                self.interval = min(self.interval * self.backoff, self.max_interval)
+            await asyncio.sleep(self.interval)
+
+
+class LivePollers:
+    """Pollers shared by the subscribers of the same topic values.
+
+    Parameters
+    ----------
+    min_interval : `float`, optional
+        Minimum time (seconds) between polls.
+    max_interval : `float`, optional
+        Maximum time (seconds) between polls.
+    backoff : `float`, optional
+        Factor the interval grows by when the values don't change.
+    """
+
+    def __init__(
+        self,
+        min_interval=EFD_LIVE_MIN_INTERVAL,
+        max_interval=EFD_LIVE_MAX_INTERVAL,
+        backoff=EFD_LIVE_BACKOFF,
+    ):
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.pollers = dict()
+
+    def subscribe(self, key, source, poll, queue):
+        """Subscribe to the values of a topic, creating its poller if there
+        is none.
+
+        Parameters
+        ----------
+        key : `tuple`
+            The normalized subscription.
+        source : `str`
+            Name of the source.
+        poll : `callable`
+            Coroutine function that returns the values, used if the poller
+            is created.
+        queue : `asyncio.Queue`
+            Queue of the subscriber.
+        """
+        poller = self.pollers.get(key)
+        if poller is None:
+            poller = TopicPoller(
+                source, poll, self.min_interval, self.max_interval, self.backoff
+            )
+            self.pollers[key] = poller
+        poller.subscribe(queue)
+
+    def unsubscribe(self, key, queue):
+        """Unsubscribe from the values of a topic, removing its poller if it
+        has no subscribers left.
+
+        Parameters
+        ----------
+        key : `tuple`
+            The normalized subscription.
+        queue : `asyncio.Queue`
+            Queue of the subscriber.
+        """
+        poller = self.pollers.get(key)
+        if poller is not None and poller.unsubscribe(queue):
+            del self.pollers[key]
+
+    async def close(self):
+        """Stop every poller and wait for it to finish."""
+        tasks = [
+            poller.task for poller in self.pollers.values() if poller.task is not None
+        ]
+        self.pollers = dict()
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    def stats(self):
+        """Return the polling statistics.
+
+        Returns
+        -------
+        `dict`
+            The number of pollers and subscriptions, and the number of polls
+            and pushes of the running pollers.
+        """
+        pollers = self.pollers.values()
+        return {
+            "pollers": len(self.pollers),
+            "subscriptions": sum(len(poller.subscribers) for poller in pollers),
+            "polls": sum(poller.polls for poller in pollers),
+            "pushes": sum(poller.pushes for poller in pollers),
+        }
@@ -0,0 +1,333 @@
+# This file is part of LOVE-commander.
+#
+# Copyright (c) 2023 Inria Chile.
+#
+# Developed by Inria Chile.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or at
+# your option any later version.
+#
+# This program is distributed in the hope that it will be useful,but
+# WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+# or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License
+# for more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program. If not, see <http://www.gnu.org/licenses/>.
+
+import base64
+import json
+
+import numpy as np
+import pandas as pd
+
+
+def encode_cursor(timestamp, source, skip=0):
+    """Encode the position of the last row of a page as an opaque cursor.
+
+    Parameters
+    ----------
+    timestamp : `int`
+        Time of the row, in nanoseconds since the unix epoch.
+    source : `str`
+        Name of the source of the row.
+    skip : `int`, optional
+        Number of rows of the source at that time already returned, which
+        breaks ties between rows with the same time.
+
+    Returns
+    -------
+    `str`
+        The cursor.
+    """
+    data = json.dumps([int(timestamp), source, int(skip)]).encode()
+    return base64.urlsafe_b64encode(data).decode()
+
+
+def decode_cursor(cursor):
+    """Decode a cursor returned by `encode_cursor`.
+
+    Parameters
+    ----------
+    cursor : `str`
+        The cursor.
+
+    Returns
+    -------
+    `tuple` [`int`, `str`, `int`]
+        Time, in nanoseconds since the unix epoch, and source of the last
+        row of the previous page, and number of rows of that source at
+        that time already returned.
+
+    Raises
+    ------
+    ValueError
+        If the cursor is not valid.
+    """
+    try:
+        timestamp, source, skip = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        if int(skip) < 0:
+            raise ValueError
+        return int(timestamp), str(source), int(skip)
+    except Exception:
+        raise ValueError(f"Invalid cursor {cursor}")
+
+
+def cursor_condition(source, cursor, descending):
+    """Return the time condition of the rows of a source after a cursor.
+
+    Rows are ordered by time and then by source, so rows of sources that
+    come after the source of the cursor can have the same time. Rows of
+    the source of the cursor at the same time are included too, and the
+    ones already returned are dropped by `skip_returned`.
+
+    Parameters
+    ----------
+    source : `str`
+        Name of the source.
+    cursor : `tuple` [`int`, `str`, `int`]
+        The decoded cursor.
+    descending : `bool`
+        Whether pages go from the newest rows to the oldest ones.
+
+    Returns
+    -------
+    `str`
+        The InfluxQL condition.
+    """
+    timestamp, cursor_source, _ = cursor
+    if descending:
+        return (
+            f"time <= {timestamp}" if source <= cursor_source else f"time < {timestamp}"
+        )
+    return f"time >= {timestamp}" if source >= cursor_source else f"time > {timestamp}"
+
+
+def returned_rows(source, cursor):
+    """Return the number of rows of a source at the time of a cursor that
+    were already returned.
+
+    Parameters
+    ----------
+    source : `str`
+        Name of the source.
+    cursor : `tuple` [`int`, `str`, `int`] or `None`
+        The decoded cursor.
+
+    Returns
+    -------
+    `int`
+        The number of rows.
+    """
+    if cursor is None or source != cursor[1]:
+        return 0
+    return cursor[2]
+
+
+def skip_returned(frame, source, cursor):
+    """Drop the rows of a page query of a source that were already returned.
+
+    Parameters
+    ----------
+    frame : `pandas.DataFrame`
+        The rows after the cursor, sorted, as returned by a page query.
+    source : `str`
+        Name of the source.
+    cursor : `tuple` [`int`, `str`, `int`] or `None`
+        The decoded cursor.
+
+    Returns
+    -------
+    `pandas.DataFrame`
+        The rows that were not returned yet.
+    """
+    skip = returned_rows(source, cursor)
+    if skip == 0 or frame.empty:
+        return frame
+    at_cursor = np.flatnonzero(index_nanoseconds(frame) == cursor[0])
+    keep = np.ones(len(frame), dtype=bool)
+    keep[at_cursor[:skip]] = False
+    return frame[keep]
+
+
+def build_page_query(
+    db_name, topic, fields, start, end, index, source, page_size, cursor, descending
+):
+    """Build the InfluxQL query of a page of a source.
+
+    The query is built as `lsst_efd_client.EfdClient` builds its time range
+    queries, with the cursor condition, the order and the page size.
+
+    Parameters
+    ----------
+    db_name : `str`
+        Name of the EFD database.
+    topic : `str`
+        Name of the topic.
+    fields : `list` [`str`]
+        Names of the fields.
+    start : `astropy.time.Time`
+        Start of the time range.
+    end : `astropy.time.Time`
+        End of the time range.
+    index : `int`
+        SAL index of the CSC.
+    source : `str`
+        Name of the source.
+    page_size : `int`
+        Maximum number of rows.
+    cursor : `tuple` [`int`, `str`, `int`] or `None`
+        The decoded cursor of the previous page.
+    descending : `bool`
+        Whether pages go from the newest rows to the oldest ones.
+
+    Returns
+    -------
+    `str`
+        The query, which also returns the rows to drop with
+        `skip_returned`.
+    """
+    conditions = [f"time >= '{start.utc.isot}Z'", f"time <= '{end.utc.isot}Z'"]
+    if index:
+        conditions.append(f"salIndex = {index}")
+    if cursor is not None:
+        conditions.append(cursor_condition(source, cursor, descending))
+    order = "DESC" if descending else "ASC"
+    return (
+        f'SELECT {", ".join(fields)} FROM "{db_name}"."autogen"."{topic}" '
+        f"WHERE {' AND '.join(conditions)} ORDER BY time {order} "
+        f"LIMIT {page_size + returned_rows(source, cursor)}"
+    )
+
+
+def index_nanoseconds(frame):
+    """Return the times of the rows of a frame, in nanoseconds since the
+    unix epoch, taking naive times as UTC.
+    """
+    index = pd.DatetimeIndex(frame.index)
+    if index.tz is not None:
+        index = index.tz_convert("UTC")
+    return index.asi8
+
+
+def cut_page(frame, source, page_size, cursor, descending):
+    """Select the rows of a page from a frame with more rows.
+
+    This does in memory what `build_page_query` asks InfluxDB to do.
+
+    Parameters
+    ----------
+    frame : `pandas.DataFrame`
+        The rows of the time range.
+    source : `str`
+        Name of the source.
+    page_size : `int`
+        Maximum number of rows.
+    cursor : `tuple` [`int`, `str`, `int`] or `None`
+        The decoded cursor of the previous page.
+    descending : `bool`
+        Whether pages go from the newest rows to the oldest ones.
+
+    Returns
+    -------
+    `pandas.DataFrame`
+        The rows of the page, sorted.
+    """
+    if frame.empty:
+        return frame
+    if cursor is not None:
+        times = index_nanoseconds(frame)
+        timestamp, cursor_source, _ = cursor
+        if descending:
+            after = times < timestamp
+            if source <= cursor_source:
+                after |= times == timestamp
+        else:
+            after = times > timestamp
+            if source >= cursor_source:
+                after |= times == timestamp
+        frame = frame[after]
+    frame = frame.sort_index(ascending=not descending, kind="stable")
+    return skip_returned(frame, source, cursor).iloc[:page_size]
+
+
+def merge_pages(frames, page_size, descending, cursor=None):
+    """Merge the pages of several sources into a single page.
+
+    Rows are ordered by time and then by source, and the first
+    ``page_size`` ones are kept.
+
+    Parameters
+    ----------
+    frames : `dict` [`str`, `pandas.DataFrame`]
+        The page of each source, sorted, with at most ``page_size`` rows.
+    page_size : `int`
+        Maximum number of rows.
+    descending : `bool`
+        Whether pages go from the newest rows to the oldest ones.
+    cursor : `tuple` [`int`, `str`, `int`], optional
+        The decoded cursor of the previous page.
+
+    Returns
+    -------
+    `tuple` [`dict` [`str`, `pandas.DataFrame`], `str` or `None`]
+        The rows of each source in the page, and the cursor of the next
+        page, or None if this is the last one.
+    """
+    sources = sorted(frames)
+    times = [index_nanoseconds(frames[source]) for source in sources]
+    all_times = np.concatenate(times) if times else np.array([], dtype=np.int64)
+    ranks = np.repeat(np.arange(len(sources)), [len(t) for t in times])
+    if descending:
+        order = np.lexsort((-ranks, -all_times))
+    else:
+        order = np.lexsort((ranks, all_times))
+    page = order[:page_size]
+    counts = np.bincount(ranks[page], minlength=len(sources))
+    result = {
+        source: frames[source].iloc[:count] for source, count in zip(sources, counts)
+    }
+
+    # Sources with a full page may have more rows in the EFD
+    has_more = len(order) > page_size or any(len(t) >= page_size for t in times)
+    next_cursor = None
+    if has_more and len(page) > 0:
+        last = page[-1]
+        timestamp = all_times[last]
+        source = sources[ranks[last]]
+        # Count the rows of the source at that time, in this page and in
+        # the previous ones
+        skip = np.count_nonzero(
+            (all_times[page] == timestamp) & (ranks[page] == ranks[last])
+        )
+        if cursor is not None and cursor[0] == timestamp:
+            skip += returned_rows(source, cursor)
+        next_cursor = encode_cursor(timestamp, source, skip)
+    return result, next_cursor
+
+
+def page_records(page, descending):
+    """Convert the rows of a page to records, in the order of the page.
+
+    Parameters
+    ----------
+    page : `dict` [`str`, `pandas.DataFrame`]
+        The rows of each source in the page, as returned by `merge_pages`.
+    descending : `bool`
+        Whether pages go from the newest rows to the oldest ones.
+
+    Returns
+    -------
+    `list` [`dict`]
+        The records, each one with its ``source``.
+    """
+    rows = []
+    for source, frame in page.items():
+        times = index_nanoseconds(frame)
+        for time, record in zip(times, frame.to_dict("records")):
+            record["source"] = source
+            rows.append((time, source, record))
+    rows.sort(key=lambda row: (row[0], row[1]), reverse=descending)
+    return [record for _, _, record in rows]
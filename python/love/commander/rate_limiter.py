@@ -0,0 +1,243 @@
+# This file is part of LOVE-commander.
+#
+# Copyright (c) 2023 Inria Chile.
+#
+# Developed by Inria Chile.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or at
+# your option any later version.
+#
+# This program is distributed in the hope that it will be useful,but
+# WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+# or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License
+# for more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program. If not, see <http://www.gnu.org/licenses/>.
+
+import time
+
+RATE_LIMIT_CSC_RATE = 50
+RATE_LIMIT_CSC_BURST = 100
+RATE_LIMIT_CSC_MAX_IN_FLIGHT = 100
+RATE_LIMIT_IDENTITY_RATE = 20
+RATE_LIMIT_IDENTITY_BURST = 50
+RATE_LIMIT_IDENTITY_MAX_IN_FLIGHT = 50
+RATE_LIMIT_IN_FLIGHT_RETRY_AFTER = 1
+RATE_LIMIT_MAX_KEYS = 1000
+
+
+class CommandLimiter:
+    """Token bucket and in-flight limit of the commands sent by one client
+    or to one CSC.
+
+    The bucket holds up to ``burst`` tokens and is refilled at ``rate``
+    tokens per second. Every command takes a token, and is counted as in
+    flight until it finishes.
+
+    Parameters
+    ----------
+    rate : `float`
+        Tokens added per second. Zero or less disables the token bucket.
+    burst : `int`
+        Maximum number of tokens.
+    max_in_flight : `int`
+        Maximum number of commands in flight. Zero or less disables the
+        limit.
+    """
+
+    def __init__(self, rate, burst, max_in_flight):
+        self.rate = rate
+        self.burst = burst
+        self.max_in_flight = max_in_flight
+
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.in_flight = 0
+
+        self.accepted = 0
+        self.rejections = 0
+
+    def refill(self):
+        """Add the tokens accumulated since the last update."""
+        now = time.monotonic()
+        if self.rate > 0:
+            self.tokens = min(
+                self.burst, self.tokens + (now - self.updated) * self.rate
+            )
+        self.updated = now
+
+    def retry_after(self):
+        """Return the time to wait before a command is accepted.
+
+        Returns
+        -------
+        `float`
+            Time (seconds) to wait, zero if a command can be sent now.
+        """
+        if self.max_in_flight > 0 and self.in_flight >= self.max_in_flight:
+            return RATE_LIMIT_IN_FLIGHT_RETRY_AFTER
+        if self.rate <= 0:
+            return 0
+        self.refill()
+        if self.tokens >= 1:
+            return 0
+        return (1 - self.tokens) / self.rate
+
+    def take(self):
+        """Take a token and count a new command in flight."""
+        if self.rate > 0:
+            self.tokens -= 1
+        self.in_flight += 1
+        self.accepted += 1
+
+    def release(self):
+        """Count a command in flight as finished."""
+        self.in_flight -= 1
+
+    @property
+    def idle(self):
+        """True if there is no command in flight and the bucket is full."""
+        if self.in_flight > 0:
+            return False
+        if self.rate <= 0:
+            return True
+        self.refill()
+        return self.tokens >= self.burst
+
+    def to_dict(self):
+        """Return the limiter state and counters.
+
+        Returns
+        -------
+        `dict`
+            The number of commands in flight, the tokens left and the
+            accepted and rejected commands counters.
+        """
+        if self.rate > 0:
+            self.refill()
+        return {
+            "in_flight": self.in_flight,
+            "tokens": self.tokens if self.rate > 0 else None,
+            "accepted": self.accepted,
+            "rejections": self.rejections,
+        }
+
+
+class RateLimits:
+    """Command limits per CSC, indexed by ``<csc>.<salindex>``, and per
+    identity.
+
+    A command is accepted only if both the limiter of its CSC and the one
+    of its identity accept it.
+
+    Parameters
+    ----------
+    csc_rate : `float`, optional
+        Commands per second accepted for each CSC.
+    csc_burst : `int`, optional
+        Commands accepted at once for each CSC.
+    csc_max_in_flight : `int`, optional
+        Maximum number of commands in flight for each CSC.
+    identity_rate : `float`, optional
+        Commands per second accepted from each identity.
+    identity_burst : `int`, optional
+        Commands accepted at once from each identity.
+    identity_max_in_flight : `int`, optional
+        Maximum number of commands in flight from each identity.
+    """
+
+    def __init__(
+        self,
+        csc_rate=RATE_LIMIT_CSC_RATE,
+        csc_burst=RATE_LIMIT_CSC_BURST,
+        csc_max_in_flight=RATE_LIMIT_CSC_MAX_IN_FLIGHT,
+        identity_rate=RATE_LIMIT_IDENTITY_RATE,
+        identity_burst=RATE_LIMIT_IDENTITY_BURST,
+        identity_max_in_flight=RATE_LIMIT_IDENTITY_MAX_IN_FLIGHT,
+    ):
+        self.csc_limits = (csc_rate, csc_burst, csc_max_in_flight)
+        self.identity_limits = (identity_rate, identity_burst, identity_max_in_flight)
+        self.cscs = dict()
+        self.identities = dict()
+
+    def _get(self, limiters, key, limits):
+        if key not in limiters:
+            if len(limiters) >= RATE_LIMIT_MAX_KEYS:
+                for idle_key in [k for k, limiter in limiters.items() if limiter.idle]:
+                    del limiters[idle_key]
+            limiters[key] = CommandLimiter(*limits)
+        return limiters[key]
+
+    def acquire(self, csc, salindex, identity):
+        """Try to reserve a slot for a command.
+
+        Parameters
+        ----------
+        csc : `str`
+            Name of the CSC.
+        salindex : `int`
+            SAL index of the CSC.
+        identity : `str`
+            Identity of the user sending the command.
+
+        Returns
+        -------
+        `float`
+            Zero if the command is accepted, in which case the caller must
+            call `release` once it finishes. Otherwise the time (seconds) to
+            wait before sending it again.
+        """
+        limiters = (
+            self._get(self.cscs, f"{csc}.{salindex}", self.csc_limits),
+            self._get(self.identities, identity, self.identity_limits),
+        )
+        retry_after = max(limiter.retry_after() for limiter in limiters)
+        if retry_after > 0:
+            for limiter in limiters:
+                limiter.rejections += 1
+            return retry_after
+        for limiter in limiters:
+            limiter.take()
+        return 0
+
+    def release(self, csc, salindex, identity):
+        """Release the slot of a finished command.
+
+        Parameters
+        ----------
+        csc : `str`
+            Name of the CSC.
+        salindex : `int`
+            SAL index of the CSC.
+        identity : `str`
+            Identity of the user that sent the command.
+        """
+        self.cscs[f"{csc}.{salindex}"].release()
+        self.identities[identity].release()
+
+    def stats(self):
+        """Return the limits configuration and the state of each limiter.
+
+        Returns
+        -------
+        `dict`
+            The limits, the total commands in flight and rejected, and the
+            state of the limiter of each CSC and identity.
+        """
+        cscs = {key: limiter.to_dict() for key, limiter in self.cscs.items()}
+        identities = {
+            key: limiter.to_dict() for key, limiter in self.identities.items()
+        }
+        return {
+            "csc": dict(zip(("rate", "burst", "max_in_flight"), self.csc_limits)),
+            "identity": dict(
+                zip(("rate", "burst", "max_in_flight"), self.identity_limits)
+            ),
+            "in_flight": sum(limiter["in_flight"] for limiter in cscs.values()),
+            "rejections": sum(limiter["rejections"] for limiter in cscs.values()),
+            "cscs": cscs,
+            "identities": identities,
+        }
@@ -0,0 +1,500 @@
+# This file is part of LOVE-commander.
+#
+# Copyright (c) 2023 Inria Chile.
+#
+# Developed by Inria Chile.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or at
+# your option any later version.
+#
+# This program is distributed in the hope that it will be useful,but
+# WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+# or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License
+# for more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program. If not, see <http://www.gnu.org/licenses/>.
+
+import asyncio
+import collections
+import contextlib
+import logging
+import time
+
+from lsst.ts import salobj
+
+REMOTE_POOL_MAX_SIZE = 100
+REMOTE_POOL_IDLE_TTL = 3600
+REMOTE_POOL_REAP_INTERVAL = 60
+REMOTE_POOL_WARM_UP_CONCURRENCY = 5
+IDENTITY_POLL_INTERVAL = 0.01
+
+
+class IdentityGate:
+    """Make sure commands are sent with the identity of their user.
+
+    The identity of a command is taken from the ``salinfo`` of the remote
+    when the command is written, so a remote shared by several users must
+    not change its identity while another user's command is being sent.
+    The gate lets any number of commands with the same identity be sent
+    at once, and makes commands with a different identity wait until those
+    sends are done.
+
+    Waiting commands are served in arrival order: a command can only join
+    the commands being sent if no command with another identity is waiting
+    before it, so a stream of commands from one user cannot starve the
+    others.
+
+    Parameters
+    ----------
+    salinfo : `salobj.SalInfo`
+        The SAL info of the remote.
+    """
+
+    def __init__(self, salinfo):
+        self.salinfo = salinfo
+        self.identity = None
+        self.senders = 0
+        self.waiters = []
+        self._condition = asyncio.Condition()
+
+    @property
+    def waiting(self):
+        """Number of commands waiting to be sent."""
+        return len(self.waiters)
+
+    @contextlib.asynccontextmanager
+    async def send(self, identity):
+        """Set the identity of the remote while a command is being sent.
+
+        Parameters
+        ----------
+        identity : `str`
+            Identity of the user sending the command.
+        """
+        async with self._condition:
+            if self.waiters or not self._can_send(identity):
+                # A list, so each waiter is a distinct object
+                waiter = [identity]
+                self.waiters.append(waiter)
+                try:
+                    await self._condition.wait_for(lambda: self._is_turn(waiter))
+                finally:
+                    self.waiters.remove(waiter)
+                    # Waiters with the same identity behind may go now
+                    self._condition.notify_all()
+            self.identity = identity
+            self.salinfo.identity = identity
+            self.senders += 1
+        try:
+            yield
+        finally:
+            async with self._condition:
+                self.senders -= 1
+                self._condition.notify_all()
+
+    async def start_command(self, cmd, data, identity, timeout):
+        """Start a command with the identity of its user.
+
+        The gate is held until the command is written, which is when
+        `salobj` copies the identity of the remote into
+        ``data.private_identity``, or until the command start finishes.
+        Acknowledgements are not waited for, so commands from different
+        users are only serialized while they are written.
+
+        Parameters
+        ----------
+        cmd : `salobj.topics.RemoteCommand`
+            The command to send.
+        data : ``cmd.DataType``
+            The command data, used by this command only.
+        identity : `str`
+            Identity of the user sending the command.
+        timeout : `float`
+            Time (seconds) to wait for the first acknowledgement.
+
+        Returns
+        -------
+        `asyncio.Task`
+            The task of ``cmd.start``, returning the first acknowledgement.
+        """
+        async with self.send(identity):
+            data.private_identity = ""
+            start = asyncio.create_task(
+                cmd.start(data=data, timeout=timeout, wait_done=False)
+            )
+            try:
+                await asyncio.sleep(0)
+                while not start.done() and data.private_identity != identity:
+                    await asyncio.wait({start}, timeout=IDENTITY_POLL_INTERVAL)
+            except asyncio.CancelledError:
+                start.cancel()
+                raise
+        return start
+
+    def _can_send(self, identity):
+        return self.senders == 0 or self.identity == identity
+
+    def _is_turn(self, waiter):
+        identity = waiter[0]
+        if not self._can_send(identity):
+            return False
+        for other in self.waiters:
+            if other is waiter:
+                return True
+            if other[0] != identity:
+                return False
+        return False
+
+
+class RemotePool:
+    """Bounded pool of `salobj.Remote` instances used to send commands.
+
+    Remotes are created for commanding only (no events nor telemetry) and
+    are indexed by ``<csc>.<salindex>``. The pool keeps them in least
+    recently used order: when it grows beyond ``max_size`` the least
+    recently used remotes that are not running a command are removed and
+    closed in the background. Remotes that stay unused for longer than
+    ``idle_ttl`` seconds are closed by a periodic reaper.
+
+    Remotes opened with `warm_up` are pinned: they are never evicted nor
+    reaped, so the first command sent to them does not pay their start up.
+
+    Creation is single-flight: concurrent requests for a remote that is not
+    open yet all wait on the same start task, so each remote (and the
+    `salobj.Domain` they share) is only built once.
+
+    Parameters
+    ----------
+    max_size : `int`, optional
+        Maximum number of remotes to keep open.
+    idle_ttl : `float`, optional
+        Time (seconds) after which an unused remote is closed.
+    reap_interval : `float`, optional
+        Time (seconds) between runs of the idle remotes reaper.
+    """
+
+    def __init__(
+        self,
+        max_size=REMOTE_POOL_MAX_SIZE,
+        idle_ttl=REMOTE_POOL_IDLE_TTL,
+        reap_interval=REMOTE_POOL_REAP_INTERVAL,
+    ):
+        self.max_size = max_size
+        self.idle_ttl = idle_ttl
+        self.reap_interval = reap_interval
+
+        self.domain = None
+        self.remotes = collections.OrderedDict()
+        self.last_used = dict()
+        self.in_use = collections.Counter()
+        self.identity_gates = dict()
+        self.pinned = set()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.coalesced = 0
+
+        self._start_tasks = dict()
+        self._reap_task = None
+        self._close_tasks = set()
+
+    def start(self):
+        """Start the idle remotes reaper."""
+        if self._reap_task is None or self._reap_task.done():
+            self._reap_task = asyncio.create_task(self._reap_loop())
+
+    async def close(self):
+        """Stop the reaper and close every remote and the domain."""
+        if self._reap_task is not None:
+            self._reap_task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._reap_task
+            self._reap_task = None
+
+        if self._start_tasks:
+            await asyncio.gather(*self._start_tasks.values(), return_exceptions=True)
+
+        while self.remotes:
+            remote_name, remote = self.remotes.popitem(last=False)
+            self.identity_gates.pop(remote_name, None)
+            self.pinned.discard(remote_name)
+            self.last_used.pop(remote_name, None)
+            self._schedule_close(remote_name, remote)
+        if self._close_tasks:
+            await asyncio.gather(*self._close_tasks, return_exceptions=True)
+
+        if self.domain is not None:
+            await self.domain.close()
+            self.domain = None
+
+    async def get(self, csc, salindex):
+        """Get the remote for a given CSC, creating it if needed.
+
+        Parameters
+        ----------
+        csc : `str`
+            Name of the CSC.
+        salindex : `int`
+            SAL index of the CSC.
+
+        Returns
+        -------
+        `salobj.Remote`
+            The command-only remote of the CSC.
+        """
+        remote_name = f"{csc}.{salindex}"
+
+        if remote_name in self.remotes:
+            self.hits += 1
+            self.last_used[remote_name] = time.monotonic()
+            self.remotes.move_to_end(remote_name)
+            return self.remotes[remote_name]
+
+        start_task = self._start_tasks.get(remote_name)
+        if start_task is None:
+            self.misses += 1
+            start_task = asyncio.create_task(self._start_remote(csc, salindex))
+            self._start_tasks[remote_name] = start_task
+            start_task.add_done_callback(
+                lambda task: self._forget_start_task(remote_name, task)
+            )
+        else:
+            self.coalesced += 1
+
+        # Shield the shared task so a cancelled waiter does not cancel the
+        # start of the remote for the others.
+        return await asyncio.shield(start_task)
+
+    async def warm_up(self, components, concurrency=REMOTE_POOL_WARM_UP_CONCURRENCY):
+        """Open and pin the remotes of a list of CSCs.
+
+        Parameters
+        ----------
+        components : `list` [`tuple` [`str`, `int`]]
+            The name and SAL index of the CSCs.
+        concurrency : `int`, optional
+            Maximum number of remotes being started at once.
+
+        Returns
+        -------
+        `dict`
+            Dictionary indexed by ``<csc>.<salindex>`` with the time
+            (seconds) it took to start each remote and the error message
+            if it could not be started.
+        """
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def warm_up_remote(csc, salindex):
+            remote_name = f"{csc}.{salindex}"
+            async with semaphore:
+                start_time = time.monotonic()
+                error = None
+                # Pin before starting, so the remote can't be evicted by
+                # the others being warmed up before this waiter resumes.
+                self.pinned.add(remote_name)
+                try:
+                    await self.get(csc, salindex)
+                except Exception as e:
+                    logging.warning(f"Could not warm up remote {remote_name}: {e}")
+                    self.pinned.discard(remote_name)
+                    error = str(e)
+                return remote_name, {
+                    "elapsed": time.monotonic() - start_time,
+                    "error": error,
+                }
+
+        results = await asyncio.gather(
+            *[warm_up_remote(csc, salindex) for csc, salindex in components]
+        )
+        return dict(results)
+
+    def identity_gate(self, csc, salindex):
+        """Get the identity gate of an open remote.
+
+        Parameters
+        ----------
+        csc : `str`
+            Name of the CSC.
+        salindex : `int`
+            SAL index of the CSC.
+
+        Returns
+        -------
+        `IdentityGate`
+            The gate to use to send commands with the remote.
+        """
+        return self.identity_gates[f"{csc}.{salindex}"]
+
+    @contextlib.asynccontextmanager
+    async def acquire(self, csc, salindex):
+        """Get a remote and mark it as in use while the context is active.
+
+        Remotes in use are never evicted nor reaped.
+
+        Parameters
+        ----------
+        csc : `str`
+            Name of the CSC.
+        salindex : `int`
+            SAL index of the CSC.
+
+        Yields
+        ------
+        `salobj.Remote`
+            The command-only remote of the CSC.
+        """
+        remote_name = f"{csc}.{salindex}"
+        remote = await self.get(csc, salindex)
+        # The remote may have been evicted between the end of its start task
+        # and this waiter resuming, in which case get a fresh one.
+        while self.remotes.get(remote_name) is not remote:
+            remote = await self.get(csc, salindex)
+        self.in_use[remote_name] += 1
+        try:
+            yield remote
+        finally:
+            self.in_use[remote_name] -= 1
+            if self.in_use[remote_name] <= 0:
+                del self.in_use[remote_name]
+            if remote_name in self.remotes:
+                self.last_used[remote_name] = time.monotonic()
+
+    def stats(self):
+        """Return the pool statistics.
+
+        Returns
+        -------
+        `dict`
+            Dictionary with the pool configuration, the hits, misses,
+            coalesced, evictions and expirations counters, the number of
+            live, starting and pinned remotes and the names of the remotes from
+            least to most recently used.
+        """
+        return {
+            "max_size": self.max_size,
+            "idle_ttl": self.idle_ttl,
+            "live": len(self.remotes),
+            "in_use": sum(self.in_use.values()),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "coalesced": self.coalesced,
+            "starting": len(self._start_tasks),
+            "closing": len(self._close_tasks),
+            "pinned": len(self.pinned),
+            "remotes": list(self.remotes),
+        }
+
+    async def _start_remote(self, csc, salindex):
+        """Create and start a remote, then add it to the pool.
+
+        Parameters
+        ----------
+        csc : `str`
+            Name of the CSC.
+        salindex : `int`
+            SAL index of the CSC.
+
+        Returns
+        -------
+        `salobj.Remote`
+            The started remote.
+        """
+        remote_name = f"{csc}.{salindex}"
+
+        # Only create domain if it does not already exist.
+        if self.domain is None:
+            logging.info("Creating salobj.Domain()")
+            self.domain = salobj.Domain()
+            self.domain.default_identity = "LOVE"
+
+        logging.info(f"Creating remote {remote_name}.")
+        # Create remote for commanding only, exclude all events and
+        # telemetry topics
+        remote = salobj.Remote(self.domain, csc, salindex, include=[])
+        try:
+            await remote.start_task
+        except BaseException:
+            await self._close_remote(remote_name, remote)
+            raise
+
+        self.remotes[remote_name] = remote
+        self.identity_gates[remote_name] = IdentityGate(remote.salinfo)
+        self.last_used[remote_name] = time.monotonic()
+        self._evict(keep=remote_name)
+        return remote
+
+    def _forget_start_task(self, remote_name, task):
+        if self._start_tasks.get(remote_name) is task:
+            del self._start_tasks[remote_name]
+
+    def _evict(self, keep=None):
+        """Remove the least recently used idle remotes until the pool
+        size is within ``max_size``.
+
+        Parameters
+        ----------
+        keep : `str`, optional
+            Name of a remote that must not be evicted.
+        """
+        overflow = len(self.remotes) - self.max_size
+        if overflow <= 0:
+            return
+        candidates = [
+            name
+            for name in self.remotes
+            if name != keep and self.in_use[name] == 0 and name not in self.pinned
+        ][:overflow]
+        for remote_name in candidates:
+            logging.info(f"Evicting remote {remote_name}.")
+            self.evictions += 1
+            self._remove(remote_name)
+        if len(self.remotes) > self.max_size:
+            logging.warning(
+                f"Remote pool holds {len(self.remotes)} remotes in use, "
+                f"above its maximum size of {self.max_size}."
+            )
+
+    def _reap(self):
+        """Close the remotes that have not been used for ``idle_ttl``."""
+        now = time.monotonic()
+        expired = [
+            name
+            for name in self.remotes
+            if self.in_use[name] == 0
+            and name not in self.pinned
+            and now - self.last_used.get(name, now) > self.idle_ttl
+        ]
+        for remote_name in expired:
+            logging.info(f"Closing idle remote {remote_name}.")
+            self.expirations += 1
+            self._remove(remote_name)
+
+    async def _reap_loop(self):
+        while True:
+            await asyncio.sleep(self.reap_interval)
+            self._reap()
+
+    def _remove(self, remote_name):
+        remote = self.remotes.pop(remote_name)
+        self.identity_gates.pop(remote_name, None)
+        self.pinned.discard(remote_name)
+        self.last_used.pop(remote_name, None)
+        self._schedule_close(remote_name, remote)
+
+    def _schedule_close(self, remote_name, remote):
+        task = asyncio.create_task(self._close_remote(remote_name, remote))
+        self._close_tasks.add(task)
+        task.add_done_callback(self._close_tasks.discard)
+
+    async def _close_remote(self, remote_name, remote):
+        try:
+            await remote.close()
+        except Exception as e:
+            logging.error(f"Error closing remote {remote_name}: {e}")
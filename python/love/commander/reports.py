@@ -20,17 +20,16 @@
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
 import logging
-import signal
 from urllib.parse import urlencode, urlunparse
 
-import lsst_efd_client
 from aiohttp import web
 from astropy.time import Time
 from lsst.ts.m1m3.utils import BumpTestTimes
 from lsst.ts.xml.enums.MTM1M3 import BumpTest as BumpTestStatus
 from lsst.ts.xml.tables.m1m3 import force_actuator_from_id
 
-EFD_CLIENT_CONNECTION_TIMEOUT = 5
+from .efd_clients import EfdClientManager
+
 SITE_DOMAINS = {
     "summit_efd": "summit-lsp.lsst.codes",
     "base_efd": "base-lsp.lsst.codes",
@@ -46,12 +45,6 @@ CHRONOGRAF_DASHBOARDS_PATHS = {
     }
 }
 
-efd_clients = dict()
-
-
-def raise_timeout(*args):
-    raise TimeoutError
-
 
 def create_app(*args, **kwargs):
     """Create the Reports application.
@@ -59,6 +52,12 @@ def create_app(*args, **kwargs):
     Define Reports subapplication, which provides the endpoints to
     interact with lsst.ts methods that produce reports.
 
+    Parameters
+    ----------
+    efd_clients : `EfdClientManager`, optional
+        EFD clients shared with other applications. If not given, the
+        application has its own.
+
     Returns
     -------
     `aiohttp.web.Application`
@@ -66,21 +65,9 @@ def create_app(*args, **kwargs):
     """
     reports_app = web.Application()
 
-    def connect_to_efd_intance(instance):
-        signal.signal(signal.SIGALRM, raise_timeout)
-
-        instance_exists = efd_clients.get(instance)
-        if instance_exists is not None:
-            return instance_exists
-
-        try:
-            signal.alarm(EFD_CLIENT_CONNECTION_TIMEOUT)
-            efd_clients[instance] = lsst_efd_client.EfdClient(instance)
-        except Exception:
-            efd_clients[instance] = None
-        finally:
-            signal.signal(signal.SIGALRM, signal.SIG_IGN)
-        return efd_clients[instance]
+    efd_clients = kwargs.get("efd_clients")
+    if efd_clients is None:
+        efd_clients = EfdClientManager.from_env()
 
     def unavailable_efd_client():
         return web.json_response(
@@ -100,9 +87,7 @@ def create_app(*args, **kwargs):
                 {"ack": "Some of the required parameters is not present"}, status=400
             )
 
-        efd_client = efd_clients.get(efd_instance)
-        if efd_client is None:
-            efd_client = connect_to_efd_intance(efd_instance)
+        efd_client = await efd_clients.get(efd_instance)
         if efd_client is None:
             return unavailable_efd_client()
 
@@ -166,16 +151,13 @@ def create_app(*args, **kwargs):
     reports_app.router.add_post("/m1m3-bump-tests", query_m1m3_bump_tests)
     reports_app.router.add_post("/m1m3-bump-tests/", query_m1m3_bump_tests)
 
+    async def on_startup(app):
+        efd_clients.retain()
+
     async def on_cleanup(app):
-        global efd_clients
-        for instance, client in efd_clients.items():
-            if client is not None:
-                try:
-                    client.close()
-                except Exception as e:
-                    logging.error(f"Error closing EFD client {instance}: {e}")
-        efd_clients = dict()
+        await efd_clients.release()
 
+    reports_app.on_startup.append(on_startup)
     reports_app.on_cleanup.append(on_cleanup)
 
     return reports_app
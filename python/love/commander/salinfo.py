@@ -33,6 +33,14 @@ def create_app(*args, **kwargs):
     Define the SAL Info subapplication, which provides the endpoints to
     request info from SAL.
 
+    Parameters
+    ----------
+    remotes_len_limit : `int`, optional
+        Maximum number of CSCs to load the SAL Info of.
+    salinfos : `dict` [`str`, `salobj.SalInfo`], optional
+        Dictionary where the SAL Info instances are stored, so they can be
+        shared with other applications.
+
     Returns
     -------
     `aiohttp.web.Application`
@@ -46,7 +54,9 @@ def create_app(*args, **kwargs):
             : kwargs.get("remotes_len_limit")
         ]
 
-    salinfo = {}
+    salinfo = kwargs.get("salinfos")
+    if salinfo is None:
+        salinfo = {}
 
     async def connect_to_salinfo_instances():
         """Connect to the SAL Info instances."""
@@ -0,0 +1,105 @@
+# This file is part of LOVE-commander.
+#
+# Copyright (c) 2023 Inria Chile.
+#
+# Developed by Inria Chile.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or at
+# your option any later version.
+#
+# This program is distributed in the hope that it will be useful,but
+# WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+# or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License
+# for more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program. If not, see <http://www.gnu.org/licenses/>.
+
+import numpy as np
+import pandas as pd
+from love.commander.aggregate import aggregate_frame, is_aggregation
+from love.commander.efd_cache import TimeSeriesWindow, resample_frame
+
+
+def test_aggregate_frame():
+    # Arrange
+    index = pd.date_range("2024-01-01 00:00", periods=120, freq="1s", tz="UTC")
+    frame = pd.DataFrame(
+        {"x": np.arange(120, dtype=float), "y": -np.arange(120, dtype=float)},
+        index=index,
+    )
+
+    # Act
+    result = aggregate_frame(frame, "1min", ["min", "max", "p95", "std", "max"])
+
+    # Assert
+    assert list(result.columns) == [
+        "x:min",
+        "x:max",
+        "x:p95",
+        "x:std",
+        "y:min",
+        "y:max",
+        "y:p95",
+        "y:std",
+    ]
+    assert result["x:min"].tolist() == [0, 60]
+    assert result["y:max"].tolist() == [0, -60]
+    np.testing.assert_allclose(
+        result["x:p95"], frame["x"].resample("1min").quantile(0.95)
+    )
+    np.testing.assert_allclose(result["y:std"], frame["y"].resample("1min").std())
+    assert list(aggregate_frame(frame[:0], "1min", ["mean"]).columns) == [
+        "x:mean",
+        "y:mean",
+    ]
+    assert [is_aggregation(a) for a in ("p0", "p99.9", "p100", "p101", "mode")] == [
+        True,
+        True,
+        True,
+        False,
+        False,
+    ]
+
+
+def test_time_series_window_aggregations():
+    # Arrange
+    index = pd.date_range("2024-01-01 00:00", periods=600, freq="1s", tz="UTC")
+    data = pd.DataFrame({"value": np.arange(600, dtype=float)}, index=index)
+    aggregations = ("min", "max", "p50")
+    start = index[0]
+    end = index[299]
+    empty = pd.DataFrame()
+    window = TimeSeriesWindow(empty, start, start, None, empty).update(
+        start,
+        end,
+        "1min",
+        tail=data[start:end],
+        fetch_start=start,
+        fetched=end,
+        aggregations=aggregations,
+    )
+
+    # Act
+    new_start = start + pd.Timedelta(seconds=90)
+    new_end = end + pd.Timedelta(seconds=120)
+    fetch_start, fetch_end = window.missing_interval(new_start, new_end, lag=5)
+    new_window = window.update(
+        new_start,
+        new_end,
+        "1min",
+        tail=data[fetch_start:fetch_end],
+        fetch_start=fetch_start,
+        fetched=new_end,
+        aggregations=aggregations,
+    )
+
+    # Assert
+    pd.testing.assert_frame_equal(
+        new_window.resampled,
+        resample_frame(data[new_start:new_end], "1min", aggregations),
+        check_freq=False,
+    )
+    assert new_window.resampled["value:min"].iloc[0] == 90
@@ -0,0 +1,176 @@
+# This file is part of LOVE-commander.
+#
+# Copyright (c) 2023 Inria Chile.
+#
+# Developed by Inria Chile.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or at
+# your option any later version.
+#
+# This program is distributed in the hope that it will be useful,but
+# WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+# or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License
+# for more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program. If not, see <http://www.gnu.org/licenses/>.
+
+import time
+
+from love.commander.circuit_breaker import CircuitBreaker, CircuitBreakers
+from love.commander.commands import create_app as create_cmd_app
+from lsst.ts import salobj
+
+
+def test_breaker_opens_after_consecutive_failures():
+    # Arrange
+    breaker = CircuitBreaker(threshold=2, cool_down=30)
+
+    # Act
+    assert breaker.allow()
+    breaker.record(False)
+    assert breaker.allow()
+    breaker.record(True)
+    assert breaker.allow()
+    breaker.record(False)
+    assert breaker.allow()
+    breaker.record(False)
+
+    # Assert
+    assert breaker.state == "open"
+    assert not breaker.allow()
+    assert breaker.trips == 1
+    assert breaker.rejections == 1
+    assert 0 < breaker.retry_after() <= 30
+
+
+def test_breaker_half_open_probe():
+    # Arrange
+    breaker = CircuitBreaker(threshold=1, cool_down=30)
+    breaker.allow()
+    breaker.record(False)
+    # Pretend the cool down is over
+    breaker.opened_at = time.monotonic() - 31
+
+    # Act
+    probe_allowed = breaker.allow()
+    other_allowed = breaker.allow()
+
+    # Assert
+    assert probe_allowed
+    assert not other_allowed
+    assert breaker.state == "half_open"
+
+    # A failed probe opens the breaker again
+    breaker.record(False)
+    assert breaker.state == "open"
+    assert breaker.trips == 2
+
+    # A successful probe closes it
+    breaker.opened_at = time.monotonic() - 31
+    assert breaker.allow()
+    breaker.record(True)
+    assert breaker.state == "closed"
+    assert breaker.allow()
+
+
+def test_breaker_ignores_commands_not_sent():
+    # Arrange
+    breaker = CircuitBreaker(threshold=1, cool_down=0)
+    breaker.allow()
+    breaker.record(False)
+
+    # Act
+    assert breaker.allow()
+    breaker.record(None)
+
+    # Assert
+    assert breaker.state == "half_open"
+    assert not breaker.probing
+    assert breaker.allow()
+
+
+def test_breakers_stats():
+    # Arrange
+    breakers = CircuitBreakers(threshold=1, cool_down=30)
+    breaker = breakers.get("Test", 1)
+    breaker.allow()
+    breaker.record(False)
+    breakers.get("Test", 2)
+
+    # Act
+    stats = breakers.stats()
+
+    # Assert
+    assert breakers.get("Test", 1) is breaker
+    assert stats["open"] == 1
+    assert stats["trips"] == 1
+    assert stats["breakers"]["Test.1"]["state"] == "open"
+    assert stats["breakers"]["Test.2"]["state"] == "closed"
+
+
+async def test_unresponsive_csc_fails_fast(aiohttp_client, monkeypatch):
+    # Arrange
+    monkeypatch.setenv("COMMAND_TIMEOUTS", "1")
+    monkeypatch.setenv("COMMAND_BREAKER_THRESHOLD", "1")
+    salobj.set_test_topic_subname()
+    client = await aiohttp_client(create_cmd_app())
+    data = {
+        "csc": "Test",
+        "salindex": 2,
+        "cmd": "cmd_enable",
+        "params": {},
+        "identity": "test@localhost",
+    }
+
+    # Act
+    # No Test CSC with index 2 is running, so the command is not acknowledged
+    response = await client.post("/", json=data)
+    assert response.status == 504
+    response = await client.post("/", json=data)
+
+    # Assert
+    assert response.status == 503
+    assert int(response.headers["Retry-After"]) > 0
+
+    response = await client.get("/breakers")
+    assert response.status == 200
+    response_data = await response.json()
+    assert response_data["breakers"]["Test.2"]["state"] == "open"
+    assert response_data["rejections"] == 1
+
+
+async def test_breaker_rejections_do_not_take_tokens(aiohttp_client, monkeypatch):
+    # Arrange
+    monkeypatch.setenv("COMMAND_TIMEOUTS", "1")
+    monkeypatch.setenv("COMMAND_BREAKER_THRESHOLD", "1")
+    monkeypatch.setenv("COMMAND_CSC_RATE", "0.01")
+    monkeypatch.setenv("COMMAND_CSC_BURST", "2")
+    salobj.set_test_topic_subname()
+    client = await aiohttp_client(create_cmd_app())
+    data = {
+        "csc": "Test",
+        "salindex": 2,
+        "cmd": "cmd_enable",
+        "params": {},
+        "identity": "test@localhost",
+    }
+
+    # Act
+    # No Test CSC with index 2 is running, so the command is not acknowledged
+    response = await client.post("/", json=data)
+    assert response.status == 504
+    statuses = []
+    for _ in range(3):
+        response = await client.post("/", json=data)
+        statuses.append(response.status)
+
+    # Assert
+    # Only the command that was sent took a token
+    assert statuses == [503, 503, 503]
+    response = await client.get("/limits")
+    limits = await response.json()
+    assert limits["cscs"]["Test.2"]["accepted"] == 1
+    assert limits["rejections"] == 0
@@ -0,0 +1,145 @@
+# This file is part of LOVE-commander.
+#
+# Copyright (c) 2023 Inria Chile.
+#
+# Developed by Inria Chile.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or at
+# your option any later version.
+#
+# This program is distributed in the hope that it will be useful,but
+# WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+# or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License
+# for more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program. If not, see <http://www.gnu.org/licenses/>.
+
+import asyncio
+import json
+
+from love.commander.command_jobs import CommandJob, CommandJobTable
+from lsst.ts import salobj
+
+from commander_utils import NumpyEncoder
+
+
+def test_job_table_drops_oldest_finished_jobs():
+    # Arrange
+    table = CommandJobTable(max_size=2)
+    first = CommandJob("Test", 1, "cmd_enable", "test@localhost")
+    second = CommandJob("Test", 1, "cmd_disable", "test@localhost")
+    third = CommandJob("Test", 1, "cmd_standby", "test@localhost")
+    table.add(first)
+    table.add(second)
+
+    # Act
+    full_table_added = table.add(third)
+    first.finish("Done", 200)
+    finished_job_dropped = table.add(third)
+
+    # Assert
+    assert not full_table_added
+    assert finished_job_dropped
+    assert table.get(first.job_id) is None
+    assert table.get(second.job_id) is second
+    assert table.get(third.job_id) is third
+
+
+def test_job_table_expires_finished_jobs():
+    # Arrange
+    table = CommandJobTable(ttl=0)
+    job = CommandJob("Test", 1, "cmd_enable", "test@localhost")
+    table.add(job)
+    assert table.get(job.job_id) is job
+
+    # Act
+    job.finish("Command time out. No ack received from component.", 504)
+    job.finished -= 1
+
+    # Assert
+    assert job.state == "timeout"
+    assert table.get(job.job_id) is None
+
+
+def test_job_table_stats():
+    # Arrange
+    table = CommandJobTable(max_size=10, ttl=60)
+    finished = CommandJob("Test", 1, "cmd_enable", "test@localhost")
+    running = CommandJob("Test", 1, "cmd_disable", "test@localhost")
+    table.add(finished)
+    table.add(running)
+
+    # Act
+    finished.finish("Done", 200)
+    stats = table.stats()
+
+    # Assert
+    assert stats == {"max_size": 10, "ttl": 60, "running": 1, "finished": 1}
+
+
+async def test_command_job(http_client):
+    # Arrange
+    salobj.set_test_topic_subname()
+    csc = salobj.TestCsc(index=1, config_dir=None, initial_state=salobj.State.ENABLED)
+    await csc.start_task
+
+    # build data
+    data = json.loads(
+        json.dumps(
+            {
+                "csc": "Test",
+                "salindex": 1,
+                "cmd": "cmd_setScalars",
+                "params": csc.make_random_scalars_dict(),
+                "identity": "test@localhost",
+            },
+            cls=NumpyEncoder,
+        )
+    )
+
+    # Act
+    response = await http_client.post("/cmd/jobs", json=data)
+
+    # Assert status
+    assert response.status == 202
+    job = await response.json()
+    assert job["state"] == "running"
+
+    # Poll the job until it finishes
+    for _ in range(100):
+        response = await http_client.get(f"/cmd/jobs/{job['job_id']}")
+        assert response.status == 200
+        job = await response.json()
+        if job["state"] != "running":
+            break
+        await asyncio.sleep(0.1)
+
+    # Assert content
+    assert job["state"] == "done"
+    assert job["status"] == 200
+    assert job["ack"] == "Done"
+
+    await csc.close()
+
+
+async def test_unknown_command_job(http_client):
+    # Act
+    response = await http_client.get("/cmd/jobs/unknown")
+
+    # Assert status
+    assert response.status == 404
+
+
+async def test_command_jobs_stats(http_client):
+    # Act
+    response = await http_client.get("/cmd/jobs")
+
+    # Assert
+    assert response.status == 200
+    stats = await response.json()
+    assert stats["running"] == 0
+    assert stats["finished"] == 0
+    assert stats["max_size"] > 0
@@ -17,8 +17,13 @@
 # You should have received a copy of the GNU General Public License along with
 # this program. If not, see <http://www.gnu.org/licenses/>.
 
+import asyncio
 import json
+from unittest.mock import patch
 
+from love.commander.command_schema import CommandValidators
+from love.commander.commands import create_app as create_cmd_app
+from love.commander.commands import parse_remotes_list
 from lsst.ts import salobj
 
 from commander_utils import NumpyEncoder
@@ -77,6 +82,58 @@ async def test_wrong_data(http_client):
     )
 
 
+async def test_invalid_command_is_rejected_before_creating_remote(http_client):
+    # Arrange
+    salobj.set_test_topic_subname()
+    data = {
+        "csc": "Test",
+        "salindex": 1,
+        "cmd": "cmd_setScalars",
+        "params": {"int0": "not an int", "wrongParam": 1},
+        "identity": "test@localhost",
+    }
+    unknown_command = dict(data, cmd="cmd_wrong", params={})
+
+    # Act
+    with patch("lsst.ts.salobj.Remote") as remote:
+        response = await http_client.post("/cmd", json=data)
+        unknown_response = await http_client.post("/cmd", json=unknown_command)
+
+    # Assert
+    remote.assert_not_called()
+    assert response.status == 400
+    assert await response.json() == {
+        "ack": "Invalid parameters for Test.cmd_setScalars. "
+        "Parameter int0 must be of type int. Unknown parameter wrongParam."
+    }
+    assert unknown_response.status == 400
+    assert await unknown_response.json() == {
+        "ack": "Unknown command cmd_wrong for component Test."
+    }
+
+
+def test_command_validators_are_cached():
+    # Arrange
+    salobj.set_test_topic_subname()
+    validators = CommandValidators()
+    params = {"int0": 1, "double0": 2, "boolean0": True, "string0": "value"}
+
+    # Act
+    first_error = validators.validate("Test", "cmd_setScalars", params)
+    second_error = validators.validate("Test", "cmd_setScalars", {"int0": 1.5})
+
+    # Assert
+    assert first_error is None
+    assert second_error == (
+        "Invalid parameters for Test.cmd_setScalars. "
+        "Parameter int0 must be of type int."
+    )
+    assert list(validators.validators) == [("Test", "cmd_setScalars")]
+    assert validators.validate("NotACsc", "cmd_enable", {}) == (
+        "Unknown component NotACsc."
+    )
+
+
 async def test_timeout(http_client):
     # Arrange
     salobj.set_test_topic_subname()
@@ -108,3 +165,282 @@ async def test_timeout(http_client):
     await response.json()
     assert response.status == 504
     await csc.close()
+
+
+async def test_concurrent_commands_build_one_remote(http_client):
+    # Arrange
+    salobj.set_test_topic_subname()
+    csc = salobj.TestCsc(index=1, config_dir=None, initial_state=salobj.State.ENABLED)
+    await csc.start_task
+    concurrent_commands = 5
+
+    # build data
+    cmd_data = csc.make_random_scalars_dict()
+    data = json.loads(
+        json.dumps(
+            {
+                "csc": "Test",
+                "salindex": 1,
+                "cmd": "cmd_setScalars",
+                "params": cmd_data,
+                "identity": "test@localhost",
+            },
+            cls=NumpyEncoder,
+        )
+    )
+
+    # Act
+    with patch("lsst.ts.salobj.Remote", wraps=salobj.Remote) as mock_remote:
+        responses = await asyncio.gather(
+            *[http_client.post("/cmd", json=data) for _ in range(concurrent_commands)]
+        )
+
+        # Assert
+        assert mock_remote.call_count == 1
+
+    for response in responses:
+        assert response.status == 200
+        assert await response.json() == {"ack": "Done"}
+
+    await csc.close()
+
+
+async def test_batch_commands(http_client):
+    # Arrange
+    salobj.set_test_topic_subname()
+    csc = salobj.TestCsc(index=1, config_dir=None, initial_state=salobj.State.ENABLED)
+    await csc.start_task
+
+    # build data
+    command = json.loads(
+        json.dumps(
+            {
+                "csc": "Test",
+                "salindex": 1,
+                "cmd": "cmd_setScalars",
+                "params": csc.make_random_scalars_dict(),
+                "identity": "test@localhost",
+            },
+            cls=NumpyEncoder,
+        )
+    )
+    data = {"commands": [command, {"wrong": "data"}, command], "concurrency": 2}
+
+    # Act
+    response = await http_client.post("/cmd/batch", json=data)
+
+    # Assert status
+    assert response.status == 200
+
+    # Assert content
+    response_data = await response.json()
+    results = response_data["results"]
+    assert [result["index"] for result in results] == [0, 1, 2]
+    assert [result["status"] for result in results] == [200, 400, 200]
+    assert results[0]["ack"] == "Done"
+    assert results[0]["csc"] == "Test"
+    assert results[0]["cmd"] == "cmd_setScalars"
+    assert all(result["elapsed"] >= 0 for result in results)
+    assert response_data["elapsed"] >= 0
+
+    await csc.close()
+
+
+async def test_batch_commands_stream(http_client):
+    # Arrange
+    salobj.set_test_topic_subname()
+    csc = salobj.TestCsc(index=1, config_dir=None, initial_state=salobj.State.ENABLED)
+    await csc.start_task
+
+    # build data
+    command = json.loads(
+        json.dumps(
+            {
+                "csc": "Test",
+                "salindex": 1,
+                "cmd": "cmd_setScalars",
+                "params": csc.make_random_scalars_dict(),
+                "identity": "test@localhost",
+            },
+            cls=NumpyEncoder,
+        )
+    )
+    data = {"commands": [command, command], "stream": True}
+
+    # Act
+    response = await http_client.post("/cmd/batch", json=data)
+
+    # Assert status
+    assert response.status == 200
+
+    # Assert content
+    lines = (await response.text()).splitlines()
+    results = [json.loads(line) for line in lines]
+    assert sorted(result["index"] for result in results) == [0, 1]
+    assert all(result["ack"] == "Done" for result in results)
+
+    await csc.close()
+
+
+async def test_batch_commands_wrong_data(http_client):
+    # Arrange
+    data = {"commands": "wrong"}
+
+    # Act
+    response = await http_client.post("/cmd/batch", json=data)
+
+    # Assert status
+    assert response.status == 400
+
+
+async def test_stream_command_acks(http_client):
+    # Arrange
+    salobj.set_test_topic_subname()
+    csc = salobj.TestCsc(index=1, config_dir=None, initial_state=salobj.State.ENABLED)
+    await csc.start_task
+
+    # build data
+    data = {
+        "csc": "Test",
+        "salindex": 1,
+        "cmd": "cmd_wait",
+        "params": {
+            "duration": 1,
+            "ack": salobj.SalRetCode.CMD_COMPLETE.value,
+        },
+        "identity": "test@localhost",
+    }
+
+    # Act
+    ws = await http_client.ws_connect("/cmd/stream")
+    await ws.send_json(data)
+    first_message = await ws.receive_json(timeout=10)
+
+    # Subscribe a second client to the same command
+    other_ws = await http_client.ws_connect("/cmd/stream")
+    await other_ws.send_json({"job_id": first_message["job_id"]})
+
+    async def receive_until_result(websocket, messages):
+        while messages[-1]["type"] != "result":
+            messages.append(await websocket.receive_json(timeout=10))
+        return messages
+
+    messages = await receive_until_result(ws, [first_message])
+    other_messages = await receive_until_result(
+        other_ws, [await other_ws.receive_json(timeout=10)]
+    )
+
+    # Assert content
+    acks = [message["ack"] for message in messages if message["type"] == "ack"]
+    assert acks == ["CMD_ACK", "CMD_INPROGRESS", "CMD_COMPLETE"]
+    assert messages[-1]["state"] == "done"
+    assert messages[-1]["status"] == 200
+    assert other_messages == messages
+
+    await ws.close()
+    await other_ws.close()
+    await csc.close()
+
+
+async def test_stream_unknown_job(http_client):
+    # Act
+    ws = await http_client.ws_connect("/cmd/stream")
+    await ws.send_json({"job_id": "unknown"})
+    message = await ws.receive_json(timeout=10)
+
+    # Assert content
+    assert message == {"type": "error", "ack": "Command job not found."}
+
+    await ws.close()
+
+
+async def test_concurrent_commands_keep_their_identity(http_client):
+    # Arrange
+    salobj.set_test_topic_subname()
+    csc = salobj.TestCsc(index=1, config_dir=None, initial_state=salobj.State.ENABLED)
+    await csc.start_task
+    received_identities = dict()
+    set_scalars_callback = csc.cmd_setScalars.callback
+
+    async def record_identity(data):
+        received_identities[data.int0] = data.private_identity
+        await set_scalars_callback(data)
+
+    csc.cmd_setScalars.callback = record_identity
+
+    # build data
+    requests_data = []
+    for i in range(6):
+        cmd_data = csc.make_random_scalars_dict()
+        cmd_data["int0"] = i
+        requests_data.append(
+            json.loads(
+                json.dumps(
+                    {
+                        "csc": "Test",
+                        "salindex": 1,
+                        "cmd": "cmd_setScalars",
+                        "params": cmd_data,
+                        "identity": f"user{i % 2}@localhost",
+                    },
+                    cls=NumpyEncoder,
+                )
+            )
+        )
+
+    # Act
+    responses = await asyncio.gather(
+        *[http_client.post("/cmd", json=data) for data in requests_data]
+    )
+
+    # Assert
+    for response in responses:
+        assert response.status == 200
+    assert received_identities == {i: f"user{i % 2}@localhost" for i in range(6)}
+
+    await csc.close()
+
+
+def test_parse_remotes_list():
+    # Arrange
+    text = """
+    # Main telescope
+    MTMount:0, MTDome
+    ScriptQueue:1 ScriptQueue:2  # Both queues
+    """
+
+    # Act
+    components = parse_remotes_list(text)
+
+    # Assert
+    assert components == [
+        ("MTMount", 0),
+        ("MTDome", 0),
+        ("ScriptQueue", 1),
+        ("ScriptQueue", 2),
+    ]
+
+
+async def test_warm_up_remotes(aiohttp_client, monkeypatch):
+    # Arrange
+    monkeypatch.setenv("COMMAND_PREWARM_REMOTES", "Test:1,Test:2")
+    salobj.set_test_topic_subname()
+
+    # Act
+    client = await aiohttp_client(create_cmd_app())
+    for _ in range(100):
+        response = await client.get("/ready")
+        if response.status == 200:
+            break
+        await asyncio.sleep(0.1)
+
+    # Assert
+    assert response.status == 200
+    response_data = await response.json()
+    assert response_data["state"] == "ready"
+    assert set(response_data["remotes"]) == {"Test.1", "Test.2"}
+    assert response_data["elapsed"] >= 0
+
+    response = await client.get("/pool")
+    response_data = await response.json()
+    assert response_data["pinned"] == 2
@@ -0,0 +1,104 @@
+# This file is part of LOVE-commander.
+#
+# Copyright (c) 2023 Inria Chile.
+#
+# Developed by Inria Chile.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or at
+# your option any later version.
+#
+# This program is distributed in the hope that it will be useful,but
+# WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+# or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License
+# for more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program. If not, see <http://www.gnu.org/licenses/>.
+
+import numpy as np
+import pandas as pd
+from love.commander.downsample import downsample_frame, lttb_indices, minmax_indices
+
+
+def test_lttb_keeps_peaks():
+    # Arrange
+    x = np.arange(10000, dtype=float)
+    y = np.sin(x / 500)
+    y[1234] = 10
+    y[8765] = -10
+
+    # Act
+    selected = lttb_indices(x, y, 100)
+
+    # Assert
+    assert len(selected) == 100
+    assert selected[0] == 0
+    assert selected[-1] == 9999
+    assert np.all(np.diff(selected) > 0)
+    assert 1234 in selected
+    assert 8765 in selected
+
+
+def test_minmax_keeps_extremes_of_each_bucket():
+    # Arrange
+    y = np.random.default_rng(0).standard_normal(1000)
+
+    # Act
+    selected = minmax_indices(y, 10)
+
+    # Assert
+    assert len(selected) <= 10
+    for bucket in np.split(np.arange(1000), 5):
+        assert bucket[np.argmin(y[bucket])] in selected
+        assert bucket[np.argmax(y[bucket])] in selected
+
+
+def test_downsample_frame_per_field():
+    # Arrange
+    index = pd.date_range("2024-01-01", periods=1000, freq="1s", tz="UTC")
+    frame = pd.DataFrame(
+        {
+            "field1": np.linspace(0, 1, 1000),
+            "field2": np.zeros(1000),
+            "field3": ["value"] * 1000,
+        },
+        index=index,
+    )
+    frame.iloc[::2, 0] = np.nan
+    frame.iloc[501, 1] = 5
+
+    # Act
+    result = downsample_frame(frame, 20)
+
+    # Assert
+    assert len(result) <= 40
+    assert result["field2"].max() == 5
+    assert result.index[0] == index[0]
+    assert result.index[-1] == index[-1]
+    assert list(result.columns) == ["field1", "field2", "field3"]
+
+
+def test_downsample_frame_bounds_each_field():
+    # Arrange
+    index = pd.date_range("2024-01-01", periods=5000, freq="1s", tz="UTC")
+    rng = np.random.default_rng(0)
+    frame = pd.DataFrame(
+        {f"field{i}": rng.normal(size=5000) for i in range(10)}, index=index
+    )
+
+    # Act
+    results = {
+        method: downsample_frame(frame, 100, method) for method in ("lttb", "minmax")
+    }
+
+    # Assert
+    for result in results.values():
+        # Rows were selected for different fields...
+        assert len(result) > 100
+        # ...but each field only has its own points
+        for field in frame.columns:
+            values = result[field].dropna()
+            assert len(values) <= 100
+            assert (values == frame.loc[values.index, field]).all()
@@ -19,10 +19,14 @@
 
 
 import asyncio
+import json
 import time
 from unittest.mock import MagicMock, patch
 
+import lsst_efd_client
 import pandas as pd
+import pytest
+from love.commander.efd import create_app as create_efd_app
 
 
 # Patch for using MagicMock in async environments
@@ -587,3 +591,879 @@ async def test_efd_clients(http_client):
 
     # Stop `efd_client` patch
     mock_efd_patcher.stop()
+
+
+async def test_efd_health(http_client):
+    """Test the EFD connections health response."""
+    # Arrange
+    mock_efd_patcher = patch("lsst_efd_client.EfdClient")
+    mock_efd_client = mock_efd_patcher.start()
+    mock_efd_client.return_value = MockEFDClient()
+    request_data = {
+        "efd_instance": "summit_efd",
+        "cscs": {"ATDome": {0: {"topic1": ["field1"]}}},
+        "num": 3,
+    }
+    await http_client.post("/efd/top_timeseries/", json=request_data)
+
+    # Act
+    response = await http_client.get("/efd/health/")
+
+    # Assert
+    assert response.status == 200
+    response_data = await response.json()
+    assert response_data["summit_efd"]["state"] == "connected"
+    assert response_data["summit_efd"]["error"] is None
+
+    # Stop `efd_client` patch
+    mock_efd_patcher.stop()
+
+
+async def test_efd_timeseries_cache(http_client):
+    """Test repeated timeseries queries are served from the cache."""
+    # Arrange
+    mock_efd_patcher = patch("lsst_efd_client.EfdClient")
+    mock_efd_client = mock_efd_patcher.start()
+    efd_client = MockEFDClient()
+    mock_efd_client.return_value = efd_client
+    cscs = {
+        "ATDome": {
+            0: {"topic1": ["field1"]},
+        },
+        "ATMCS": {
+            1: {"topic2": ["field2", "field3"]},
+        },
+    }
+    request_data = {
+        "efd_instance": "summit_efd",
+        "start_date": "2020-03-16T12:00:00",
+        "time_window": 15,
+        "cscs": cscs,
+        "resample": "1min",
+    }
+
+    # Act
+    with patch.object(
+        efd_client, "select_time_series", wraps=efd_client.select_time_series
+    ) as select_time_series:
+        first_response = await http_client.post("/efd/timeseries/", json=request_data)
+        second_response = await http_client.post("/efd/timeseries/", json=request_data)
+
+    # Assert
+    assert select_time_series.call_count == 2
+    assert await first_response.json() == await second_response.json()
+    response = await http_client.get("/efd/stats/")
+    cache_stats = (await response.json())["cache"]
+    assert cache_stats["hits"] == 2
+    assert cache_stats["misses"] == 2
+    assert cache_stats["entries"] == 2
+    assert cache_stats["bytes"] > 0
+
+    # Stop `efd_client` patch
+    mock_efd_patcher.stop()
+
+
+async def test_efd_top_timeseries_now_is_not_cached(http_client):
+    """Test the most recent values are queried again by every request."""
+    # Arrange
+    mock_efd_patcher = patch("lsst_efd_client.EfdClient")
+    mock_efd_client = mock_efd_patcher.start()
+    efd_client = MockEFDClient()
+    mock_efd_client.return_value = efd_client
+    request_data = {
+        "efd_instance": "summit_efd",
+        "cscs": {"ATDome": {0: {"topic1": ["field1"]}}},
+        "num": 3,
+    }
+    past_request_data = {**request_data, "time_cut": "2020-03-16T12:00:00"}
+
+    # Act
+    with patch.object(
+        efd_client, "select_top_n", wraps=efd_client.select_top_n
+    ) as select_top_n:
+        await http_client.post("/efd/top_timeseries/", json=request_data)
+        now_response = await http_client.post("/efd/top_timeseries/", json=request_data)
+        await http_client.post("/efd/top_timeseries/", json=past_request_data)
+        past_response = await http_client.post(
+            "/efd/top_timeseries/", json=past_request_data
+        )
+
+    # Assert
+    assert now_response.status == 200
+    assert past_response.status == 200
+    # Both "now" requests query InfluxDB, the second past one is cached
+    assert select_top_n.call_count == 3
+    response = await http_client.get("/efd/stats/")
+    cache_stats = (await response.json())["cache"]
+    assert cache_stats["hits"] == 1
+    assert cache_stats["entries"] == 1
+
+    # Stop `efd_client` patch
+    mock_efd_patcher.stop()
+
+
+async def test_efd_timeseries_incremental(http_client):
+    """Test incremental timeseries queries only fetch the new tail."""
+    # Arrange
+    mock_efd_patcher = patch("lsst_efd_client.EfdClient")
+    mock_efd_client = mock_efd_patcher.start()
+    efd_client = MockEFDClient()
+    mock_efd_client.return_value = efd_client
+    request_data = {
+        "efd_instance": "summit_efd",
+        "start_date": "2020-03-06T21:52:00",
+        "time_window": 14,
+        "cscs": {"ATDome": {0: {"topic1": ["field1"]}}},
+        "resample": "1min",
+        "incremental": True,
+    }
+    moved_request_data = {**request_data, "start_date": "2020-03-06T21:52:30"}
+
+    # Act
+    with patch.object(
+        efd_client, "select_time_series", wraps=efd_client.select_time_series
+    ) as select_time_series:
+        await http_client.post("/efd/timeseries/", json=request_data)
+        response = await http_client.post("/efd/timeseries/", json=moved_request_data)
+        full_response = await http_client.post(
+            "/efd/timeseries/", json={**moved_request_data, "incremental": False}
+        )
+
+    # Assert
+    assert response.status == 200
+    assert await response.json() == await full_response.json()
+    first_start = select_time_series.call_args_list[0].args[2]
+    second_start = select_time_series.call_args_list[1].args[2]
+    assert first_start.isot == "2020-03-06T21:45:00.000"
+    # Only the end of the previous window and the new minute are queried
+    assert second_start.isot == "2020-03-06T21:58:55.000"
+    response = await http_client.get("/efd/stats/")
+    window_stats = (await response.json())["windows"]
+    assert window_stats["queries"] == {"full": 1, "partial": 1, "none": 0}
+    assert window_stats["entries"] == 1
+
+    # Stop `efd_client` patch
+    mock_efd_patcher.stop()
+
+
+async def test_efd_timeseries_incremental_matches_full(http_client):
+    """Test incremental windows are keyed by length and resampling, and
+    binned like the non-incremental ones."""
+    # Arrange
+    mock_efd_patcher = patch("lsst_efd_client.EfdClient")
+    mock_efd_client = mock_efd_patcher.start()
+    efd_client = MockEFDClient()
+    mock_efd_client.return_value = efd_client
+    request_data = {
+        "efd_instance": "summit_efd",
+        "start_date": "2020-03-06T21:52:00",
+        "time_window": 14,
+        "cscs": {"ATDome": {0: {"topic1": ["field1"]}}},
+        "resample": "7min",
+        "incremental": True,
+    }
+    other_request_data = {**request_data, "time_window": 16, "resample": "1min"}
+
+    # Act
+    responses = []
+    for data in (request_data, other_request_data, request_data):
+        response = await http_client.post("/efd/timeseries/", json=data)
+        full_response = await http_client.post(
+            "/efd/timeseries/", json={**data, "incremental": False}
+        )
+        responses.append((await response.json(), await full_response.json()))
+
+    # Assert
+    for result, full_result in responses:
+        assert result == full_result
+    response = await http_client.get("/efd/stats/")
+    window_stats = (await response.json())["windows"]
+    assert window_stats["queries"] == {"full": 2, "partial": 1, "none": 0}
+    assert window_stats["entries"] == 2
+
+    # Stop `efd_client` patch
+    mock_efd_patcher.stop()
+
+
+async def test_efd_timeseries_columnar(http_client):
+    # Arrange
+    mock_efd_patcher = patch("lsst_efd_client.EfdClient")
+    mock_efd_client = mock_efd_patcher.start()
+    mock_efd_client.return_value = MockEFDClient()
+    request_data = {
+        "efd_instance": "summit_efd",
+        "start_date": "2020-03-16T12:00:00",
+        "time_window": 15,
+        "cscs": {"ATMCS": {1: {"topic2": ["field2", "field3"]}}},
+        "resample": "1min",
+        "format": "columnar",
+    }
+
+    # Act
+    response = await http_client.post("/efd/timeseries/", json=request_data)
+    points_response = await http_client.post(
+        "/efd/timeseries/", json={**request_data, "format": "points"}
+    )
+    invalid_response = await http_client.post(
+        "/efd/timeseries/", json={**request_data, "format": "csv"}
+    )
+
+    # Assert
+    assert response.status == 200
+    response_data = await response.json()
+    points = (await points_response.json())["ATMCS-1-topic2"]
+    columns = response_data["ATMCS-1-topic2"]
+    assert list(columns.keys()) == ["ts", "field2", "field3"]
+    assert columns["ts"] == [point["ts"] for point in points["field2"]]
+    for field in ["field2", "field3"]:
+        assert columns[field] == [point["value"] for point in points[field]]
+    assert None in columns["field2"]
+    assert invalid_response.status == 400
+
+    # Stop `efd_client` patch
+    mock_efd_patcher.stop()
+
+
+async def test_efd_timeseries_stream(http_client):
+    """Test sources are streamed as soon as their query completes."""
+    # Arrange
+    mock_efd_patcher = patch("lsst_efd_client.EfdClient")
+    mock_efd_client = mock_efd_patcher.start()
+    efd_client = MockEFDClient()
+    mock_efd_client.return_value = efd_client
+    select_time_series = efd_client.select_time_series
+
+    async def slow_select_time_series(topic_name, *args, **kwargs):
+        if topic_name == "lsst.sal.ATDome.topic1":
+            await asyncio.sleep(0.2)
+        return await select_time_series(topic_name, *args, **kwargs)
+
+    efd_client.select_time_series = slow_select_time_series
+    cscs = {
+        "ATDome": {0: {"topic1": ["field1"]}},
+        "ATMCS": {1: {"topic2": ["field2", "field3"]}},
+    }
+    request_data = {
+        "efd_instance": "summit_efd",
+        "start_date": "2020-03-16T12:00:00",
+        "time_window": 15,
+        "cscs": cscs,
+        "resample": "1min",
+    }
+
+    # Act
+    response = await http_client.post(
+        "/efd/timeseries/", json={**request_data, "stream": True}
+    )
+    lines = [json.loads(line) async for line in response.content]
+    full_response = await http_client.post("/efd/timeseries/", json=request_data)
+
+    # Assert
+    assert response.status == 200
+    assert response.headers["Content-Type"] == "application/x-ndjson"
+    assert [line["source"] for line in lines] == ["ATMCS-1-topic2", "ATDome-0-topic1"]
+    full_data = await full_response.json()
+    for line in lines:
+        assert line["data"] == full_data[line["source"]]
+
+    # Stop `efd_client` patch
+    mock_efd_patcher.stop()
+
+
+async def test_efd_timeseries_arrow(http_client):
+    """Test timeseries are returned as one Arrow stream per source."""
+    # Arrange
+    pa = pytest.importorskip("pyarrow")
+    mock_efd_patcher = patch("lsst_efd_client.EfdClient")
+    mock_efd_client = mock_efd_patcher.start()
+    mock_efd_client.return_value = MockEFDClient()
+    request_data = {
+        "efd_instance": "summit_efd",
+        "start_date": "2020-03-16T12:00:00",
+        "time_window": 15,
+        "cscs": {
+            "ATDome": {0: {"topic1": ["field1"]}},
+            "ATMCS": {1: {"topic2": ["field2", "field3"]}},
+        },
+        "resample": "1min",
+    }
+
+    # Act
+    response = await http_client.post(
+        "/efd/timeseries/",
+        json=request_data,
+        headers={"Accept": "application/vnd.apache.arrow.stream"},
+    )
+    body = pa.BufferReader(await response.read())
+    tables = {}
+    while body.tell() < body.size():
+        table = pa.ipc.open_stream(body).read_all()
+        tables[table.schema.metadata[b"source"].decode()] = table.to_pandas()
+
+    # Assert
+    assert response.status == 200
+    assert response.headers["Content-Type"] == "application/vnd.apache.arrow.stream"
+    assert set(tables) == {"ATDome-0-topic1", "ATMCS-1-topic2"}
+    assert list(tables["ATMCS-1-topic2"].columns) == ["field2", "field3"]
+    assert tables["ATDome-0-topic1"]["field1"].isna().sum() == 3
+
+    # Stop `efd_client` patch
+    mock_efd_patcher.stop()
+
+
+async def test_efd_binary_without_pyarrow(http_client, monkeypatch):
+    # Arrange
+    monkeypatch.setattr("love.commander.efd.ARROW_AVAILABLE", False)
+    request_data = {
+        "efd_instance": "summit_efd",
+        "start_date": "2020-03-16T12:00:00",
+        "time_window": 15,
+        "cscs": {"ATDome": {0: {"topic1": ["field1"]}}},
+        "resample": "1min",
+    }
+
+    # Act
+    response = await http_client.post(
+        "/efd/timeseries/",
+        json=request_data,
+        headers={"Accept": "application/vnd.apache.parquet"},
+    )
+
+    # Assert
+    assert response.status == 406
+
+
+async def test_efd_timeseries_max_points(http_client):
+    # Arrange
+    mock_efd_patcher = patch("lsst_efd_client.EfdClient")
+    mock_efd_client = mock_efd_patcher.start()
+    mock_efd_client.return_value = MockEFDClient()
+    request_data = {
+        "efd_instance": "summit_efd",
+        "start_date": "2020-03-16T12:00:00",
+        "time_window": 15,
+        "cscs": {"ATDome": {0: {"topic1": ["field1"]}}},
+        "max_points": 3,
+    }
+
+    # Act
+    response = await http_client.post("/efd/timeseries/", json=request_data)
+    invalid_response = await http_client.post(
+        "/efd/timeseries/", json={**request_data, "max_points": 2}
+    )
+
+    # Assert
+    assert response.status == 200
+    response_data = await response.json()
+    # Raw points are returned instead of resampled bins
+    assert response_data["ATDome-0-topic1"]["field1"] == [
+        {"ts": "2020-03-06 21:49:41", "value": 0.21},
+        {"ts": "2020-03-06 21:50:41", "value": 0.21},
+        {"ts": "2020-03-06 21:56:41", "value": 0.21},
+    ]
+    assert invalid_response.status == 400
+
+    # Stop `efd_client` patch
+    mock_efd_patcher.stop()
+
+
+async def test_efd_timeseries_max_points_per_field(http_client):
+    # Arrange
+    mock_efd_patcher = patch("lsst_efd_client.EfdClient")
+    mock_efd_client = mock_efd_patcher.start()
+    efd_client = MockEFDClient()
+    mock_efd_client.return_value = efd_client
+    index = pd.date_range("2020-03-16 11:55", periods=600, freq="1s")
+
+    async def select_time_series(topic_name, fields, *args, **kwargs):
+        return pd.DataFrame(
+            {
+                field: [(i * (n + 7)) % 101 for i in range(600)]
+                for n, field in enumerate(fields)
+            },
+            index=index,
+            dtype=float,
+        )
+
+    efd_client.select_time_series = select_time_series
+    fields = [f"field{i}" for i in range(10)]
+    request_data = {
+        "efd_instance": "summit_efd",
+        "start_date": "2020-03-16T12:00:00",
+        "time_window": 15,
+        "cscs": {"ATDome": {0: {"topic1": fields}}},
+        "max_points": 20,
+    }
+
+    # Act
+    response = await http_client.post("/efd/timeseries/", json=request_data)
+    columnar_response = await http_client.post(
+        "/efd/timeseries/", json={**request_data, "format": "columnar"}
+    )
+
+    # Assert
+    points = (await response.json())["ATDome-0-topic1"]
+    columns = (await columnar_response.json())["ATDome-0-topic1"]
+    for field in fields:
+        assert 0 < len(points[field]) <= 20
+        assert None not in [point["value"] for point in points[field]]
+        assert columns[field]["ts"] == [point["ts"] for point in points[field]]
+        assert columns[field]["value"] == [point["value"] for point in points[field]]
+
+    # Stop `efd_client` patch
+    mock_efd_patcher.stop()
+
+
+async def test_efd_timeseries_bounded_concurrency(http_client):
+    """Test topics are queried with bounded concurrency and failed queries
+    do not fail the whole request."""
+    # Arrange
+    mock_efd_patcher = patch("lsst_efd_client.EfdClient")
+    mock_efd_client = mock_efd_patcher.start()
+    efd_client = MockEFDClient()
+    mock_efd_client.return_value = efd_client
+    select_time_series = efd_client.select_time_series
+    running = 0
+    max_running = 0
+
+    async def slow_select_time_series(topic_name, *args, **kwargs):
+        nonlocal running, max_running
+        running += 1
+        max_running = max(max_running, running)
+        await asyncio.sleep(0.05)
+        running -= 1
+        if topic_name == "lsst.sal.ATDome.topic0":
+            raise ConnectionError("Query failed")
+        return await select_time_series(topic_name, *args, **kwargs)
+
+    efd_client.select_time_series = slow_select_time_series
+    request_data = {
+        "efd_instance": "summit_efd",
+        "start_date": "2020-03-16T12:00:00",
+        "time_window": 15,
+        "cscs": {"ATDome": {0: {f"topic{i}": ["field1"] for i in range(6)}}},
+        "resample": "1min",
+        "max_concurrency": 2,
+    }
+
+    # Act
+    response = await http_client.post("/efd/timeseries/", json=request_data)
+
+    # Assert
+    assert response.status == 200
+    assert max_running == 2
+    response_data = await response.json()
+    assert response_data["ATDome-0-topic0"] == {"error": "Query failed"}
+    for i in range(1, 6):
+        assert len(response_data[f"ATDome-0-topic{i}"]["field1"]) > 0
+    response = await http_client.get("/efd/stats/")
+    query_stats = (await response.json())["queries"]
+    assert query_stats["running"] == 0
+    assert query_stats["waiting"] == 0
+    assert query_stats["failed"] == 1
+
+    # Stop `efd_client` patch
+    mock_efd_patcher.stop()
+
+
+async def test_efd_cached_results_do_not_wait_for_query_slots(
+    aiohttp_client, monkeypatch
+):
+    """Test only the requests sent to InfluxDB wait for a query slot."""
+    # Arrange
+    monkeypatch.setenv("EFD_MAX_QUERIES", "1")
+    mock_efd_patcher = patch("lsst_efd_client.EfdClient")
+    mock_efd_client = mock_efd_patcher.start()
+    efd_client = MockEFDClient()
+    mock_efd_client.return_value = efd_client
+    select_time_series = efd_client.select_time_series
+    release = asyncio.Event()
+
+    async def blocking_select_time_series(topic_name, *args, **kwargs):
+        if topic_name == "lsst.sal.ATDome.slow_topic":
+            await release.wait()
+        return await select_time_series(topic_name, *args, **kwargs)
+
+    efd_client.select_time_series = blocking_select_time_series
+    client = await aiohttp_client(create_efd_app())
+    request_data = {
+        "efd_instance": "summit_efd",
+        "start_date": "2020-03-16T12:00:00",
+        "time_window": 15,
+        "cscs": {"ATDome": {0: {"topic1": ["field1"]}}},
+        "resample": "1min",
+    }
+    slow_request_data = {
+        **request_data,
+        "cscs": {"ATDome": {0: {"slow_topic": ["field1"]}}},
+    }
+    await client.post("/timeseries/", json=request_data)
+
+    # Act
+    slow_request = asyncio.create_task(
+        client.post("/timeseries/", json=slow_request_data)
+    )
+    await asyncio.sleep(0.1)
+    cached_response = await asyncio.wait_for(
+        client.post("/timeseries/", json=request_data), 1
+    )
+    response = await client.get("/stats/")
+    query_stats = (await response.json())["queries"]
+    release.set()
+    slow_response = await slow_request
+
+    # Assert
+    assert cached_response.status == 200
+    assert len((await cached_response.json())["ATDome-0-topic1"]["field1"]) > 0
+    # The slow query holds the only slot
+    assert query_stats["running"] == 1
+    assert slow_response.status == 200
+
+    # Stop `efd_client` patch
+    mock_efd_patcher.stop()
+
+
+async def test_efd_identical_queries_are_shared(http_client):
+    """Test identical concurrent requests share one EFD query."""
+    # Arrange
+    mock_efd_patcher = patch("lsst_efd_client.EfdClient")
+    mock_efd_client = mock_efd_patcher.start()
+    efd_client = MockEFDClient()
+    mock_efd_client.return_value = efd_client
+    select_top_n = efd_client.select_top_n
+    calls = 0
+
+    async def slow_select_top_n(*args, **kwargs):
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.2)
+        return await select_top_n(*args, **kwargs)
+
+    efd_client.select_top_n = slow_select_top_n
+    request_data = {
+        "efd_instance": "summit_efd",
+        "cscs": {"ATDome": {0: {"topic1": ["field1"]}}},
+        "num": 3,
+    }
+
+    # Act
+    responses = await asyncio.gather(
+        *[http_client.post("/efd/top_timeseries/", json=request_data) for _ in range(5)]
+    )
+
+    # Assert
+    assert calls == 1
+    results = [await response.json() for response in responses]
+    assert all(result == results[0] for result in results)
+    assert len(results[0]["ATDome-0-topic1"]["field1"]) == 3
+    response = await http_client.get("/efd/stats/")
+    sharing_stats = (await response.json())["sharing"]
+    assert sharing_stats["requests"] == 5
+    assert sharing_stats["queries"] == 1
+    assert sharing_stats["fan_in"] == 5
+    assert sharing_stats["in_flight"] == 0
+
+    # Stop `efd_client` patch
+    mock_efd_patcher.stop()
+
+
+async def test_efd_logmessages_merged(http_client):
+    # Arrange
+    mock_efd_patcher = patch("lsst_efd_client.EfdClient")
+    mock_efd_client = mock_efd_patcher.start()
+    efd_client = MockEFDClient()
+    mock_efd_client.return_value = efd_client
+    select_time_series = efd_client.select_time_series
+    frames = {}
+
+    async def fixed_select_time_series(topic_name, *args, **kwargs):
+        # Keep the same private_rcvStamp values in every request
+        if topic_name not in frames:
+            frames[topic_name] = await select_time_series(topic_name, *args, **kwargs)
+        return frames[topic_name]
+
+    efd_client.select_time_series = fixed_select_time_series
+    request_data = {
+        "efd_instance": "summit_efd",
+        "start_date": "2020-03-16T12:00:00",
+        "end_date": "2020-03-17T12:00:00",
+        "cscs": {
+            "ATDome": {0: {"logevent_logMessage": ["message"]}},
+            "ATMCS": {1: {"logevent_logMessage": ["message"]}},
+        },
+        "scale": "utc",
+        "merge": True,
+        "limit": 10,
+    }
+
+    # Act
+    first_response = await http_client.post("/efd/logmessages/", json=request_data)
+    first_page = await first_response.json()
+    second_response = await http_client.post(
+        "/efd/logmessages/",
+        json={**request_data, "cursor": first_page["next_cursor"]},
+    )
+    second_page = await second_response.json()
+
+    # Assert
+    assert first_response.status == 200
+    assert len(first_page["messages"]) == 10
+    assert first_page["errors"] == {}
+    assert isinstance(first_page["next_cursor"], str)
+    messages = first_page["messages"] + second_page["messages"]
+    assert second_page["next_cursor"] is None
+    # Both sources have messages at the same times, newest first and then
+    # by source
+    assert [m["source"] for m in messages] == [
+        "ATMCS-1-logevent_logMessage",
+        "ATDome-0-logevent_logMessage",
+    ] * 8
+    for csc, index in [("ATDome", 0), ("ATMCS", 1)]:
+        source = f"{csc}-{index}-logevent_logMessage"
+        stamps = [m["private_rcvStamp"] for m in messages if m["source"] == source]
+        frame = frames[f"lsst.sal.{csc}.logevent_logMessage"]
+        assert stamps == frame["private_rcvStamp"].tolist()[::-1]
+
+    # Stop `efd_client` patch
+    mock_efd_patcher.stop()
+
+
+class MockInfluxClient:
+    def __init__(self):
+        self.queries = []
+
+    async def query(self, query):
+        self.queries.append(query)
+        index = pd.date_range("2020-03-16 12:00", periods=2, freq="1min", tz="UTC")
+        return pd.DataFrame(
+            {"message": ["Newer", "Older"], "private_rcvStamp": [2.0, 1.0]},
+            index=index[::-1],
+        )
+
+
+async def test_efd_logmessages_pages(http_client):
+    """Test log message pages are queried with the page size."""
+    # Arrange
+    mock_efd_patcher = patch("lsst_efd_client.EfdClient")
+    mock_efd_client = mock_efd_patcher.start()
+    efd_client = MockEFDClient()
+    efd_client.db_name = "efd"
+    efd_client.influx_client = MockInfluxClient()
+    mock_efd_client.return_value = efd_client
+    request_data = {
+        "efd_instance": "summit_efd",
+        "start_date": "2020-03-16T12:00:00",
+        "end_date": "2020-03-17T12:00:00",
+        "cscs": {
+            "ATDome": {0: {"logevent_logMessage": ["message"]}},
+            "ATMCS": {1: {"logevent_logMessage": ["message"]}},
+        },
+        "scale": "utc",
+        "page_size": 3,
+    }
+
+    # Act
+    response = await http_client.post("/efd/logmessages/", json=request_data)
+    page = await response.json()
+    await http_client.post(
+        "/efd/logmessages/", json={**request_data, "cursor": page["next_cursor"]}
+    )
+
+    # Assert
+    assert response.status == 200
+    queries = efd_client.influx_client.queries
+    assert len(queries) == 4
+    assert all(query.endswith("ORDER BY time DESC LIMIT 3") for query in queries[:3])
+    assert "salIndex = 1" in queries[1]
+    # The cursor is the oldest message of ATMCS, ATDome messages at the same
+    # time come after it
+    assert "time <= 1584360000000000000" in queries[2]
+    # The ATMCS message at that time is queried again and skipped
+    assert queries[3].endswith("time <= 1584360000000000000 ORDER BY time DESC LIMIT 4")
+    assert [(m["source"], m["message"]) for m in page["messages"]] == [
+        ("ATMCS-1-logevent_logMessage", "Newer"),
+        ("ATDome-0-logevent_logMessage", "Newer"),
+        ("ATMCS-1-logevent_logMessage", "Older"),
+    ]
+    assert page["next_cursor"] is not None
+
+    # Stop `efd_client` patch
+    mock_efd_patcher.stop()
+
+
+async def test_efd_top_timeseries_live(aiohttp_client, monkeypatch):
+    """Test live subscriptions to a topic share one poller and only receive
+    changed values."""
+    # Arrange
+    monkeypatch.setenv("EFD_LIVE_MIN_INTERVAL", "0.05")
+    monkeypatch.setenv("EFD_LIVE_MAX_INTERVAL", "0.2")
+    mock_efd_patcher = patch("lsst_efd_client.EfdClient")
+    mock_efd_client = mock_efd_patcher.start()
+    efd_client = MockEFDClient()
+    mock_efd_client.return_value = efd_client
+    value = 0.21
+    calls = 0
+
+    async def select_top_n(topic_name, fields, num, *args, **kwargs):
+        nonlocal calls
+        calls += 1
+        return pd.DataFrame(
+            {field: [value] for field in fields},
+            index=[pd.Timestamp("2020-03-06 21:49:41")],
+        )
+
+    efd_client.select_top_n = select_top_n
+    client = await aiohttp_client(create_efd_app())
+    subscription = {
+        "efd_instance": "summit_efd",
+        "cscs": {"ATDome": {0: {"topic1": ["field1"]}}},
+    }
+
+    # Act
+    ws1 = await client.ws_connect("/top_timeseries/live/")
+    ws2 = await client.ws_connect("/top_timeseries/live/")
+    await ws1.send_json(subscription)
+    await ws2.send_json(subscription)
+    first = [await ws.receive_json(timeout=1) for ws in (ws1, ws2)]
+    await asyncio.sleep(0.3)
+    value = 0.42
+    second = [await ws.receive_json(timeout=1) for ws in (ws1, ws2)]
+    response = await client.get("/stats/")
+    live_stats = (await response.json())["live"]
+    await ws1.send_json({**subscription, "action": "unsubscribe"})
+    await ws2.close()
+    await asyncio.sleep(0.1)
+    response = await client.get("/stats/")
+    closed_stats = (await response.json())["live"]
+
+    # Assert
+    for message in first:
+        assert message["type"] == "data"
+        assert message["source"] == "ATDome-0-topic1"
+        assert message["data"]["field1"][0]["value"] == 0.21
+    for message in second:
+        assert message["data"]["field1"][0]["value"] == 0.42
+    assert live_stats["pollers"] == 1
+    assert live_stats["subscriptions"] == 2
+    assert live_stats["pushes"] == 2
+    # One query per poll, whatever the number of subscribers
+    assert calls >= live_stats["polls"] > 2
+    assert closed_stats["pollers"] == 0
+
+    await ws1.close()
+    # Stop `efd_client` patch
+    mock_efd_patcher.stop()
+
+
+async def test_efd_timeseries_aggregations(http_client):
+    # Arrange
+    mock_efd_patcher = patch("lsst_efd_client.EfdClient")
+    mock_efd_client = mock_efd_patcher.start()
+    mock_efd_client.return_value = MockEFDClient()
+    request_data = {
+        "efd_instance": "summit_efd",
+        "start_date": "2020-03-16T12:00:00",
+        "time_window": 15,
+        "cscs": {"ATMCS": {1: {"topic2": ["field2", "field3"]}}},
+        "resample": "1min",
+        "aggregations": ["min", "max", "count"],
+        "format": "columnar",
+    }
+
+    # Act
+    response = await http_client.post("/efd/timeseries/", json=request_data)
+    incremental_response = await http_client.post(
+        "/efd/timeseries/", json={**request_data, "incremental": True}
+    )
+    invalid_response = await http_client.post(
+        "/efd/timeseries/", json={**request_data, "aggregations": ["mode"]}
+    )
+    raw_response = await http_client.post(
+        "/efd/timeseries/", json={**request_data, "max_points": 10}
+    )
+
+    # Assert
+    assert response.status == 200
+    columns = (await response.json())["ATMCS-1-topic2"]
+    assert list(columns.keys()) == [
+        "ts",
+        "field2:min",
+        "field2:max",
+        "field2:count",
+        "field3:min",
+        "field3:max",
+        "field3:count",
+    ]
+    assert columns["field2:count"] == [1, 1, 1, 0, 0, 0, 1, 1]
+    assert columns["field2:min"] == [0.21, 0.21, 0.21, None, None, None, 0.21, 0.21]
+    # The mock data is outside of the window, the fields are aggregated anyway
+    incremental_columns = (await incremental_response.json())["ATMCS-1-topic2"]
+    assert list(incremental_columns.keys()) == list(columns.keys())
+    assert invalid_response.status == 400
+    assert raw_response.status == 400
+
+    # Stop `efd_client` patch
+    mock_efd_patcher.stop()
+
+
+class MockBatchInfluxClient:
+    def __init__(self):
+        self.queries = []
+
+    async def query(self, query):
+        self.queries.append(query)
+        index = pd.date_range("2020-03-16 11:55", periods=3, freq="1min", tz="UTC")
+        results = [
+            {"topic": pd.DataFrame({"field1": [1.0, 2.0, 3.0]}, index=index)}
+            for _ in query.split(";")
+        ]
+        return results if len(results) > 1 else results[0]["topic"]
+
+
+class MockBatchEFDClient(MockEFDClient):
+    db_name = "efd"
+    build_time_range_query = lsst_efd_client.EfdClient.build_time_range_query
+
+    def __init__(self):
+        self.influx_client = MockBatchInfluxClient()
+
+
+async def test_efd_timeseries_batches(http_client):
+    """Test the topics of a request are sent in one InfluxDB request per
+    group, whatever the number of query slots of the request."""
+    # Arrange
+    mock_efd_patcher = patch("lsst_efd_client.EfdClient")
+    mock_efd_client = mock_efd_patcher.start()
+    efd_client = MockBatchEFDClient()
+    mock_efd_client.return_value = efd_client
+    request_data = {
+        "efd_instance": "summit_efd",
+        "start_date": "2020-03-16T12:00:00",
+        "time_window": 15,
+        "cscs": {
+            "ATDome": {0: {f"topic{i}": ["field1"] for i in range(30)}},
+            "ATMCS": {1: {f"topic{i}": ["field1"] for i in range(20)}},
+        },
+        "resample": "1min",
+        "max_concurrency": 2,
+    }
+
+    # Act
+    response = await http_client.post("/efd/timeseries/", json=request_data)
+
+    # Assert
+    assert response.status == 200
+    response_data = await response.json()
+    assert len(response_data) == 50
+    assert all(len(data["field1"]) == 3 for data in response_data.values())
+    # One request per SAL index
+    queries = efd_client.influx_client.queries
+    assert sorted(query.count("SELECT") for query in queries) == [20, 30]
+    response = await http_client.get("/efd/stats/")
+    stats = await response.json()
+    assert stats["batches"]["statements"] == 50
+    assert stats["batches"]["requests"] == 2
+    assert stats["queries"]["running"] == 0
+
+    # Stop `efd_client` patch
+    mock_efd_patcher.stop()
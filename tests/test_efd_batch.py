@@ -0,0 +1,200 @@
+# This file is part of LOVE-commander.
+#
+# Copyright (c) 2023 Inria Chile.
+#
+# Developed by Inria Chile.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or at
+# your option any later version.
+#
+# This program is distributed in the hope that it will be useful,but
+# WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+# or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License
+# for more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program. If not, see <http://www.gnu.org/licenses/>.
+
+import asyncio
+
+import lsst_efd_client
+import pandas as pd
+import pytest
+from astropy.time import Time, TimeDelta
+from love.commander.efd_batch import QueryBatcher
+
+
+class MockInfluxClient:
+    def __init__(self):
+        self.queries = []
+
+    async def query(self, query):
+        self.queries.append(query)
+        results = []
+        for statement in query.split(";"):
+            if "bad_topic" in statement:
+                raise RuntimeError("Unknown topic")
+            topic = statement.split('"autogen".')[1].split()[0].strip('"')
+            index = pd.date_range("2020-03-16 12:00", periods=2, freq="1s", tz="UTC")
+            frame = pd.DataFrame({"topic": [topic, topic]}, index=index)
+            results.append({topic: frame})
+        return results if len(results) > 1 else results[0][topic]
+
+
+class MockEFDClient:
+    db_name = "efd"
+    build_time_range_query = lsst_efd_client.EfdClient.build_time_range_query
+
+    def __init__(self):
+        self.influx_client = MockInfluxClient()
+
+
+async def test_queries_are_batched():
+    # Arrange
+    batcher = QueryBatcher()
+    efd_client = MockEFDClient()
+    start = Time("2020-03-16T12:00:00", scale="utc")
+    time_delta = TimeDelta(60, format="sec")
+    topics = [f"lsst.sal.ATDome.topic{i}" for i in range(3)]
+
+    # Act
+    results = await asyncio.gather(
+        *[
+            batcher.select_time_series(
+                efd_client,
+                ("timeseries", start.isot, 60, 0),
+                topic,
+                ["field1"],
+                start,
+                time_delta,
+                is_window=True,
+                index=0,
+            )
+            for topic in topics
+        ]
+    )
+
+    # Assert
+    assert len(efd_client.influx_client.queries) == 1
+    assert efd_client.influx_client.queries[0].count("SELECT") == 3
+    assert [result["topic"].iloc[0] for result in results] == topics
+    assert batcher.stats()["statements"] == 3
+    assert batcher.stats()["requests"] == 1
+
+
+async def test_failed_batch_is_sent_one_by_one():
+    # Arrange
+    batcher = QueryBatcher()
+    efd_client = MockEFDClient()
+    topics = ["lsst.sal.ATDome.topic1", "lsst.sal.ATDome.bad_topic"]
+
+    # Act
+    results = await asyncio.gather(
+        *[
+            batcher.select_top_n(
+                efd_client,
+                ("top_timeseries", 1, None, 1),
+                topic,
+                ["field1"],
+                1,
+                index=1,
+            )
+            for topic in topics
+        ],
+        return_exceptions=True,
+    )
+
+    # Assert
+    assert results[0]["topic"].iloc[0] == "lsst.sal.ATDome.topic1"
+    assert isinstance(results[1], RuntimeError)
+    assert efd_client.influx_client.queries[0] == (
+        'SELECT field1 FROM "efd"."autogen"."lsst.sal.ATDome.topic1" '
+        "WHERE salIndex = 1 GROUP BY * ORDER BY DESC LIMIT 1;"
+        'SELECT field1 FROM "efd"."autogen"."lsst.sal.ATDome.bad_topic" '
+        "WHERE salIndex = 1 GROUP BY * ORDER BY DESC LIMIT 1"
+    )
+    assert batcher.stats()["fallbacks"] == 1
+    assert batcher.stats()["requests"] == 3
+
+
+async def test_clients_without_influx_client_are_queried_directly():
+    # Arrange
+    batcher = QueryBatcher()
+
+    class DirectEFDClient:
+        async def select_top_n(self, topic, fields, num, time_cut=None, index=None):
+            return pd.DataFrame({"field1": [1]})
+
+    # Act
+    result = await batcher.select_top_n(
+        DirectEFDClient(), ("top_timeseries", 1, None, 0), "topic", ["field1"], 1
+    )
+
+    # Assert
+    assert result["field1"].iloc[0] == 1
+    assert batcher.stats()["requests"] == 0
+
+
+async def test_batches_hold_one_query_slot():
+    # Arrange
+    batcher = QueryBatcher()
+    efd_client = MockEFDClient()
+    slots = asyncio.Semaphore(2)
+    limited = 0
+
+    async def limit(query):
+        nonlocal limited
+        async with slots:
+            limited += 1
+            return await query
+
+    # Act
+    results = await asyncio.gather(
+        *[
+            batcher.select_top_n(
+                efd_client,
+                ("top_timeseries", 1, None, 0),
+                f"lsst.sal.ATDome.topic{i}",
+                ["field1"],
+                1,
+                limit=limit,
+            )
+            for i in range(10)
+        ]
+    )
+
+    # Assert
+    assert len(results) == 10
+    assert limited == 1
+    assert len(efd_client.influx_client.queries) == 1
+
+
+async def test_close_cancels_running_batches():
+    # Arrange
+    batcher = QueryBatcher()
+    efd_client = MockEFDClient()
+    started = asyncio.Event()
+
+    async def hanging_query(query):
+        started.set()
+        await asyncio.Event().wait()
+
+    efd_client.influx_client.query = hanging_query
+    query = asyncio.create_task(
+        batcher.select_top_n(
+            efd_client, ("top_timeseries", 1, None, 0), "topic", ["field1"], 1
+        )
+    )
+    await started.wait()
+    running = len(batcher.tasks)
+
+    # Act
+    await batcher.close()
+
+    # Assert
+    assert running == 1
+    assert batcher.tasks == set()
+    with pytest.raises(asyncio.CancelledError):
+        await query
@@ -0,0 +1,115 @@
+# This file is part of LOVE-commander.
+#
+# Copyright (c) 2023 Inria Chile.
+#
+# Developed by Inria Chile.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or at
+# your option any later version.
+#
+# This program is distributed in the hope that it will be useful,but
+# WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+# or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License
+# for more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program. If not, see <http://www.gnu.org/licenses/>.
+
+import time
+from unittest.mock import patch
+
+import numpy as np
+import pandas as pd
+from love.commander.efd_cache import QueryCache, TimeSeriesWindow, resample_frame
+
+
+def test_cache_evicts_least_recently_used_by_size():
+    # Arrange
+    cache = QueryCache(max_bytes=100)
+    cache.put("a", "result a", 40)
+    cache.put("b", "result b", 40)
+
+    # Act
+    # Use "a" so "b" becomes the least recently used result
+    cache.get("a")
+    cache.put("c", "result c", 40)
+    cache.put("too big", "result", 200)
+
+    # Assert
+    assert cache.get("a") == "result a"
+    assert cache.get("b") is None
+    assert cache.get("c") == "result c"
+    assert cache.get("too big") is None
+    stats = cache.stats()
+    assert stats["bytes"] == 80
+    assert stats["entries"] == 2
+    assert stats["evictions"] == 1
+    assert stats["hits"] == 3
+    assert stats["misses"] == 2
+
+
+def test_cache_ttl_depends_on_window_end():
+    # Arrange
+    cache = QueryCache(min_ttl=5, max_ttl=3600, ttl_factor=0.1)
+    now = time.time()
+
+    # Act
+    cache.put("live", "result", 10)
+    cache.put("past", "result", 10, end=now - 600)
+    cache.entries["live"]["expires"] = time.monotonic()
+
+    # Assert
+    assert cache.ttl() == 5
+    assert cache.ttl(now + 60) == 5
+    assert 59 <= cache.ttl(now - 600) <= 61
+    assert cache.ttl(now - 10**6) == 3600
+    assert cache.get("live") is None
+    assert cache.get("past") == "result"
+    assert cache.stats()["expirations"] == 1
+
+
+def test_time_series_window_only_resamples_changes():
+    # Arrange
+    index = pd.date_range("2024-01-01 00:00", periods=600, freq="1s", tz="UTC")
+    data = pd.DataFrame({"value": np.arange(600, dtype=float)}, index=index)
+    start = index[0]
+    end = index[299]
+    empty = pd.DataFrame()
+    window = TimeSeriesWindow(empty, start, start, None, empty).update(
+        start, end, "1min", tail=data[start:end], fetch_start=start, fetched=end
+    )
+
+    # Act
+    new_start = start + pd.Timedelta(seconds=90)
+    new_end = end + pd.Timedelta(seconds=120)
+    fetch_start, fetch_end = window.missing_interval(new_start, new_end, lag=5)
+    with patch(
+        "love.commander.efd_cache.resample_frame", wraps=resample_frame
+    ) as resample:
+        new_window = window.update(
+            new_start,
+            new_end,
+            "1min",
+            tail=data[fetch_start:fetch_end],
+            fetch_start=fetch_start,
+            fetched=new_end,
+        )
+
+    # Assert
+    assert fetch_start == end - pd.Timedelta(seconds=5)
+    assert fetch_end == new_end
+    # Only the first bin and the bins from the new data on were resampled
+    resampled_rows = sum(len(call.args[0]) for call in resample.call_args_list)
+    assert resampled_rows == 30 + 180
+    pd.testing.assert_frame_equal(
+        new_window.resampled,
+        resample_frame(data[new_start:new_end], "1min"),
+        check_freq=False,
+    )
+    assert window.missing_interval(start + pd.Timedelta(seconds=10), end, lag=5) == (
+        end - pd.Timedelta(seconds=5),
+        end,
+    )
+    assert window.missing_interval(start, start + pd.Timedelta(seconds=100)) is None
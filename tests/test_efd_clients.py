@@ -0,0 +1,159 @@
+# This file is part of LOVE-commander.
+#
+# Copyright (c) 2023 Inria Chile.
+#
+# Developed by Inria Chile.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or at
+# your option any later version.
+#
+# This program is distributed in the hope that it will be useful,but
+# WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+# or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License
+# for more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program. If not, see <http://www.gnu.org/licenses/>.
+
+import asyncio
+import time
+from unittest.mock import patch
+
+from love.commander.efd_clients import EfdClientManager
+
+
+class MockEFDClient:
+    built = 0
+
+    def __init__(self, instance):
+        MockEFDClient.built += 1
+        # Building the client makes a blocking request
+        time.sleep(0.2)
+        self.instance = instance
+        self.closed = False
+
+    async def close(self):
+        self.closed = True
+
+
+async def test_connection_does_not_block_the_loop():
+    # Arrange
+    MockEFDClient.built = 0
+    manager = EfdClientManager()
+    ticks = 0
+
+    async def tick():
+        nonlocal ticks
+        while True:
+            ticks += 1
+            await asyncio.sleep(0.01)
+
+    # Act
+    with patch("lsst_efd_client.EfdClient", new=MockEFDClient):
+        ticker = asyncio.create_task(tick())
+        clients = await asyncio.gather(*[manager.get("summit_efd") for _ in range(5)])
+        ticker.cancel()
+
+    # Assert
+    assert ticks > 5
+    assert MockEFDClient.built == 1
+    assert all(client is clients[0] for client in clients)
+    assert await manager.get("summit_efd") is clients[0]
+
+    await manager.close()
+    assert clients[0].closed
+
+
+async def test_connection_timeout_and_failure_expiry():
+    # Arrange
+    MockEFDClient.built = 0
+    manager = EfdClientManager(timeout=0.05, retries=1, backoff=0.01, failure_ttl=0.5)
+
+    # Act
+    with patch("lsst_efd_client.EfdClient", new=MockEFDClient):
+        client = await manager.get("summit_efd")
+        cached_failure = await manager.get("summit_efd")
+
+        # Assert
+        # Both attempts timed out, then the failure is remembered
+        assert client is None
+        assert cached_failure is None
+        assert MockEFDClient.built == 2
+        assert manager.failures["summit_efd"]["error"] == "Timed out after 0.05 s"
+
+        await asyncio.sleep(0.5)
+        manager.timeout = 1
+        client = await manager.get("summit_efd")
+
+    assert client is not None
+    assert "summit_efd" not in manager.failures
+
+    await manager.close()
+
+
+class MockInfluxClient:
+    def __init__(self):
+        self.session_options = None
+
+    async def create_session(self, **kwargs):
+        self.session_options = kwargs
+
+    async def ping(self):
+        return {}
+
+    async def close(self):
+        pass
+
+
+class MockPooledEFDClient:
+    def __init__(self, instance):
+        self.influx_client = MockInfluxClient()
+
+
+async def test_shared_manager_is_closed_by_last_application():
+    # Arrange
+    manager = EfdClientManager()
+    manager.retain()
+    manager.retain()
+    with patch("lsst_efd_client.EfdClient", new=MockEFDClient):
+        client = await manager.get("summit_efd")
+
+    # Act
+    await manager.release()
+    still_open = not client.closed
+    await manager.release()
+
+    # Assert
+    assert still_open
+    assert client.closed
+    assert manager.clients == {}
+
+
+async def test_connection_pool_and_health():
+    # Arrange
+    manager = EfdClientManager(pool_size=4, pool_size_per_host=2, failure_ttl=10)
+
+    # Act
+    with patch("lsst_efd_client.EfdClient", new=MockPooledEFDClient):
+        client = await manager.get("summit_efd")
+    with patch("lsst_efd_client.EfdClient", side_effect=ConnectionError):
+        manager.backoff = 0
+        await manager.get("base_efd")
+    health = await manager.health()
+
+    # Assert
+    connector = client.influx_client.session_options["connector"]
+    assert connector.limit == 4
+    assert connector.limit_per_host == 2
+    assert health["summit_efd"]["state"] == "connected"
+    assert health["summit_efd"]["attempts"] == 1
+    assert health["summit_efd"]["ping"]["ok"]
+    assert health["base_efd"]["state"] == "failed"
+    assert health["base_efd"]["attempts"] == 3
+    assert 0 < health["base_efd"]["retry_in"] <= 10
+    assert health["base_efd"]["ping"] is None
+
+    await connector.close()
+    await manager.close()
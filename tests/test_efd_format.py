@@ -0,0 +1,119 @@
+# This file is part of LOVE-commander.
+#
+# Copyright (c) 2023 Inria Chile.
+#
+# Developed by Inria Chile.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or at
+# your option any later version.
+#
+# This program is distributed in the hope that it will be useful,but
+# WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+# or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License
+# for more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program. If not, see <http://www.gnu.org/licenses/>.
+
+import json
+import math
+
+import numpy as np
+import pandas as pd
+from love.commander.efd_format import (
+    accepted_binary_type,
+    to_columnar,
+    to_points,
+)
+
+
+def test_columnar_format():
+    # Arrange
+    index = pd.date_range("2020-03-06 21:49", periods=3, freq="1min", tz="UTC")
+    frame = pd.DataFrame(
+        {
+            "field1": [0.21, np.nan, 0.5],
+            "field2": np.array([1, 2, 3], dtype=np.int64),
+            "field3": ["a", None, "c"],
+        },
+        index=index,
+    )
+
+    # Act
+    result = to_columnar(frame)
+
+    # Assert
+    assert result == {
+        "ts": [
+            "2020-03-06 21:49:00+00:00",
+            "2020-03-06 21:50:00+00:00",
+            "2020-03-06 21:51:00+00:00",
+        ],
+        "field1": [0.21, None, 0.5],
+        "field2": [1, 2, 3],
+        "field3": ["a", None, "c"],
+    }
+    # Values are native Python types
+    json.dumps(result)
+
+
+def test_points_format_matches_per_item_conversion():
+    # Arrange
+    index = pd.date_range("2020-03-06 21:49:41.5", periods=100, freq="7s")
+    values = np.random.default_rng(0).random((100, 2))
+    values[::3, 0] = np.nan
+    frame = pd.DataFrame(values, index=index, columns=["field1", "field2"])
+    expected = {
+        field: [
+            {"ts": str(ts), "value": None if math.isnan(value) else value}
+            for ts, value in items.items()
+        ]
+        for field, items in frame.to_dict().items()
+    }
+
+    # Act
+    result = to_points(frame)
+
+    # Assert
+    assert result == expected
+
+
+def test_accepted_binary_type_quality():
+    # Arrange
+    arrow = "application/vnd.apache.arrow.stream"
+    parquet = "application/vnd.apache.parquet"
+
+    # Act
+    accepted = {
+        header: accepted_binary_type(header)
+        for header in [
+            arrow,
+            f"application/json, {arrow};q=0",
+            f"{arrow};q=0",
+            f"application/json;q=0.5, {arrow}",
+            f"application/json, {arrow};q=0.5",
+            f"{arrow}, application/json",
+            f"{arrow};q=0.2, {parquet};q=0.8",
+            f"*/*, {parquet};q=0.9",
+            f"{arrow};q=invalid",
+            "*/*",
+            "",
+        ]
+    }
+
+    # Assert
+    assert list(accepted.values()) == [
+        arrow,
+        None,
+        None,
+        arrow,
+        None,
+        arrow,
+        parquet,
+        None,
+        None,
+        None,
+        None,
+    ]
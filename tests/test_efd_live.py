@@ -0,0 +1,109 @@
+# This file is part of LOVE-commander.
+#
+# Copyright (c) 2023 Inria Chile.
+#
+# Developed by Inria Chile.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or at
+# your option any later version.
+#
+# This program is distributed in the hope that it will be useful,but
+# WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+# or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License
+# for more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program. If not, see <http://www.gnu.org/licenses/>.
+
+import asyncio
+
+from love.commander.efd_live import LivePollers, TopicPoller
+
+
+async def test_poller_interval_adapts_to_changes():
+    # Arrange
+    values = [1, 1, 1, 2]
+
+    async def poll():
+        return values.pop(0) if len(values) > 1 else values[0]
+
+    poller = TopicPoller("Test-1-topic", poll, min_interval=0.01, backoff=2)
+    queue = asyncio.Queue()
+
+    # Act
+    poller.subscribe(queue)
+    await asyncio.sleep(0.2)
+    poller.unsubscribe(queue)
+
+    # Assert
+    messages = [queue.get_nowait() for _ in range(queue.qsize())]
+    assert [message["data"] for message in messages] == [1, 2]
+    assert poller.polls > 4
+    assert poller.pushes == 2
+    # Back to the minimum after the change, then backing off again
+    assert poller.interval > 0.01
+    assert poller.task is None
+
+
+async def test_pollers_are_shared_and_report_errors():
+    # Arrange
+    pollers = LivePollers(min_interval=0.01)
+    polls = 0
+
+    async def poll():
+        nonlocal polls
+        polls += 1
+        raise ConnectionError("EFD unavailable")
+
+    queues = [asyncio.Queue() for _ in range(3)]
+
+    # Act
+    for queue in queues:
+        pollers.subscribe(("summit_efd", "Test"), "Test-1-topic", poll, queue)
+    await asyncio.sleep(0.05)
+    stats = pollers.stats()
+    for queue in queues:
+        pollers.unsubscribe(("summit_efd", "Test"), queue)
+
+    # Assert
+    assert stats["pollers"] == 1
+    assert stats["subscriptions"] == 3
+    assert stats["polls"] == polls
+    for queue in queues:
+        assert queue.get_nowait() == {
+            "type": "error",
+            "source": "Test-1-topic",
+            "ack": "EFD unavailable",
+        }
+        assert queue.empty()
+    assert pollers.pollers == {}
+
+
+async def test_pollers_close_waits_for_the_polls():
+    # Arrange
+    pollers = LivePollers(min_interval=0.01)
+    started = asyncio.Event()
+    cancelled = False
+
+    async def poll():
+        nonlocal cancelled
+        started.set()
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled = True
+            raise
+
+    pollers.subscribe(("summit_efd", "Test"), "Test-1-topic", poll, asyncio.Queue())
+    await started.wait()
+    task = pollers.pollers[("summit_efd", "Test")].task
+
+    # Act
+    await pollers.close()
+
+    # Assert
+    assert cancelled
+    assert task.done()
+    assert pollers.pollers == {}
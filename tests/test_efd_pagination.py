@@ -0,0 +1,137 @@
+# This file is part of LOVE-commander.
+#
+# Copyright (c) 2023 Inria Chile.
+#
+# Developed by Inria Chile.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or at
+# your option any later version.
+#
+# This program is distributed in the hope that it will be useful,but
+# WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+# or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License
+# for more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program. If not, see <http://www.gnu.org/licenses/>.
+
+import numpy as np
+import pandas as pd
+import pytest
+from astropy.time import Time
+from love.commander.efd_pagination import (
+    build_page_query,
+    cut_page,
+    decode_cursor,
+    encode_cursor,
+    merge_pages,
+)
+
+
+def test_build_page_query():
+    # Arrange
+    start = Time("2020-03-16T12:00:00", scale="utc")
+    end = Time("2020-03-16T13:00:00", scale="utc")
+    cursor = (1584360000000000000, "ATDome-0-topic1", 2)
+
+    # Act
+    query = build_page_query(
+        "efd",
+        "lsst.sal.ATMCS.topic2",
+        ["field2", "field3"],
+        start,
+        end,
+        1,
+        "ATMCS-1-topic2",
+        100,
+        cursor,
+        descending=True,
+    )
+    cursor_source_query = build_page_query(
+        "efd",
+        "lsst.sal.ATDome.topic1",
+        ["field1"],
+        start,
+        end,
+        0,
+        "ATDome-0-topic1",
+        100,
+        cursor,
+        descending=True,
+    )
+
+    # Assert
+    assert query == (
+        'SELECT field2, field3 FROM "efd"."autogen"."lsst.sal.ATMCS.topic2" '
+        "WHERE time >= '2020-03-16T12:00:00.000Z' "
+        "AND time <= '2020-03-16T13:00:00.000Z' "
+        "AND salIndex = 1 AND time < 1584360000000000000 "
+        "ORDER BY time DESC LIMIT 100"
+    )
+    # Rows of the source of the cursor at its time are queried again, and
+    # the ones already returned are skipped
+    assert cursor_source_query.endswith(
+        "AND time <= 1584360000000000000 ORDER BY time DESC LIMIT 102"
+    )
+    assert decode_cursor(encode_cursor(*cursor)) == cursor
+    with pytest.raises(ValueError):
+        decode_cursor("not a cursor")
+
+
+@pytest.mark.parametrize("descending", [False, True])
+def test_pages_cover_every_row_once(descending):
+    # Arrange
+    rng = np.random.default_rng(0)
+    frames = {}
+    for source in ["ATDome-0-topic1", "ATMCS-1-topic2", "MTMount-0-topic3"]:
+        # Sources have rows with the same times, within each source too,
+        # so pages end in the middle of rows with the same time
+        times = pd.to_datetime(rng.choice(20, 30), unit="s", utc=True)
+        frames[source] = pd.DataFrame(
+            {"value": rng.random(30)}, index=times
+        ).sort_index(kind="stable")
+    expected = sorted(
+        (
+            (time.value, source, value)
+            for source, frame in frames.items()
+            for time, value in zip(frame.index, frame["value"])
+        ),
+        key=lambda row: row[:2],
+        reverse=descending,
+    )
+
+    # Act
+    rows = []
+    cursor = None
+    pages = 0
+    while True:
+        decoded = decode_cursor(cursor) if cursor is not None else None
+        page, cursor = merge_pages(
+            {
+                source: cut_page(frame, source, 8, decoded, descending)
+                for source, frame in frames.items()
+            },
+            8,
+            descending,
+            decoded,
+        )
+        pages += 1
+        page_rows = sorted(
+            (
+                (time.value, source, value)
+                for source, frame in page.items()
+                for time, value in zip(frame.index, frame["value"])
+            ),
+            key=lambda row: row[:2],
+            reverse=descending,
+        )
+        assert len(page_rows) <= 8
+        rows.extend(page_rows)
+        if cursor is None:
+            break
+
+    # Assert
+    assert rows == expected
+    assert pages == 12
@@ -0,0 +1,101 @@
+# This file is part of LOVE-commander.
+#
+# Copyright (c) 2023 Inria Chile.
+#
+# Developed by Inria Chile.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or at
+# your option any later version.
+#
+# This program is distributed in the hope that it will be useful,but
+# WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+# or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License
+# for more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program. If not, see <http://www.gnu.org/licenses/>.
+
+import time
+
+from love.commander.commands import create_app as create_cmd_app
+from love.commander.rate_limiter import CommandLimiter, RateLimits
+from lsst.ts import salobj
+
+
+def test_token_bucket():
+    # Arrange
+    limiter = CommandLimiter(rate=10, burst=2, max_in_flight=0)
+
+    # Act
+    limiter.take()
+    limiter.take()
+    retry_after = limiter.retry_after()
+
+    # Assert
+    assert 0 < retry_after <= 0.1
+    limiter.updated = time.monotonic() - 0.1
+    assert limiter.retry_after() == 0
+
+
+def test_rate_limits_per_csc_and_identity():
+    # Arrange
+    limits = RateLimits(
+        csc_rate=0,
+        csc_burst=0,
+        csc_max_in_flight=2,
+        identity_rate=0,
+        identity_burst=0,
+        identity_max_in_flight=1,
+    )
+
+    # Act
+    first = limits.acquire("Test", 1, "user1@localhost")
+    same_identity = limits.acquire("Test", 1, "user1@localhost")
+    other_identity = limits.acquire("Test", 1, "user2@localhost")
+    csc_full = limits.acquire("Test", 1, "user3@localhost")
+
+    # Assert
+    assert first == 0
+    assert same_identity > 0
+    assert other_identity == 0
+    assert csc_full > 0
+    stats = limits.stats()
+    assert stats["in_flight"] == 2
+    assert stats["rejections"] == 2
+    assert stats["cscs"]["Test.1"]["in_flight"] == 2
+    assert stats["identities"]["user1@localhost"]["rejections"] == 1
+    assert stats["identities"]["user3@localhost"]["in_flight"] == 0
+
+    limits.release("Test", 1, "user1@localhost")
+    assert limits.acquire("Test", 1, "user1@localhost") == 0
+
+
+async def test_rate_limited_command(aiohttp_client, monkeypatch):
+    # Arrange
+    monkeypatch.setenv("COMMAND_IDENTITY_RATE", "0.5")
+    monkeypatch.setenv("COMMAND_IDENTITY_BURST", "0")
+    salobj.set_test_topic_subname()
+    client = await aiohttp_client(create_cmd_app())
+    data = {
+        "csc": "Test",
+        "salindex": 1,
+        "cmd": "cmd_enable",
+        "params": {},
+        "identity": "test@localhost",
+    }
+
+    # Act
+    response = await client.post("/", json=data)
+    limits_response = await client.get("/limits")
+
+    # Assert
+    assert response.status == 429
+    assert response.headers["Retry-After"] == "2"
+    response_data = await response.json()
+    assert response_data["retry_after"] > 0
+    limits = await limits_response.json()
+    assert limits["rejections"] == 1
+    assert limits["in_flight"] == 0
+    assert limits["identities"]["test@localhost"]["rejections"] == 1
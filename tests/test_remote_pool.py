@@ -0,0 +1,325 @@
+# This file is part of LOVE-commander.
+#
+# Copyright (c) 2023 Inria Chile.
+#
+# Developed by Inria Chile.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or at
+# your option any later version.
+#
+# This program is distributed in the hope that it will be useful,but
+# WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+# or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License
+# for more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program. If not, see <http://www.gnu.org/licenses/>.
+
+import asyncio
+import types
+from unittest.mock import patch
+
+import pytest
+from love.commander.remote_pool import IdentityGate, RemotePool
+
+
+class MockDomain:
+    def __init__(self):
+        self.default_identity = None
+        self.closed = False
+
+    async def close(self):
+        self.closed = True
+
+
+class MockRemote:
+    built = 0
+
+    def __init__(self, domain, name, index=None, include=None):
+        MockRemote.built += 1
+        self.salinfo = types.SimpleNamespace(name=name, index=index, identity=None)
+        self.start_task = asyncio.ensure_future(asyncio.sleep(0.1))
+        self.closed = False
+
+    async def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def mock_salobj():
+    with patch("lsst.ts.salobj.Domain", new=MockDomain), patch(
+        "lsst.ts.salobj.Remote", new=MockRemote
+    ):
+        MockRemote.built = 0
+        yield
+
+
+async def test_pool_hits_and_misses(mock_salobj):
+    # Arrange
+    pool = RemotePool(max_size=5)
+
+    # Act
+    remote = await pool.get("Test", 1)
+    same_remote = await pool.get("Test", 1)
+    await pool.get("Test", 2)
+
+    # Assert
+    assert remote is same_remote
+    stats = pool.stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 2
+    assert stats["live"] == 2
+    assert stats["remotes"] == ["Test.1", "Test.2"]
+
+    await pool.close()
+    assert remote.closed
+    assert pool.stats()["live"] == 0
+
+
+async def test_pool_evicts_least_recently_used(mock_salobj):
+    # Arrange
+    pool = RemotePool(max_size=2)
+    first = await pool.get("Test", 1)
+    second = await pool.get("Test", 2)
+
+    # Act
+    # Use the first remote so the second one becomes the least recently used
+    await pool.get("Test", 1)
+    await pool.get("Test", 3)
+    await asyncio.sleep(0)
+
+    # Assert
+    stats = pool.stats()
+    assert stats["evictions"] == 1
+    assert stats["remotes"] == ["Test.1", "Test.3"]
+    assert second.closed
+    assert not first.closed
+
+    await pool.close()
+
+
+async def test_pool_does_not_evict_remotes_in_use(mock_salobj):
+    # Arrange
+    pool = RemotePool(max_size=1)
+
+    # Act
+    async with pool.acquire("Test", 1) as busy_remote:
+        await pool.get("Test", 2)
+        await asyncio.sleep(0)
+
+        # Assert
+        assert not busy_remote.closed
+        assert pool.stats()["remotes"] == ["Test.1", "Test.2"]
+        assert pool.stats()["in_use"] == 1
+
+    await pool.get("Test", 3)
+    await asyncio.sleep(0)
+    assert busy_remote.closed
+    assert pool.stats()["in_use"] == 0
+
+    await pool.close()
+
+
+async def test_pool_reaps_idle_remotes(mock_salobj):
+    # Arrange
+    pool = RemotePool(idle_ttl=0.1, reap_interval=0.05)
+    pool.start()
+    remote = await pool.get("Test", 1)
+
+    # Act
+    await asyncio.sleep(0.3)
+
+    # Assert
+    assert remote.closed
+    stats = pool.stats()
+    assert stats["expirations"] == 1
+    assert stats["live"] == 0
+
+    await pool.close()
+
+
+async def test_pool_single_flight_creation(mock_salobj):
+    # Arrange
+    pool = RemotePool()
+    waiters = 10
+
+    # Act
+    remotes = await asyncio.gather(*[pool.get("Test", 1) for _ in range(waiters)])
+
+    # Assert
+    assert MockRemote.built == 1
+    assert all(remote is remotes[0] for remote in remotes)
+    stats = pool.stats()
+    assert stats["misses"] == 1
+    assert stats["coalesced"] == waiters - 1
+    assert stats["starting"] == 0
+
+    await pool.close()
+
+
+async def test_pool_start_failure_is_not_cached(mock_salobj):
+    # Arrange
+    pool = RemotePool()
+
+    class FailingRemote(MockRemote):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            self.start_task.cancel()
+            self.start_task = asyncio.Future()
+            self.start_task.set_exception(RuntimeError("Could not start"))
+
+    # Act
+    with patch("lsst.ts.salobj.Remote", new=FailingRemote):
+        results = await asyncio.gather(
+            pool.get("Test", 1), pool.get("Test", 1), return_exceptions=True
+        )
+    remote = await pool.get("Test", 1)
+
+    # Assert
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert not isinstance(remote, FailingRemote)
+    assert pool.stats()["remotes"] == ["Test.1"]
+
+    await pool.close()
+
+
+async def test_pool_warm_up(mock_salobj):
+    # Arrange
+    pool = RemotePool(max_size=1, idle_ttl=0.1, reap_interval=0.05)
+    pool.start()
+
+    # Act
+    results = await pool.warm_up([("Test", 1), ("Test", 2)], concurrency=2)
+    await asyncio.sleep(0.3)
+
+    # Assert
+    # Pinned remotes are neither evicted nor reaped
+    assert set(results) == {"Test.1", "Test.2"}
+    assert all(result["error"] is None for result in results.values())
+    assert all(result["elapsed"] >= 0 for result in results.values())
+    stats = pool.stats()
+    assert stats["pinned"] == 2
+    assert stats["live"] == 2
+    assert stats["evictions"] == 0
+    assert stats["expirations"] == 0
+
+    await pool.close()
+
+
+async def test_identity_gate():
+    # Arrange
+    salinfo = types.SimpleNamespace(identity=None)
+    gate = IdentityGate(salinfo)
+    sent = []
+
+    async def send(identity, duration):
+        async with gate.send(identity):
+            sent.append((identity, salinfo.identity))
+            await asyncio.sleep(duration)
+
+    # Act
+    first = asyncio.create_task(send("user1@localhost", 0.2))
+    await asyncio.sleep(0)
+    second = asyncio.create_task(send("user1@localhost", 0.2))
+    other = asyncio.create_task(send("user2@localhost", 0))
+    await asyncio.sleep(0.1)
+
+    # Assert
+    # Commands with the same identity are sent concurrently
+    # while the other identity waits.
+    assert gate.senders == 2
+    assert sent == [
+        ("user1@localhost", "user1@localhost"),
+        ("user1@localhost", "user1@localhost"),
+    ]
+
+    await asyncio.gather(first, second, other)
+    assert sent[-1] == ("user2@localhost", "user2@localhost")
+    assert gate.senders == 0
+
+
+async def test_identity_gate_is_fair():
+    # Arrange
+    salinfo = types.SimpleNamespace(identity=None)
+    gate = IdentityGate(salinfo)
+    sent = []
+
+    async def send(identity):
+        async with gate.send(identity):
+            sent.append(identity)
+            await asyncio.sleep(0.05)
+
+    # Act
+    tasks = [asyncio.create_task(send("user1@localhost"))]
+    await asyncio.sleep(0.01)
+    tasks.append(asyncio.create_task(send("user2@localhost")))
+    # user1 keeps sending commands while user2 waits
+    for _ in range(3):
+        await asyncio.sleep(0.01)
+        tasks.append(asyncio.create_task(send("user1@localhost")))
+    await asyncio.sleep(0)
+    waiting = gate.waiting
+    await asyncio.gather(*tasks)
+
+    # Assert
+    assert waiting == 4
+    assert sent == [
+        "user1@localhost",
+        "user2@localhost",
+        "user1@localhost",
+        "user1@localhost",
+        "user1@localhost",
+    ]
+    assert gate.waiting == 0
+
+
+class MockCommand:
+    def __init__(self, salinfo):
+        self.salinfo = salinfo
+
+    async def start(self, data, timeout, wait_done):
+        # Yield before the identity is read, as an asynchronous writer would
+        await asyncio.sleep(0.02)
+        data.private_identity = self.salinfo.identity
+        # Wait for the first acknowledgement
+        await asyncio.sleep(0.1)
+        return data
+
+
+async def test_identity_gate_is_held_until_written():
+    # Arrange
+    salinfo = types.SimpleNamespace(identity=None)
+    gate = IdentityGate(salinfo)
+    cmd = MockCommand(salinfo)
+    identities = ["user1@localhost", "user2@localhost", "user1@localhost"]
+    data = [types.SimpleNamespace(private_identity="") for _ in identities]
+
+    # Act
+    starts = await asyncio.gather(
+        *[
+            gate.start_command(cmd, item, identity, timeout=1)
+            for item, identity in zip(data, identities)
+        ]
+    )
+    # The gate is released before the acknowledgements arrive
+    senders = gate.senders
+    pending = [not start.done() for start in starts]
+    await asyncio.gather(*starts)
+
+    # Assert
+    assert [item.private_identity for item in data] == identities
+    assert senders == 0
+    assert all(pending)
+
+
+async def test_pool_stats_endpoint(http_client):
+    # Act
+    response = await http_client.get("/cmd/pool")
+
+    # Assert
+    assert response.status == 200
+    response_data = await response.json()
+    for key in ["max_size", "idle_ttl", "live", "hits", "misses", "evictions"]:
+        assert key in response_data